@@ -0,0 +1,418 @@
+"""
+Load test of every API route, against a running server and a seeded local database.
+
+Each route is driven on its own for `--duration` seconds, either by `--concurrency` clients
+sending requests back to back or at a fixed `--rate` of requests per second. Throughput and
+p50/p95/p99 latency per route are printed and written to `--output` as JSON; `compare` flags
+the routes that got slower than a stored baseline.
+
+    python -m benchmarks.api_load seed --tasks 1000000 --reset
+    uvicorn src.main:app --workers 4 &
+    python -m benchmarks.api_load run --concurrency 32 --duration 20 --output baseline.json
+    python -m benchmarks.api_load run --rate 500 --duration 20 --output current.json --only "GET /tasks"
+    python -m benchmarks.api_load compare baseline.json current.json --tolerance 0.1
+
+At rate mode latency is measured from when a request was due, not when it was sent, so a
+server that falls behind shows it in the percentiles instead of silently lowering the rate.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+LOAD_USERS = {"load-admin": "admin", "load-readonly": "readonly"}
+LOAD_PASSWORD = os.environ.get("LOAD_TEST_PASSWORD", "load-test-password")
+
+SEED_TASKS_SQL = """
+    INSERT INTO tasks (name, status, created_at, updated_at)
+    SELECT 'load task ' || g,
+           (ARRAY['done', 'failed', 'running'])[1 + g %% 3],
+           now() - (%(total)s - g) * interval '1 second',
+           now() - (%(total)s - g) * interval '1 second'
+    FROM generate_series(%(start)s, %(stop)s) AS g;
+"""
+
+PERCENTILES = (50, 95, 99)
+
+
+def seed(conn, tasks, reset=False, chunk=1_000_000):
+    """
+    Migrates the database and fills it with `tasks` tasks and the load test users.
+
+    Rows are generated by the server in chunks of `chunk`, each committed on its own, so
+    10M tasks take minutes rather than hours. Creation times are spread one second apart,
+    ending now.
+
+    Args:
+        conn (psycopg2.extensions.connection): A connection to a scratch database.
+        tasks (int): Number of tasks to add.
+        reset (bool): Delete every existing task first.
+        chunk (int): Tasks inserted per statement.
+    """
+    from src import queries, schema, users
+
+    schema.migrate(conn)
+    with conn.cursor() as cur:
+        if reset:
+            cur.execute("TRUNCATE tasks RESTART IDENTITY CASCADE;")
+        password_hash = users.hash_password(LOAD_PASSWORD)
+        for username, role in LOAD_USERS.items():
+            queries.upsert_user(cur, username, password_hash, role)
+    conn.commit()
+    for start in range(1, tasks + 1, chunk):
+        with conn.cursor() as cur:
+            cur.execute(SEED_TASKS_SQL, {"total": tasks, "start": start, "stop": min(start + chunk - 1, tasks)})
+        conn.commit()
+        print(f"seeded {min(start + chunk - 1, tasks)} / {tasks}", file=sys.stderr)
+    with conn.cursor() as cur:
+        if reset:
+            queries.reconcile_task_stats(cur)
+        cur.execute("ANALYZE tasks;")
+    conn.commit()
+
+
+class Context:
+    """
+    What the scenarios share: the HTTP client, tokens, and a sample of existing task IDs.
+    """
+
+    def __init__(self, client, tokens, task_ids):
+        self.client = client
+        self.tokens = tokens
+        self.task_ids = task_ids
+
+    def auth(self, role="admin", **headers):
+        return {"Authorization": f"Bearer {self.tokens[role]}", **headers}
+
+    def task_id(self):
+        return random.choice(self.task_ids)
+
+
+async def login(client, username):
+    response = await client.post("/token", data={"username": username, "password": LOAD_PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def create_tasks(ctx, count):
+    response = await ctx.client.post("/tasks:batch", headers=ctx.auth(),
+                                     json={"tasks": [{"name": "noop: load"}] * count})
+    response.raise_for_status()
+    return [item["id"] for item in response.json()["results"]]
+
+
+async def sample_task_ids(client, headers, size=5000):
+    """
+    Collects IDs of existing tasks from a few pages spread over the table.
+    """
+    response = await client.get("/tasks/stats", headers=headers)
+    response.raise_for_status()
+    total = response.json()["total"]
+    ids = []
+    for _ in range(max(1, size // 1000)):
+        page = await client.get("/tasks", params={"limit": 1000, "after": random.randint(0, max(total - 1000, 0))},
+                                headers=headers)
+        page.raise_for_status()
+        ids.extend(task["id"] for task in page.json())
+    if not ids:
+        raise SystemExit("No tasks found; run `python -m benchmarks.api_load seed` first.")
+    return ids
+
+
+async def _get(ctx, path, role="readonly", headers=None, **params):
+    response = await ctx.client.get(path, params=params, headers=ctx.auth(role, **(headers or {})))
+    return response.status_code
+
+
+async def _stream_open(ctx, path):
+    async with ctx.client.stream("GET", path, headers=ctx.auth("readonly")) as response:
+        return response.status_code
+
+
+def _recent():
+    return (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+
+
+class Scenario:
+    """
+    One route under test.
+
+    Attributes:
+        name (str): Label in the report, e.g. "GET /tasks/{id}".
+        request (Callable): `async (ctx, prepared) -> status code`, the timed part.
+        setup (Optional[Callable]): `async (ctx) -> prepared`, run untimed before each request.
+        expect (tuple): Status codes that count as success.
+    """
+
+    def __init__(self, name, request, setup=None, expect=(200,)):
+        self.name = name
+        self.request = request
+        self.setup = setup
+        self.expect = expect
+
+
+SCENARIOS = [
+    Scenario("POST /token", lambda ctx, _: ctx.client.post(
+        "/token", data={"username": "load-readonly", "password": LOAD_PASSWORD})),
+    Scenario("GET /tasks", lambda ctx, _: _get(ctx, "/tasks", limit=100, after=ctx.task_id())),
+    Scenario("GET /tasks?status", lambda ctx, _: _get(ctx, "/tasks", limit=100, status="failed")),
+    Scenario("GET /tasks?name_contains", lambda ctx, _: _get(ctx, "/tasks", limit=100,
+                                                            name_contains=str(random.randint(100, 999)))),
+    Scenario("GET /tasks?fields", lambda ctx, _: _get(ctx, "/tasks", limit=100, after=ctx.task_id(),
+                                                     fields="name,status")),
+    Scenario("GET /tasks (msgpack)", lambda ctx, _: _get(ctx, "/tasks", limit=100, after=ctx.task_id(),
+                                                        headers={"Accept": "application/msgpack"})),
+    Scenario("GET /tasks/export", lambda ctx, _: _get(ctx, "/tasks/export", format="ndjson",
+                                                     created_after=_recent())),
+    Scenario("GET /tasks/stats", lambda ctx, _: _get(ctx, "/tasks/stats")),
+    Scenario("GET /tasks/events", lambda ctx, _: _stream_open(ctx, "/tasks/events")),
+    Scenario("GET /tasks/{id}", lambda ctx, _: _get(ctx, f"/tasks/{ctx.task_id()}")),
+    Scenario("GET /tasks/{id}/result", lambda ctx, _: _get(ctx, f"/tasks/{ctx.task_id()}/result"),
+             expect=(200, 404)),
+    Scenario("POST /tasks", lambda ctx, _: ctx.client.post("/tasks", headers=ctx.auth(),
+                                                           json={"name": "noop: load"})),
+    Scenario("PUT /tasks/{id}", lambda ctx, _: ctx.client.put(
+        f"/tasks/{ctx.task_id()}", headers=ctx.auth(), json={"name": "load task", "status": "done"})),
+    Scenario("DELETE /tasks/{id}", lambda ctx, ids: ctx.client.delete(f"/tasks/{ids[0]}", headers=ctx.auth()),
+             setup=lambda ctx: create_tasks(ctx, 1)),
+    Scenario("POST /tasks:batch", lambda ctx, _: ctx.client.post(
+        "/tasks:batch", headers=ctx.auth(), json={"tasks": [{"name": "noop: load"}] * 100})),
+    Scenario("PATCH /tasks:batch", lambda ctx, _: ctx.client.patch("/tasks:batch", headers=ctx.auth(), json={
+        "tasks": [{"id": ctx.task_id(), "name": "load task", "status": "done"} for _ in range(100)]})),
+    Scenario("DELETE /tasks:batch", lambda ctx, ids: ctx.client.request(
+        "DELETE", "/tasks:batch", headers=ctx.auth(), json={"ids": ids}), setup=lambda ctx: create_tasks(ctx, 100)),
+    Scenario("GET /admin/pool", lambda ctx, _: _get(ctx, "/admin/pool", role="admin")),
+    Scenario("GET /admin/cache", lambda ctx, _: _get(ctx, "/admin/cache", role="admin")),
+    Scenario("GET /admin/group-commit", lambda ctx, _: _get(ctx, "/admin/group-commit", role="admin")),
+    Scenario("GET /admin/events", lambda ctx, _: _get(ctx, "/admin/events", role="admin")),
+    Scenario("GET /admin/slow-queries", lambda ctx, _: _get(ctx, "/admin/slow-queries", role="admin")),
+    Scenario("GET /metrics", lambda ctx, _: _get(ctx, "/metrics")),
+]
+
+
+async def _status(result):
+    # Scenarios return either a status code or an httpx response.
+    result = await result
+    return result if isinstance(result, int) else result.status_code
+
+
+async def _timed(scenario, ctx, due=None):
+    before_setup = time.perf_counter()
+    prepared = await scenario.setup(ctx) if scenario.setup else None
+    # In rate mode the clock starts when the request was due, less the untimed setup.
+    started = time.perf_counter() if due is None else due + (time.perf_counter() - before_setup)
+    try:
+        status = await _status(scenario.request(ctx, prepared))
+    except httpx.HTTPError:
+        status = None
+    return time.perf_counter() - started, status in scenario.expect
+
+
+async def drive(scenario, ctx, duration, concurrency=None, rate=None):
+    """
+    Sends requests of one scenario for `duration` seconds.
+
+    Args:
+        scenario (Scenario): The route under test.
+        ctx (Context): Client, tokens and task IDs.
+        duration (float): Seconds to run.
+        concurrency (Optional[int]): Clients sending back to back (closed loop).
+        rate (Optional[float]): Requests per second, regardless of responses (open loop).
+
+    Returns:
+        tuple: Latencies in seconds, error count and elapsed seconds.
+    """
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def record(outcome):
+        nonlocal errors
+        latency, ok = outcome
+        latencies.append(latency)
+        errors += not ok
+
+    if rate:
+        pending = []
+        for i in range(int(duration * rate)):
+            due = start + i / rate
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+            pending.append(asyncio.ensure_future(_timed(scenario, ctx, due)))
+        for outcome in await asyncio.gather(*pending):
+            record(outcome)
+    else:
+        async def client_loop():
+            while time.perf_counter() < deadline:
+                record(await _timed(scenario, ctx))
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile.
+
+    Args:
+        sorted_values (list): Values in ascending order.
+        p (float): Percentile, 0-100.
+
+    Returns:
+        float: The value, or 0.0 for no values.
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+
+def summarize(latencies, errors, elapsed):
+    """
+    Reduces the latencies of one scenario to its report entry.
+
+    Args:
+        latencies (list): Seconds per request.
+        errors (int): Requests that failed or got an unexpected status.
+        elapsed (float): Seconds the scenario ran.
+
+    Returns:
+        dict: Request and error counts, throughput per second and latency percentiles in ms.
+    """
+    ordered = sorted(latencies)
+    summary = {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}_ms"] = round(percentile(ordered, p) * 1000, 3)
+    return summary
+
+
+def compare(baseline, current, tolerance=0.1, min_ms=1.0):
+    """
+    Finds the routes that regressed between two result files.
+
+    A route regresses when its throughput fell, or its p95 or p99 latency rose, by more than
+    `tolerance`, or when its error rate rose. Latency changes under `min_ms` are noise.
+
+    Args:
+        baseline (dict): Results of the reference run.
+        current (dict): Results of the run to check.
+        tolerance (float): Relative change allowed, e.g. 0.1 for 10%.
+        min_ms (float): Smallest absolute latency change that can count as a regression.
+
+    Returns:
+        list: `(endpoint, metric, baseline value, current value)` for each regression.
+    """
+    regressions = []
+    for name, before in baseline["endpoints"].items():
+        after = current["endpoints"].get(name)
+        if after is None:
+            continue
+        if after["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append((name, "throughput", before["throughput"], after["throughput"]))
+        for metric in ("p95_ms", "p99_ms"):
+            if after[metric] > before[metric] * (1 + tolerance) and after[metric] - before[metric] >= min_ms:
+                regressions.append((name, metric, before[metric], after[metric]))
+        if _error_rate(after) > _error_rate(before) + 0.001:
+            regressions.append((name, "error_rate", round(_error_rate(before), 4), round(_error_rate(after), 4)))
+    return regressions
+
+
+def _error_rate(summary):
+    return summary["errors"] / summary["requests"] if summary["requests"] else 0.0
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency or 1000, max_keepalive_connections=args.concurrency or 100)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        tokens = {role: await login(client, username) for username, role in LOAD_USERS.items()}
+        ctx = Context(client, tokens, [])
+        ctx.task_ids = await sample_task_ids(client, ctx.auth())
+        results = {
+            "meta": {"started_at": datetime.now(timezone.utc).isoformat(), "url": args.url,
+                     "mode": "rate" if args.rate else "concurrency", "concurrency": args.concurrency,
+                     "rate": args.rate, "duration": args.duration, "git_commit": _git_commit()},
+            "endpoints": {},
+        }
+        for scenario in SCENARIOS:
+            if args.only and not any(scenario.name.startswith(prefix) for prefix in args.only):
+                continue
+            if args.warmup:
+                await drive(scenario, ctx, args.warmup, args.concurrency, args.rate)
+            summary = summarize(*await drive(scenario, ctx, args.duration, args.concurrency, args.rate))
+            results["endpoints"][scenario.name] = summary
+            print(f"{scenario.name:<28} {summary['throughput']:>9.1f} req/s  p50 {summary['p50_ms']:>8.2f}  "
+                  f"p95 {summary['p95_ms']:>8.2f}  p99 {summary['p99_ms']:>8.2f} ms  errors {summary['errors']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    seed_parser = commands.add_parser("seed", help="migrate and fill the database in DB_CONFIG")
+    seed_parser.add_argument("--tasks", type=int, default=100_000, help="tasks to add, e.g. 1000 to 10000000")
+    seed_parser.add_argument("--reset", action="store_true", help="delete every existing task first")
+    run_parser = commands.add_parser("run", help="drive every route and report latency and throughput")
+    run_parser.add_argument("--url", default="http://localhost:8000")
+    load = run_parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=16, help="clients sending back to back")
+    load.add_argument("--rate", type=float, help="requests per second, instead of a number of clients")
+    run_parser.add_argument("--duration", type=float, default=10.0, help="seconds per route")
+    run_parser.add_argument("--warmup", type=float, default=2.0, help="unrecorded seconds per route")
+    run_parser.add_argument("--timeout", type=float, default=30.0, help="per request, in seconds")
+    run_parser.add_argument("--only", nargs="*", help="run routes whose label starts with one of these")
+    run_parser.add_argument("--output", help="write the results to this JSON file")
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1, help="relative change allowed")
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        from src import db
+
+        conn = db.get_connection()
+        try:
+            seed(conn, args.tasks, args.reset)
+        finally:
+            conn.close()
+    elif args.command == "run":
+        if args.rate:
+            args.concurrency = None
+        results = asyncio.run(run(args))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.tolerance)
+        for name, metric, before, after in regressions:
+            print(f"REGRESSION {name:<28} {metric:<10} {before} -> {after}")
+        print(f"{len(regressions)} regression(s) across {len(current['endpoints'])} routes.")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Per-query latency of the hot statements with and without server-side prepared statements.
+
+Runs each statement `--repeat` times on one connection, each in its own committed transaction
+as a request would, first as a plain statement and then prepared (`src.prepared`), and reports
+the mean and percentiles of each. Needs a migrated database from `DB_CONFIG`; the benchmark
+creates one task and one user and deletes them afterwards.
+
+    python -m benchmarks.prepared_bench --repeat 5000
+    python -m benchmarks.prepared_bench --backend async --query get_task_by_id update_task
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import psycopg
+from psycopg.rows import dict_row
+
+from src import async_db, async_queries, db, prepared, queries
+
+QUERIES = {
+    "get_task_by_id": lambda ids: (ids["task"],),
+    "get_task_result": lambda ids: (ids["task"],),
+    "get_user_by_username": lambda ids: (ids["user"],),
+    "update_task": lambda ids: (ids["task"], "prepared bench", "done"),
+}
+
+
+def summarize(timings):
+    """
+    Summarizes latencies.
+
+    Args:
+        timings (list): Seconds per query.
+
+    Returns:
+        dict: Mean, p50 and p99 in microseconds.
+    """
+    timings = sorted(timings)
+    return {"mean": statistics.fmean(timings) * 1e6, "p50": timings[len(timings) // 2] * 1e6,
+            "p99": timings[int(len(timings) * 0.99)] * 1e6}
+
+
+def measure_sync(name, args, repeat, warmup):
+    """
+    Times `repeat` calls of a query function on a fresh connection.
+
+    Args:
+        name (str): Function of `queries`.
+        args (tuple): Its arguments after the cursor.
+        repeat (int): Timed calls.
+        warmup (int): Untimed calls first, which also prepare the statement.
+
+    Returns:
+        list: Seconds per call.
+    """
+    conn = db.get_connection()
+    try:
+        timings = []
+        for i in range(warmup + repeat):
+            start = time.perf_counter()
+            with conn.cursor() as cur:
+                getattr(queries, name)(cur, *args)
+            elapsed = time.perf_counter() - start
+            conn.commit()
+            if i >= warmup:
+                timings.append(elapsed)
+        return timings
+    finally:
+        conn.close()
+
+
+async def measure_async(name, args, repeat, warmup):
+    """
+    Async counterpart of `measure_sync`, on a connection set up like the pooled ones.
+    """
+    conn = await psycopg.AsyncConnection.connect(async_db.get_conninfo(), row_factory=dict_row,
+                                                 cursor_factory=async_db.Cursor)
+    if not prepared.PREPARED_CONFIG["enabled"]:
+        conn.prepare_threshold = None
+    try:
+        timings = []
+        for i in range(warmup + repeat):
+            start = time.perf_counter()
+            async with conn.cursor() as cur:
+                await getattr(async_queries, name)(cur, *args)
+            elapsed = time.perf_counter() - start
+            await conn.commit()
+            if i >= warmup:
+                timings.append(elapsed)
+        return timings
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("sync", "async"), default="sync")
+    parser.add_argument("--query", nargs="+", choices=sorted(QUERIES), default=sorted(QUERIES))
+    parser.add_argument("--repeat", type=int, default=2000, help="timed calls per query and mode")
+    parser.add_argument("--warmup", type=int, default=100, help="untimed calls first")
+    args = parser.parse_args()
+
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            ids = {"task": queries.create_task(cur, "prepared bench")["id"],
+                   "user": queries.upsert_user(cur, "prepared_bench", "x", "user")["username"]}
+        conn.commit()
+        for name in args.query:
+            results = {}
+            for mode in ("plain", "prepared"):
+                prepared.PREPARED_CONFIG["enabled"] = mode == "prepared"
+                if args.backend == "async":
+                    timings = asyncio.run(measure_async(name, QUERIES[name](ids), args.repeat, args.warmup))
+                else:
+                    timings = measure_sync(name, QUERIES[name](ids), args.repeat, args.warmup)
+                results[mode] = summarize(timings)
+                print(f"{name:<22} {mode:<9} mean {results[mode]['mean']:8.1f} us  "
+                      f"p50 {results[mode]['p50']:8.1f} us  p99 {results[mode]['p99']:8.1f} us")
+            print(f"{name:<22} speedup   {results['plain']['mean'] / results['prepared']['mean']:5.2f}x")
+        with conn.cursor() as cur:
+            queries.delete_task(cur, ids["task"])
+            cur.execute("DELETE FROM users WHERE username = %s;", (ids["user"],))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of `GET /tasks` response serialization, with and without the fast path.
+
+The default path is what FastAPI does for `response_model=List[models.Task]`: validate every
+row into a model, encode it, then render the JSON. The fast path encodes the database rows
+directly with `serialize.dumps`.
+
+    python -m benchmarks.serialize_bench --rows 1000 --repeat 200
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from src import serialize
+from src.main import app
+
+
+def make_rows(count):
+    """
+    Builds task rows shaped like the ones `queries.get_all_tasks` returns.
+
+    Args:
+        count (int): Number of rows.
+
+    Returns:
+        list: Rows as dictionaries.
+    """
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [{"id": i, "name": f"task {i}", "status": "running",
+             "created_at": start + timedelta(seconds=i),
+             "updated_at": start + timedelta(seconds=i, microseconds=i)} for i in range(1, count + 1)]
+
+
+async def pydantic_path(field, rows):
+    content = await serialize_response(field=field, response_content=rows)
+    return JSONResponse(content).body
+
+
+async def fast_path(field, rows):
+    return serialize.RowsResponse(rows).body
+
+
+async def measure(render, field, rows, repeat):
+    """
+    Times `repeat` renderings of `rows`.
+
+    Returns:
+        float: Rows serialized per second.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await render(field, rows)
+    return len(rows) * repeat / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="rows per page")
+    parser.add_argument("--repeat", type=int, default=200, help="pages serialized per run")
+    args = parser.parse_args()
+
+    route = next(route for route in app.routes if getattr(route, "path", None) == "/tasks"
+                 and "GET" in route.methods)
+    rows = make_rows(args.rows)
+    results = {}
+    for label, render in (("pydantic", pydantic_path), ("fast", fast_path)):
+        results[label] = asyncio.run(measure(render, route.response_field, rows, args.repeat))
+        print(f"{label:>10}: {results[label]:12,.0f} rows/s")
+    print(f"{'speedup':>10}: {results['fast'] / results['pydantic']:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
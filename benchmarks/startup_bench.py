@@ -0,0 +1,156 @@
+"""
+Cold start and memory per worker of `src.serve`, with and without preloading.
+
+Measures three things:
+- import: time to import `src.main` in a fresh interpreter, the floor of any cold start
+- startup: time from launching `python -m src.serve` until `/ready` first answers, and until it
+  answers 200 (which needs the database from `DB_CONFIG`)
+- memory: RSS of every worker, and the PSS and private (USS) parts of it. PSS splits each shared
+  page among the processes sharing it, so it is the figure to add up per container.
+
+Memory is read from /proc, so this runs on Linux only.
+
+    python -m benchmarks.startup_bench --workers 4
+    python -m benchmarks.startup_bench --workers 8 --imports 10 --modes preload
+"""
+
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+IMPORT_SNIPPET = "import time; s = time.perf_counter(); import src.main; print(time.perf_counter() - s)"
+
+
+def measure_import(repeat):
+    """
+    Times importing the application in fresh interpreters.
+
+    Args:
+        repeat (int): Interpreters started.
+
+    Returns:
+        float: Median seconds.
+    """
+    timings = [float(subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], check=True, capture_output=True,
+                                    text=True).stdout) for _ in range(repeat)]
+    return statistics.median(timings)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def probe(port):
+    """
+    Requests `/ready` once.
+
+    Returns:
+        Optional[int]: The status code, or None if nothing answered.
+    """
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+    except OSError:
+        return None
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def memory(pid):
+    """
+    Reads a process's memory use.
+
+    Returns:
+        dict: `rss`, `pss` and `uss` (private) in MiB.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def measure_serve(workers, preload, timeout, settle):
+    """
+    Starts the server, waits for it to answer and be ready, and reads its workers' memory.
+
+    Args:
+        workers (int): Worker processes.
+        preload (bool): Import the application before forking.
+        timeout (float): Seconds to wait for `/ready` to answer 200.
+        settle (float): Seconds to wait after that before reading memory.
+
+    Returns:
+        dict: Seconds to the first answer and to ready (None if not ready in time), and per-worker memory.
+    """
+    port = free_port()
+    command = [sys.executable, "-m", "src.serve", "--workers", str(workers), "--port", str(port)]
+    if not preload:
+        command.append("--no-preload")
+    start = time.perf_counter()
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    answered = ready = None
+    try:
+        while time.perf_counter() - start < timeout:
+            status = probe(port)
+            if status is not None and answered is None:
+                answered = time.perf_counter() - start
+            if status == 200:
+                ready = time.perf_counter() - start
+                break
+            time.sleep(0.02)
+        time.sleep(settle)
+        workers_memory = [memory(pid) for pid in children(server.pid)]
+        parent_memory = memory(server.pid)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(30)
+    return {"answered": answered, "ready": ready, "workers": workers_memory, "parent": parent_memory}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--imports", type=int, default=5, help="interpreters timed importing the application")
+    parser.add_argument("--modes", nargs="+", choices=("preload", "no-preload"), default=["preload", "no-preload"])
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for /ready")
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds to wait before reading memory")
+    args = parser.parse_args()
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        parser.error("memory is read from /proc/<pid>/smaps_rollup, which this system does not have")
+
+    print(f"import src.main: {measure_import(args.imports) * 1000:8.1f} ms (median of {args.imports})")
+    for mode in args.modes:
+        result = measure_serve(args.workers, mode == "preload", args.timeout, args.settle)
+        answered = f"{result['answered']:6.2f} s" if result["answered"] is not None else "  never"
+        ready = f"{result['ready']:6.2f} s" if result["ready"] is not None else "  never (is the database up?)"
+        print(f"{mode:<11} first answer {answered}  ready {ready}")
+        if not result["workers"]:
+            print(f"{mode:<11} no workers running")
+            continue
+        for key in ("rss", "pss", "uss"):
+            values = [worker[key] for worker in result["workers"]]
+            print(f"{mode:<11} {key.upper()} per worker: mean {statistics.fmean(values):7.1f} MiB  "
+                  f"max {max(values):7.1f} MiB")
+        total = result["parent"]["pss"] + sum(worker["pss"] for worker in result["workers"])
+        print(f"{mode:<11} PSS total, parent and {len(result['workers'])} workers: {total:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
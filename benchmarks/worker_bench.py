@@ -0,0 +1,81 @@
+"""
+Throughput of the task worker (`src.worker`) against the number of worker processes.
+
+For each worker count, queues `--tasks` tasks, starts that many worker processes, each
+running `--concurrency` handlers at once, and reports tasks per second until the queue is
+drained. Needs a migrated database from `DB_CONFIG`; use a scratch database, since any other
+queued tasks are run too. The benchmark's tasks are deleted afterwards.
+
+    python -m benchmarks.worker_bench --tasks 5000 --workers 1 2 4 8 --task "sleep: 0.005"
+    python -m benchmarks.worker_bench --task "hash: 20000" --executor process
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from src import db, queries
+from src.worker import Worker
+
+
+def run_worker(options, results):
+    results.put(Worker(**options).run(exit_when_idle=True))
+
+
+def measure(workers, options, tasks, task):
+    """
+    Times `workers` worker processes draining `tasks` queued tasks.
+
+    Args:
+        workers (int): Number of worker processes.
+        options (dict): `Worker` arguments.
+        tasks (int): Number of tasks to queue.
+        task (str): Name of every queued task, which picks its handler.
+
+    Returns:
+        tuple: Tasks per second and the combined worker stats.
+    """
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            ids = [row["id"] for row in queries.create_tasks(cur, [task] * tasks)]
+        conn.commit()
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=run_worker, args=(options, results)) for _ in range(workers)]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        stats = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - start
+        for process in processes:
+            process.join()
+        with conn.cursor() as cur:
+            queries.delete_tasks(cur, ids)
+        conn.commit()
+    finally:
+        conn.close()
+    totals = {key: sum(s[key] for s in stats) for key in ("claimed", "done", "failed", "lost", "db_errors")}
+    return totals["done"] / elapsed, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=2000, help="tasks queued per run")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="worker process counts")
+    parser.add_argument("--concurrency", type=int, default=4, help="handlers run at once per worker")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread")
+    parser.add_argument("--batch-size", type=int, default=16, help="tasks claimed per statement")
+    parser.add_argument("--task", default="sleep: 0.005", help="task name, i.e. handler and argument")
+    args = parser.parse_args()
+
+    options = {"concurrency": args.concurrency, "executor": args.executor, "batch_size": args.batch_size,
+               "poll_interval": 0.05}
+    baseline = None
+    for workers in args.workers:
+        rate, totals = measure(workers, options, args.tasks, args.task)
+        baseline = baseline or rate / workers
+        print(f"{workers:>3} workers: {rate:10.1f} tasks/s  efficiency {rate / baseline / workers:5.2f}  {totals}")
+
+
+if __name__ == "__main__":
+    main()
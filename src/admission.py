@@ -0,0 +1,243 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from . import db, metrics
+
+ADMISSION_CONFIG = {
+    "enabled": os.environ.get("TASK_ADMISSION", "on") == "on",
+    # Requests of a class handled at once. Beyond the pool size they would only wait for a
+    # connection, so the defaults leave some headroom for requests served from cache.
+    "read_limit": int(os.environ.get("TASK_ADMISSION_READS", 2 * db.POOL_CONFIG["max_size"])),
+    "write_limit": int(os.environ.get("TASK_ADMISSION_WRITES", db.POOL_CONFIG["max_size"])),
+    # Requests of a class that may wait for a slot, and for how long, before being shed.
+    "max_queue": int(os.environ.get("TASK_ADMISSION_QUEUE", 100)),
+    "queue_timeout": float(os.environ.get("TASK_ADMISSION_TIMEOUT", 2.0)),
+    "retry_after": int(os.environ.get("TASK_ADMISSION_RETRY_AFTER", 1)),
+}
+
+RATE_LIMIT_CONFIG = {
+    # Sustained requests per second per user; 0 turns per-user limits off.
+    "rate": float(os.environ.get("TASK_RATE_LIMIT", 0)),
+    "burst": float(os.environ.get("TASK_RATE_BURST", 0)) or None,
+    "max_users": int(os.environ.get("TASK_RATE_LIMIT_USERS", 10000)),
+}
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Not admission controlled: the change feed holds its connection open for as long as the
+# client listens, logins are bounded by the password hasher, and operators need the admin
+# and metrics routes most when the service is overloaded, as do probes of `/ready`.
+EXEMPT_PATHS = ("/tasks/events", "/token", "/admin/", "/metrics", "/ready")
+
+
+class Limiter:
+    """
+    Caps the requests of one route class in progress, with a bounded FIFO queue.
+
+    A request that finds every slot taken waits in the queue for up to `queue_timeout`
+    seconds; when the queue is full, or the wait runs out, it is shed instead.
+
+    Attributes:
+        route_class (str): "read" or "write", the label of its metrics.
+        limit (int): Requests admitted at once.
+        max_queue (int): Requests allowed to wait.
+        queue_timeout (float): Seconds a request may wait.
+    """
+
+    def __init__(self, route_class, limit, max_queue=100, queue_timeout=2.0):
+        self.route_class = route_class
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self._waiters = deque()
+        self._rejected = {"queue_full": 0, "timeout": 0}
+
+    async def acquire(self):
+        """
+        Waits for a slot.
+
+        Returns:
+            str or None: None once admitted; the reason ("queue_full" or "timeout") if shed.
+        """
+        if self.inflight < self.limit and not self._waiters:
+            self._admit()
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return self._reject("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        metrics.ADMISSION_QUEUED.inc(self.route_class)
+        started = time.perf_counter()
+        admitted = False
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            admitted = True
+        except asyncio.TimeoutError:
+            # The slot may have been handed over just as the wait ran out.
+            admitted = waiter.done() and not waiter.cancelled()
+            if not admitted:
+                return self._reject("timeout")
+        finally:
+            metrics.ADMISSION_QUEUED.inc(self.route_class, amount=-1)
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if not admitted and waiter.done() and not waiter.cancelled():
+                # Cancelled (the client went away) after being handed a slot: pass it on.
+                self.release()
+        # `release` handed its slot straight to this request.
+        metrics.ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, self.route_class)
+        return None
+
+    def release(self):
+        """
+        Frees a slot, handing it to the longest waiting request if there is one.
+        """
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.inflight -= 1
+        metrics.ADMISSION_INFLIGHT.inc(self.route_class, amount=-1)
+
+    def _admit(self):
+        self.inflight += 1
+        metrics.ADMISSION_INFLIGHT.inc(self.route_class)
+
+    def _reject(self, reason):
+        self._rejected[reason] += 1
+        metrics.ADMISSION_REJECTED.inc(self.route_class, reason)
+        return reason
+
+    def stats(self):
+        """
+        Reports the limiter's state.
+
+        Returns:
+            dict: Limit, requests in progress and queued, and rejections by reason.
+        """
+        return {"limit": self.limit, "inflight": self.inflight, "queued": len(self._waiters),
+                "max_queue": self.max_queue, "queue_timeout": self.queue_timeout, "rejected": dict(self._rejected)}
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that admits each request through the limiter of its route class.
+
+    Requests are held before any handler code runs, so a queued request costs neither a
+    threadpool thread nor a database connection. Shed requests get a 503 with `Retry-After`.
+    A slot is held until the response has been sent, including streamed bodies.
+    """
+
+    def __init__(self, app, limiters=None, retry_after=None):
+        self.app = app
+        self.limiters = limiters or _limiters
+        self.retry_after = retry_after or ADMISSION_CONFIG["retry_after"]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_CONFIG["enabled"] or scope["path"].startswith(EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+        limiter = self.limiters["read" if scope["method"] in READ_METHODS else "write"]
+        if await limiter.acquire() is not None:
+            response = JSONResponse({"detail": "Server busy, retry later"}, status_code=503,
+                                    headers={"Retry-After": str(self.retry_after)})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+class UserRateLimiter:
+    """
+    Token buckets per user: `rate` requests per second on average, bursts of up to `burst`.
+
+    Bounded LRU; a user pushed out starts again with a full bucket.
+
+    Attributes:
+        rate (float): Tokens added per second; 0 disables the limiter.
+        burst (float): Bucket capacity.
+        max_users (int): Buckets kept at once.
+    """
+
+    def __init__(self, rate, burst=None, max_users=10000):
+        self.rate = rate
+        self.burst = burst or max(2 * rate, 1)
+        self.max_users = max_users
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._limited = 0
+
+    def take(self, key):
+        """
+        Takes a token from a user's bucket.
+
+        Args:
+            key (str): The user.
+
+        Returns:
+            float: 0 if the request may proceed, else seconds until a token is available.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+            if wait:
+                self._limited += 1
+        return wait
+
+    def check(self, key):
+        """
+        Enforces the user's rate limit.
+
+        Args:
+            key (str): The user.
+
+        Raises:
+            HTTPException: 429 with `Retry-After` if the user is over the limit.
+        """
+        wait = self.take(key)
+        if wait:
+            metrics.ADMISSION_REJECTED.inc("user", "rate_limited")
+            raise HTTPException(status_code=429, detail="Rate limit exceeded",
+                                headers={"Retry-After": str(math.ceil(wait))})
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "users": len(self._buckets), "limited": self._limited}
+
+
+_limiters = {
+    "read": Limiter("read", ADMISSION_CONFIG["read_limit"], ADMISSION_CONFIG["max_queue"],
+                    ADMISSION_CONFIG["queue_timeout"]),
+    "write": Limiter("write", ADMISSION_CONFIG["write_limit"], ADMISSION_CONFIG["max_queue"],
+                     ADMISSION_CONFIG["queue_timeout"]),
+}
+
+user_limits = UserRateLimiter(RATE_LIMIT_CONFIG["rate"], RATE_LIMIT_CONFIG["burst"], RATE_LIMIT_CONFIG["max_users"])
+
+
+def stats():
+    """
+    Reports admission control and rate limiting state.
+
+    Returns:
+        dict: `enabled`, per-class limiter stats and the per-user rate limiter's stats.
+    """
+    return {"enabled": ADMISSION_CONFIG["enabled"], "read": _limiters["read"].stats(),
+            "write": _limiters["write"].stats(), "rate_limit": user_limits.stats()}
@@ -0,0 +1,157 @@
+"""
+Archival job that moves finished tasks out of the live `tasks` table.
+
+Finished tasks soon outnumber the active ones, and every index and cache page they occupy
+slows down the queries on the active ones. This job moves tasks that have been in a finished
+status for `after_days` into `tasks_archive`, together with their results, in batches of
+`batch_size`, each in its own short transaction. The archive is partitioned by month of
+`created_at`; the partitions are created as needed. Archived tasks are still found by
+`GET /tasks/{task_id}` and `/result`, and listed with `GET /tasks?archived=true`, but are
+read-only.
+
+    python -m src.archive --after-days 30 --batch-size 1000
+
+Run it periodically, e.g. hourly from cron; concurrent runs take turns.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from . import db, queries
+
+ARCHIVE_CONFIG = {
+    # Days a task must have been finished before it is archived.
+    "after_days": float(os.environ.get("TASK_ARCHIVE_AFTER_DAYS", 30)),
+    "batch_size": int(os.environ.get("TASK_ARCHIVE_BATCH_SIZE", 1000)),
+    # Statuses a task no longer leaves; only these are archived.
+    "statuses": tuple(os.environ.get("TASK_ARCHIVE_STATUSES", "done,failed").split(",")),
+    # Seconds between batches, to leave the database room for other work.
+    "pause": float(os.environ.get("TASK_ARCHIVE_PAUSE_SECONDS", 0.1)),
+}
+
+# Serialises archive runs, so two of them never create the same partition at once.
+ARCHIVE_LOCK_ID = 7_210_002
+
+
+def partition_name(month):
+    """
+    Names the archive partition of a month.
+
+    Args:
+        month (datetime): Any time in the month.
+
+    Returns:
+        str: E.g. "tasks_archive_2024_01".
+    """
+    return f"tasks_archive_{month:%Y_%m}"
+
+
+def create_partition_sql(month):
+    """
+    Builds the statement that creates the archive partition of a month, in UTC.
+
+    Args:
+        month (datetime): Any time in the month.
+
+    Returns:
+        str: The `CREATE TABLE ... PARTITION OF tasks_archive` statement.
+    """
+    start = datetime(month.year, month.month, 1)
+    end = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return (f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF tasks_archive "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}+00') TO ('{end:%Y-%m-%d}+00');")
+
+
+def archive_batch(cursor, partitions, after_days=30, batch_size=1000, statuses=("done", "failed")):
+    """
+    Moves one batch of finished tasks to the archive, in the cursor's transaction.
+
+    Tasks locked by a concurrent writer are skipped and picked up by a later batch.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        partitions (set): Names of the existing archive partitions; partitions created are added.
+        after_days (float): Days since its last update after which a finished task is archived.
+        batch_size (int): Most tasks moved.
+        statuses (Iterable[str]): Statuses a task is finished in.
+
+    Returns:
+        tuple: Tasks moved, and tasks found due (0 when nothing is left to archive).
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(%s);", (ARCHIVE_LOCK_ID,))
+    cursor.execute("SET LOCAL tasks.archiving = 'on';")
+    rows = queries.get_archive_candidates(cursor, statuses, after_days, batch_size)
+    if not rows:
+        return 0, 0
+    for month in sorted({row["month"] for row in rows}):
+        if partition_name(month) not in partitions:
+            cursor.execute(create_partition_sql(month))
+            partitions.add(partition_name(month))
+    return queries.archive_tasks(cursor, [row["id"] for row in rows]), len(rows)
+
+
+def archive(conn, after_days=30, batch_size=1000, statuses=("done", "failed"), pause=0.1, max_batches=None):
+    """
+    Archives finished tasks batch by batch until none are due.
+
+    Args:
+        conn (psycopg2.extensions.connection): A connection allowed to create tables.
+        after_days (float): Days since its last update after which a finished task is archived.
+        batch_size (int): Most tasks moved per transaction.
+        statuses (Iterable[str]): Statuses a task is finished in.
+        pause (float): Seconds to sleep between batches.
+        max_batches (Optional[int]): Stop after this many batches; run until done when omitted.
+
+    Returns:
+        dict: Tasks `moved` and `batches` committed.
+    """
+    stats = {"moved": 0, "batches": 0}
+    partitions = None
+    while max_batches is None or stats["batches"] < max_batches:
+        try:
+            with conn.cursor() as cur:
+                if partitions is None:
+                    partitions = queries.get_archive_partitions(cur)
+                moved, due = archive_batch(cur, partitions, after_days, batch_size, statuses)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        if not due:
+            break
+        stats["moved"] += moved
+        stats["batches"] += 1
+        if due < batch_size:
+            break
+        time.sleep(pause)
+    return stats
+
+
+def main():
+    """
+    Command line entry point.
+
+        python -m src.archive [--after-days N] [--batch-size N] [--max-batches N]
+    """
+    parser = argparse.ArgumentParser(description="Move finished tasks to the archive.")
+    parser.add_argument("--after-days", type=float, default=ARCHIVE_CONFIG["after_days"],
+                        help="days a task must have been finished")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_CONFIG["batch_size"],
+                        help="most tasks moved per transaction")
+    parser.add_argument("--max-batches", type=int, help="stop after this many batches")
+    args = parser.parse_args()
+
+    conn = db.get_connection()
+    try:
+        stats = archive(conn, args.after_days, args.batch_size, ARCHIVE_CONFIG["statuses"],
+                        ARCHIVE_CONFIG["pause"], args.max_batches)
+    finally:
+        conn.close()
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+from . import metrics, prepared, slow_queries
+from .db import DB_CONFIG, POOL_CONFIG, REPLICA_CONFIG, pool_busy_error
+
+_pools = {}
+_pool_lock = asyncio.Lock()
+
+# psycopg 3 counterpart of `prepared.PLAN_INVALIDATED`.
+_PLAN_INVALIDATED = (psycopg.errors.FeatureNotSupported, psycopg.errors.InvalidSqlStatementName)
+
+
+async def explain(conn, sql, params):
+    """
+    Async counterpart of `slow_queries.explain`: captures a plan in a rolled-back savepoint.
+
+    Args:
+        conn (psycopg.AsyncConnection): The connection the statement ran on.
+        sql (str): The statement.
+        params: Its parameters.
+
+    Returns:
+        str or None: The plan, or None if it could not be captured.
+    """
+    if conn.autocommit or conn.info.transaction_status != psycopg.pq.TransactionStatus.INTRANS:
+        return None
+    savepoint = slow_queries.EXPLAIN_SAVEPOINT
+    # A plain cursor, so that the EXPLAIN is not itself timed and explained.
+    async with psycopg.AsyncCursor(conn, row_factory=tuple_row) as cur:
+        await cur.execute(f"SAVEPOINT {savepoint};")
+        try:
+            await cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql.strip(), params)
+            return "\n".join(row[0] for row in await cur.fetchall())
+        except psycopg.Error:
+            return None
+        finally:
+            await cur.execute(f"ROLLBACK TO SAVEPOINT {savepoint};")
+            await cur.execute(f"RELEASE SAVEPOINT {savepoint};")
+
+
+class SlowQueryCursor(psycopg.AsyncCursor):
+    """
+    An `AsyncCursor` that reports statements slower than the threshold to `slow_queries.slow_log`.
+    """
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        result = await super().execute(query, params, **kwargs)
+        elapsed = time.perf_counter() - started
+        log = slow_queries.slow_log
+        if log.is_slow(elapsed):
+            plan = None
+            if isinstance(query, str) and log.should_explain(query):
+                plan = await explain(self.connection, query, params)
+            log.record(query if isinstance(query, str) else repr(query), params, elapsed, self.rowcount, plan)
+        return result
+
+
+class PreparedCursor(psycopg.AsyncCursor):
+    """
+    An `AsyncCursor` that has psycopg prepare the statements of `queries.PREPARED_STATEMENTS`
+    (see `prepared`).
+
+    Attributes:
+        writes (bool): Whether the cursor ran anything but a SELECT, i.e. whether its transaction
+            must be rolled back rather than committed when the handler leaves it open.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writes = False
+
+    async def execute(self, query, params=None, *, prepare=None, **kwargs):
+        self.writes = self.writes or not prepared.is_read(query)
+        if prepare is None and prepared.should_prepare(query):
+            prepare = True
+        began = self.connection.info.transaction_status == psycopg.pq.TransactionStatus.IDLE
+        try:
+            return await super().execute(query, params, prepare=prepare, **kwargs)
+        except _PLAN_INVALIDATED:
+            if not prepare:
+                raise
+            metrics.PREPARED_STATEMENTS.inc("invalidated")
+            if not began:
+                raise
+            # The rollback also drops psycopg's prepared statements, so the retry prepares afresh.
+            await self.connection.rollback()
+            return await super().execute(query, params, prepare=prepare, **kwargs)
+
+
+class Cursor(SlowQueryCursor, PreparedCursor):
+    """
+    The cursor of every pooled connection: reports slow statements and has psycopg prepare the
+    hot ones. Slow statements are logged with their original text.
+    """
+
+
+def get_conninfo(config=None):
+    """
+    Builds a libpq connection string from `DB_CONFIG`.
+
+    Args:
+        config (Optional[dict]): Connection parameters; `DB_CONFIG` (the primary) when omitted.
+
+    Returns:
+        str: The connection string for psycopg 3.
+    """
+    params = {("dbname" if key == "database" else key): value for key, value in (config or DB_CONFIG).items()}
+    return make_conninfo(**params)
+
+
+async def get_pool(role="primary"):
+    """
+    Returns the process-wide async connection pool of a server, opening it from `POOL_CONFIG` on first use.
+
+    The pool checks connections on checkout, recycles them after `max_lifetime` and waits up to
+    `acquire_timeout` for a free one, mirroring the sync pool in `db`.
+
+    Args:
+        role (str): "primary", or "replica" for the server in `db.REPLICA_CONFIG`.
+
+    Returns:
+        psycopg_pool.AsyncConnectionPool: The shared pool.
+    """
+    pool = _pools.get(role)
+    if pool is None:
+        async with _pool_lock:
+            pool = _pools.get(role)
+            if pool is None:
+                pool = AsyncConnectionPool(
+                    get_conninfo(REPLICA_CONFIG if role == "replica" else DB_CONFIG),
+                    kwargs={"row_factory": dict_row, "cursor_factory": Cursor,
+                            "prepare_threshold": 5 if prepared.PREPARED_CONFIG["enabled"] else None},
+                    min_size=POOL_CONFIG["min_size"],
+                    max_size=POOL_CONFIG["max_size"],
+                    timeout=POOL_CONFIG["acquire_timeout"],
+                    max_lifetime=POOL_CONFIG["max_lifetime"],
+                    check=AsyncConnectionPool.check_connection,
+                    open=False,
+                )
+                await pool.open()
+                _pools[role] = pool
+    return pool
+
+
+async def close_pool():
+    """
+    Closes the process-wide async pools that were ever opened.
+    """
+    async with _pool_lock:
+        for pool in _pools.values():
+            await pool.close()
+        _pools.clear()
+
+
+async def pool_stats(role="primary"):
+    """
+    Returns async pool usage in the same shape as `db.ConnectionPool.stats()`.
+
+    Args:
+        role (str): "primary" or "replica".
+
+    Returns:
+        dict: Open, in-use, idle and waiting connection counts plus checkout wait times in seconds.
+    """
+    pool = await get_pool(role)
+    raw = pool.get_stats()
+    size = raw.get("pool_size", 0)
+    idle = raw.get("pool_available", 0)
+    checkouts = raw.get("requests_num", 0)
+    wait_time = raw.get("requests_wait_ms", 0) / 1000.0
+    return {
+        "size": size,
+        "max_size": pool.max_size,
+        "in_use": size - idle,
+        "idle": idle,
+        "waiting": raw.get("requests_waiting", 0),
+        "checkouts": checkouts,
+        "wait_time_total": wait_time,
+        "wait_time_avg": wait_time / checkouts if checkouts else 0.0,
+        "timeouts": raw.get("requests_errors", 0),
+        "opened": raw.get("connections_num", 0),
+        "discarded": raw.get("connections_lost", 0),
+    }
+
+
+async def cursor_for(role="primary", timeout=None):
+    """
+    Async generator that yields a dict-row `AsyncCursor` on a connection from the pool of `role`.
+
+    The caller is responsible for committing; anything left uncommitted is rolled back
+    before the connection goes back to the pool. A transaction that only read is committed
+    instead, which has the same effect but keeps the connection's prepared statements: psycopg
+    drops them on every rollback.
+
+    Args:
+        role (str): "primary" or "replica".
+        timeout (Optional[float]): Seconds to wait for a connection; the pool timeout when None.
+
+    Yields:
+        psycopg.AsyncCursor: A cursor bound to a pooled connection.
+
+    Raises:
+        HTTPException: 503 if no connection could be acquired in time.
+    """
+    pool = await get_pool(role)
+    try:
+        with metrics.POOL_ACQUIRE_SECONDS.time(role):
+            conn = await pool.getconn(timeout)
+    except PoolTimeout:
+        raise pool_busy_error()
+    cur = None
+    try:
+        async with conn.cursor() as cur:
+            yield cur
+    finally:
+        if not conn.closed and conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+            try:
+                if conn.info.transaction_status == psycopg.pq.TransactionStatus.INTRANS and \
+                        not getattr(cur, "writes", True):
+                    await conn.commit()
+                else:
+                    await conn.rollback()
+            except psycopg.Error:
+                pass
+        await pool.putconn(conn)
+
+
+async def get_cursor():
+    """
+    FastAPI dependency that yields a dict-row `AsyncCursor` on a pooled primary connection.
+
+    The handler is responsible for committing; anything left uncommitted is rolled back
+    before the connection goes back to the pool.
+
+    Yields:
+        psycopg.AsyncCursor: A cursor bound to a pooled connection.
+
+    Raises:
+        HTTPException: 503 if no connection could be acquired before the pool timeout.
+    """
+    async with asynccontextmanager(cursor_for)("primary") as cur:
+        yield cur
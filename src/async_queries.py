@@ -0,0 +1,344 @@
+# Async counterparts of `queries` for a psycopg 3 `AsyncCursor`. Each function takes the
+# same arguments and runs the same SQL as its namesake in `queries`.
+
+from . import queries
+
+
+async def get_all_tasks(cursor, **filters):
+    """
+    Retrieve tasks from the database, ordered by their ID.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        **filters: Keyword arguments forwarded to `queries.build_task_list_query`.
+
+    Returns:
+        list: A list of dict rows from the 'tasks' table.
+    """
+    await cursor.execute(*queries.build_task_list_query(**filters))
+    return await cursor.fetchall()
+
+
+async def get_tasks_version(cursor, **filters):
+    """
+    Retrieve the version aggregate of a task listing page, used to answer conditional requests.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        **filters: Keyword arguments forwarded to `queries.build_task_version_query`.
+
+    Returns:
+        dict: `count`, `last_updated` and `id_sum` of the rows in the page.
+    """
+    await cursor.execute(*queries.build_task_version_query(**filters))
+    return await cursor.fetchone()
+
+
+async def iter_task_batches(connection, itersize=2000, **filters):
+    """
+    Streams tasks through a named (server-side) cursor, `itersize` rows at a time.
+
+    Args:
+        connection (psycopg.AsyncConnection): A connection with no other open named cursor.
+        itersize (int): Number of rows fetched from the server per round trip.
+        **filters: Keyword arguments forwarded to `queries.build_task_list_query`.
+
+    Yields:
+        list: Successive batches of task rows, ordered by ID.
+    """
+    async with connection.cursor(name="export_tasks") as cursor:
+        await cursor.execute(*queries.build_task_list_query(**filters))
+        while True:
+            rows = await cursor.fetchmany(itersize)
+            if not rows:
+                break
+            yield rows
+
+
+async def _copy_to_staging(cursor, columns, rows):
+    await cursor.execute(queries.CREATE_STAGING_SQL)
+    async with cursor.copy(f"COPY task_import ({', '.join(columns)}) FROM STDIN") as copy:
+        for row in rows:
+            await copy.write_row(row)
+
+
+async def create_tasks(cursor, names):
+    """
+    Inserts many tasks in one statement, each with a default status of 'queued'.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        names (list): Names of the tasks to create.
+
+    Returns:
+        list: The created task rows, in the same order as `names`.
+    """
+    if len(names) >= queries.BATCH_COPY_THRESHOLD:
+        await _copy_to_staging(cursor, ("ord", "name"), enumerate(names))
+        await cursor.execute(queries.INSERT_FROM_STAGING_SQL)
+    else:
+        await cursor.execute(queries.CREATE_TASKS_SQL, (list(names),))
+    return sorted(await cursor.fetchall(), key=lambda row: row["id"])
+
+
+async def update_tasks(cursor, items):
+    """
+    Updates the name and status of many tasks in one statement.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        items (list): `(task_id, name, status)` tuples; task IDs must be unique.
+
+    Returns:
+        list: The updated task rows. Tasks that do not exist are absent.
+    """
+    if len(items) >= queries.BATCH_COPY_THRESHOLD:
+        await _copy_to_staging(cursor, ("ord", "id", "name", "status"),
+                               ((ord_, *item) for ord_, item in enumerate(items)))
+        await cursor.execute(queries.UPDATE_FROM_STAGING_SQL)
+    else:
+        ids, names, statuses = (list(column) for column in zip(*items)) if items else ([], [], [])
+        await cursor.execute(queries.UPDATE_TASKS_SQL, (ids, names, statuses))
+    return await cursor.fetchall()
+
+
+async def delete_tasks(cursor, task_ids):
+    """
+    Deletes many tasks in one statement.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        task_ids (list): IDs of the tasks to delete.
+
+    Returns:
+        list: The deleted task rows. Tasks that do not exist are absent.
+    """
+    await cursor.execute(queries.DELETE_TASKS_SQL, (list(task_ids),))
+    return await cursor.fetchall()
+
+
+async def get_task_by_id(cursor, task_id):
+    """
+    Retrieve a task from the database by its ID.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        task_id (int): The ID of the task to retrieve.
+
+    Returns:
+        dict or None: The task row, live or archived, or None if no task exists with the given ID.
+    """
+    await cursor.execute(queries.GET_TASK_BY_ID_SQL, {"id": task_id})
+    return await cursor.fetchone()
+
+
+async def get_task_for_update(cursor, task_id):
+    """
+    Retrieve a task and lock it until the end of the current transaction.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        task_id (int): The ID of the task to lock.
+
+    Returns:
+        dict or None: The task, or None if no task exists with the given ID.
+    """
+    await cursor.execute(queries.GET_TASK_FOR_UPDATE_SQL, (task_id,))
+    return await cursor.fetchone()
+
+
+async def create_task(cursor, name):
+    """
+    Inserts a new task with the given name and a default status of 'queued'.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        name (str): The name of the task to be created.
+
+    Returns:
+        dict: The newly created task row.
+    """
+    await cursor.execute(queries.CREATE_TASK_SQL, (name,))
+    return await cursor.fetchone()
+
+
+async def update_task(cursor, task_id, name, status):
+    """
+    Updates a task with the given name and status.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        task_id (int): The ID of the task to update.
+        name (str): The new name of the task.
+        status (str): The new status of the task.
+
+    Returns:
+        dict or None: The updated task row, or None if no task was updated.
+    """
+    await cursor.execute(queries.UPDATE_TASK_SQL, (name, status, task_id))
+    return await cursor.fetchone()
+
+
+async def delete_task(cursor, task_id):
+    """
+    Deletes a task by its ID.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        task_id (int): The ID of the task to be deleted.
+
+    Returns:
+        dict or None: The deleted task row, or None if no task was deleted.
+    """
+    await cursor.execute(queries.DELETE_TASK_SQL, (task_id,))
+    return await cursor.fetchone()
+
+
+async def get_user_by_username(cursor, username):
+    """
+    Retrieve a user's credentials and role.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        username (str): The user to look up.
+
+    Returns:
+        dict or None: `username`, `password_hash` and `role`, or None if the user does not exist.
+    """
+    await cursor.execute(queries.GET_USER_BY_USERNAME_SQL, (username,))
+    return await cursor.fetchone()
+
+
+async def get_task_stats(cursor):
+    """
+    Reads the incrementally maintained task counters.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+
+    Returns:
+        dict: Row counts by status under `by_status`, and the `created`, `updated` and `deleted`
+        counts of each of `queries.STATS_WINDOWS` under `windows`.
+    """
+    await cursor.execute(queries.GET_STATUS_COUNTS_SQL)
+    by_status = {row["status"]: row["total"] for row in await cursor.fetchall()}
+    await cursor.execute(queries.GET_ACTIVITY_SQL)
+    return queries.stats_from_rows(by_status, await cursor.fetchone())
+
+
+async def get_replica_lag(cursor):
+    """
+    Measures how far behind the primary the server is, in seconds.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+
+    Returns:
+        float: Seconds since the last replayed transaction, 0 when fully caught up or not a replica.
+    """
+    await cursor.execute(queries.REPLICA_LAG_SQL)
+    return float((await cursor.fetchone())["lag"])
+
+
+async def set_statement_timeout(cursor, seconds):
+    """
+    Makes the server cancel any later statement of the current transaction that runs too long.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        seconds (float): The limit; it ends with the transaction.
+    """
+    await cursor.execute(queries.SET_STATEMENT_TIMEOUT_SQL, {"timeout": f"{max(1, int(seconds * 1000))}ms"})
+
+
+async def get_task_result(cursor, task_id):
+    """
+    Retrieves the outcome a worker recorded for a task, live or archived.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        task_id (int): The ID of the task.
+
+    Returns:
+        dict or None: The result row, or None if no worker has finished the task.
+    """
+    await cursor.execute(queries.GET_TASK_RESULT_SQL, {"id": task_id})
+    return await cursor.fetchone()
+
+
+async def claim_idempotency_key(cursor, username, key, fingerprint, ttl, lock_seconds):
+    """
+    Claims an idempotency key for a request, or reads back whoever holds it.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        username (str): The user the key belongs to.
+        key (str): The client's `Idempotency-Key`.
+        fingerprint (str): Digest of the request the key is used for.
+        ttl (float): Seconds after which a key may be reused.
+        lock_seconds (float): Seconds after which an unfinished claim may be taken over.
+
+    Returns:
+        dict or None: `claimed`, `fingerprint`, `status_code`, `response` and `headers`, or None
+        if the key was claimed by a transaction that committed after this one started.
+    """
+    await cursor.execute(queries.CLAIM_IDEMPOTENCY_KEY_SQL, {"username": username, "key": key,
+                                                            "fingerprint": fingerprint, "ttl": ttl,
+                                                            "lock": lock_seconds})
+    return await cursor.fetchone()
+
+
+async def complete_idempotency_key(cursor, username, key, fingerprint, status, response, headers):
+    """
+    Stores the response of the request that claimed an idempotency key.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        username (str): The user the key belongs to.
+        key (str): The client's `Idempotency-Key`.
+        fingerprint (str): Digest of the request, as claimed.
+        status (int): HTTP status of the response.
+        response (str): The response body as JSON.
+        headers (str): Replayed response headers as a JSON object.
+
+    Returns:
+        int: 1 if the response was stored, 0 if the claim had been taken over meanwhile.
+    """
+    await cursor.execute(queries.COMPLETE_IDEMPOTENCY_KEY_SQL, {"username": username, "key": key,
+                                                               "fingerprint": fingerprint, "status": status,
+                                                               "response": response, "headers": headers})
+    return cursor.rowcount
+
+
+async def release_idempotency_key(cursor, username, key, fingerprint):
+    """
+    Gives up an unfinished claim on an idempotency key, so a retry runs the request again.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        username (str): The user the key belongs to.
+        key (str): The client's `Idempotency-Key`.
+        fingerprint (str): Digest of the request, as claimed.
+
+    Returns:
+        int: 1 if the claim was released.
+    """
+    await cursor.execute(queries.RELEASE_IDEMPOTENCY_KEY_SQL, {"username": username, "key": key,
+                                                              "fingerprint": fingerprint})
+    return cursor.rowcount
+
+
+async def prune_idempotency_keys(cursor, ttl, limit=1000):
+    """
+    Deletes up to `limit` expired idempotency keys.
+
+    Args:
+        cursor (psycopg.AsyncCursor): The async database cursor.
+        ttl (float): Seconds a key is kept.
+        limit (int): Most keys to delete.
+
+    Returns:
+        int: Number of keys deleted.
+    """
+    await cursor.execute(queries.PRUNE_IDEMPOTENCY_KEYS_SQL, {"ttl": ttl, "limit": limit})
+    return cursor.rowcount
@@ -1,40 +1,175 @@
 # auth.py
 
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 
-from . import models
+from . import admission, metrics, models, users
 
 # Secret key (in real apps, keep this secret and load via env vars)
 SECRET_KEY = "mysecretkey"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Dummy user db
-fake_users_db = {
-    "admin": {
-        "username": "admin",
-        "password": "secret",  # In real apps, store hashed passwords
-        "role": "admin"
-    },
-    "readonly": {
-        "username": "readonly",
-        "password": "secret",
-        "role": "readonly"
-    }
-}
+# Verified tokens kept in memory so repeat requests skip signature verification. 0 disables the cache.
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 4096))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
 
-def authenticate_user(username: str, password: str):
+# python-jose loads its crypto backends on import, which takes tens of milliseconds. It is only
+# needed to issue and first verify tokens, so it is imported on first use (or by `warm_up`).
+def __getattr__(name):
+    if name in ("jwt", "JWTError"):
+        import jose
+        import jose.jwt
+
+        return getattr(jose, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class TokenCache:
+    """
+    A bounded, thread-safe LRU map from verified JWTs to the users they authenticate.
+
+    Each entry expires at its token's `exp` claim, so a cached token is never accepted for
+    longer than `jwt.decode` would accept it. Tokens without an `exp` claim are not cached.
+
+    Attributes:
+        max_size (int): Tokens kept before the least recently used one is evicted.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, token: str) -> Optional[models.User]:
+        """
+        Looks up a previously verified token.
+
+        Args:
+            token (str): The raw JWT.
+
+        Returns:
+            Optional[models.User]: The cached user, or None if the token is unknown or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, token: str, user: models.User, expires_at: Optional[float]):
+        """
+        Remembers a verified token until it expires.
+
+        Args:
+            token (str): The raw JWT.
+            user (models.User): The user it authenticates.
+            expires_at (Optional[float]): The token's `exp` claim as a Unix timestamp.
+        """
+        if self.max_size <= 0 or expires_at is None:
+            return
+        with self._lock:
+            self._entries[token] = (expires_at, user)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def discard(self, token: str):
+        """
+        Forgets a token, e.g. because it has been revoked.
+
+        Args:
+            token (str): The raw JWT.
+        """
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def discard_user(self, username: str):
+        """
+        Forgets every token of a user, e.g. after a password change or role change.
+
+        Args:
+            username (str): The user whose tokens are dropped.
+        """
+        with self._lock:
+            for token in [token for token, (_, user) in self._entries.items() if user.username == username]:
+                del self._entries[token]
+
+    def clear(self):
+        """
+        Forgets every token and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Reports cache effectiveness.
+
+        Returns:
+            dict: Hit, miss and eviction counters plus the current size.
+        """
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self._hits,
+                    "misses": self._misses, "evictions": self._evictions}
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+# Optional hook consulted whenever a token is verified for the first time: given the decoded
+# payload, it returns True if the token has been revoked.
+revocation_check: Optional[Callable[[dict], bool]] = None
+
+
+def revoke_token(token: str):
+    """
+    Evicts a revoked token from the verified-token cache.
+
+    The revocation itself must also be recorded where `revocation_check` can see it, so the
+    token is rejected when it is presented again.
+
+    Args:
+        token (str): The raw JWT.
+    """
+    token_cache.discard(token)
+
+
+def revoke_user(username: str):
+    """
+    Evicts every cached token of a user, e.g. after their access was withdrawn.
+
+    Args:
+        username (str): The user whose tokens are dropped.
+    """
+    token_cache.discard_user(username)
+
+
+async def authenticate_user(username: str, password: str):
     """
     Authenticates a user by verifying the provided username and password.
 
+    Credentials come from the `users` table (cached in `users.user_cache`) and the password
+    hash is verified on the bounded `users.hasher` thread pool, off the event loop.
+
     Args:
         username (str): The username of the user attempting to authenticate.
         password (str): The password of the user attempting to authenticate.
@@ -42,11 +177,14 @@ def authenticate_user(username: str, password: str):
     Returns:
         models.User: An instance of the User model if authentication is successful.
         None: If authentication fails due to incorrect username or password.
+
+    Raises:
+        users.HasherBusy: If too many logins are already being verified.
     """
-    user = fake_users_db.get(username)
-    if user and user["password"] == password:
-        return models.User(username=user["username"], role=user["role"])
-    return None
+    record = await users.authenticate(username, password)
+    if record is None:
+        return None
+    return models.User(username=record["username"], role=record["role"])
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -64,16 +202,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=15))
     to_encode = data.copy()
     to_encode.update({"exp": expire})
+    from jose import jwt
+
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def warm_up():
+    """
+    Loads the JWT library and runs one token through it, so the first request does not pay for it.
+    """
+    token = create_access_token({"sub": "warm-up", "role": "none"}, timedelta(seconds=60))
+    from jose import jwt
+
+    jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Retrieve the current user based on the provided JWT token.
 
     This function decodes the JWT token to extract user information such as
     username and role. If the token is invalid or the required information
-    is missing, an HTTP 401 Unauthorized exception is raised.
+    is missing, an HTTP 401 Unauthorized exception is raised. Tokens that were
+    already verified are answered from `token_cache` until they expire. The time
+    taken is recorded in `metrics.AUTH_SECONDS` as "cached", "verified" or "rejected".
+    Authenticated users are then held to their rate limit (`admission.user_limits`).
 
     Args:
         token (str): The JWT token provided in the request header.
@@ -84,8 +237,26 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
     Raises:
         HTTPException: If the token is invalid or the credentials cannot
-        be validated.
+        be validated, or 429 if the user is over their rate limit.
     """
+    started = time.perf_counter()
+    user = token_cache.get(token)
+    if user is not None:
+        metrics.AUTH_SECONDS.observe(time.perf_counter() - started, "cached")
+    else:
+        result = "rejected"
+        try:
+            user = _verify(token)
+            result = "verified"
+        finally:
+            metrics.AUTH_SECONDS.observe(time.perf_counter() - started, result)
+    admission.user_limits.check(user.username)
+    return user
+
+
+def _verify(token):
+    from jose import JWTError, jwt
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -97,7 +268,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         role: str = payload.get("role", "")
         if username is None or role is None:
             raise credentials_exception
-        return models.User(username=username, role=role)
+        if revocation_check is not None and revocation_check(payload):
+            raise credentials_exception
+        user = models.User(username=username, role=role)
+        token_cache.put(token, user, payload.get("exp"))
+        return user
     except JWTError:
         raise credentials_exception
 
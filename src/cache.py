@@ -0,0 +1,279 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+CACHE_CONFIG = {
+    "backend": os.environ.get("TASK_CACHE_BACKEND", "memory"),
+    "max_size": int(os.environ.get("TASK_CACHE_SIZE", 10000)),
+    "ttl": float(os.environ.get("TASK_CACHE_TTL", 30.0)),
+    "negative_ttl": float(os.environ.get("TASK_CACHE_NEGATIVE_TTL", 5.0)),
+}
+
+# Returned by `TaskCache.get` when nothing is cached for a task. A cached `None` means the
+# task is known not to exist.
+MISS = object()
+
+
+class TaskCache(ABC):
+    """
+    Interface of the single-task cache that sits in front of `queries.get_task_by_id`.
+
+    A shared backend (Redis, memcached, ...) implements these methods so that every worker
+    sees the same entries. Readers fill the cache through `fill` with a token taken before
+    they queried the database; writers refresh it through `put` or `invalidate`. A fill is
+    dropped if a write happened since its token was taken, so a slow reader can never put
+    back a row that a concurrent writer has just replaced.
+    """
+
+    @abstractmethod
+    def get(self, task_id):
+        """
+        Looks a task up.
+
+        Args:
+            task_id (int): ID of the task.
+
+        Returns:
+            dict, None or MISS: The cached row, None for a cached "not found", or `MISS`.
+        """
+
+    @abstractmethod
+    def token(self):
+        """
+        Marks the start of a database read.
+
+        Returns:
+            object: An opaque token to pass to `fill` after querying the database.
+        """
+
+    @abstractmethod
+    def fill(self, task_id, row, token):
+        """
+        Caches the result of a database read unless the cache was written since `token`.
+
+        Args:
+            task_id (int): ID of the task.
+            row (Optional[dict]): The row read, or None if the task does not exist.
+            token (object): Value of `token()` taken before the read.
+        """
+
+    @abstractmethod
+    def put(self, task_id, row):
+        """
+        Stores the current state of a task after a committed write.
+
+        Args:
+            task_id (int): ID of the task.
+            row (Optional[dict]): The row as written, or None if the task was deleted.
+        """
+
+    @abstractmethod
+    def invalidate(self, task_id):
+        """
+        Drops whatever is cached for a task.
+
+        Args:
+            task_id (int): ID of the task.
+        """
+
+    @abstractmethod
+    def clear(self):
+        """
+        Drops every entry and resets the counters.
+        """
+
+    @abstractmethod
+    def stats(self):
+        """
+        Reports cache effectiveness.
+
+        Returns:
+            dict: Hit, miss and eviction counters plus the current size.
+        """
+
+
+class NullTaskCache(TaskCache):
+    """
+    A cache that never stores anything, used when caching is disabled.
+    """
+
+    def __init__(self):
+        self._misses = 0
+
+    def get(self, task_id):
+        self._misses += 1
+        return MISS
+
+    def token(self):
+        return None
+
+    def fill(self, task_id, row, token):
+        pass
+
+    def put(self, task_id, row):
+        pass
+
+    def invalidate(self, task_id):
+        pass
+
+    def clear(self):
+        self._misses = 0
+
+    def stats(self):
+        return {"backend": "none", "size": 0, "hits": 0, "negative_hits": 0, "misses": self._misses,
+                "evictions": 0, "expirations": 0}
+
+
+class LRUCache(TaskCache):
+    """
+    Thread-safe in-process cache with LRU eviction and per-entry expiry.
+
+    Keys can be anything hashable; besides tasks it also holds user records for `users`.
+
+    Attributes:
+        max_size (int): Entries kept before the least recently used one is evicted.
+        ttl (float): Seconds a found task stays cached.
+        negative_ttl (float): Seconds a "not found" result stays cached.
+    """
+
+    def __init__(self, max_size=10000, ttl=30.0, negative_ttl=5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._hits = 0
+        self._negative_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, task_id):
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None:
+                self._misses += 1
+                return MISS
+            expires_at, row = entry
+            if expires_at <= time.monotonic():
+                del self._entries[task_id]
+                self._expirations += 1
+                self._misses += 1
+                return MISS
+            self._entries.move_to_end(task_id)
+            if row is None:
+                self._negative_hits += 1
+            else:
+                self._hits += 1
+            return row
+
+    def token(self):
+        with self._lock:
+            return self._writes
+
+    def fill(self, task_id, row, token):
+        with self._lock:
+            if token == self._writes:
+                self._store(task_id, row)
+
+    def put(self, task_id, row):
+        with self._lock:
+            self._writes += 1
+            self._store(task_id, row)
+
+    def invalidate(self, task_id):
+        with self._lock:
+            self._writes += 1
+            self._entries.pop(task_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._writes += 1
+            self._hits = self._negative_hits = self._misses = self._evictions = self._expirations = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "negative_hits": self._negative_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def _store(self, task_id, row):
+        ttl = self.negative_ttl if row is None else self.ttl
+        if ttl <= 0:
+            self._entries.pop(task_id, None)
+            return
+        self._entries[task_id] = (time.monotonic() + ttl, None if row is None else dict(row))
+        self._entries.move_to_end(task_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+
+def _create_cache():
+    backend = CACHE_CONFIG["backend"]
+    if backend == "memory":
+        return LRUCache(CACHE_CONFIG["max_size"], CACHE_CONFIG["ttl"], CACHE_CONFIG["negative_ttl"])
+    if backend == "none":
+        return NullTaskCache()
+    raise ValueError(f"TASK_CACHE_BACKEND must be 'memory' or 'none', not {backend!r}")
+
+
+_cache = _create_cache()
+
+
+def on_task_event(event):
+    """
+    Keeps an in-process cache in line with writes made by other processes, such as the other
+    server workers or the lease workers; `events.listener` calls it for every task change.
+
+    Args:
+        event (Optional[dict]): The change notification, or None when changes may have been
+            missed, in which case every entry is dropped.
+    """
+    if event is None:
+        _cache.clear()
+    else:
+        _cache.invalidate(event["id"])
+
+
+def is_local():
+    """
+    Reports whether the task cache lives in this process, so that writes from other processes
+    can only reach it through the change feed.
+
+    Returns:
+        bool: True for the `memory` backend.
+    """
+    return isinstance(_cache, LRUCache)
+
+
+def get_cache():
+    """
+    Returns the process-wide task cache.
+
+    Returns:
+        TaskCache: The configured cache backend.
+    """
+    return _cache
+
+
+def set_cache(cache):
+    """
+    Replaces the process-wide task cache, e.g. with a shared backend.
+
+    Args:
+        cache (TaskCache): The cache to use from now on.
+    """
+    global _cache
+    _cache = cache
@@ -0,0 +1,166 @@
+import gzip
+import os
+import zlib
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from . import etag
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+COMPRESSION_CONFIG = {
+    # Bodies smaller than this are sent as they are; compressing them costs more than it saves.
+    "minimum_size": int(os.environ.get("TASK_COMPRESS_MIN_SIZE", 1024)),
+    "gzip_level": int(os.environ.get("TASK_GZIP_LEVEL", 6)),
+    # Brotli quality 4 compresses better than gzip -6 at a similar CPU cost; 11 is far slower.
+    "brotli_quality": int(os.environ.get("TASK_BROTLI_QUALITY", 4)),
+    # Bodies at least this large are compressed on the threadpool instead of the event loop.
+    "thread_minimum_size": int(os.environ.get("TASK_COMPRESS_THREAD_MIN_SIZE", 256 * 1024)),
+}
+
+# Already compressed, or streams whose events must not sit in a compressor's buffer.
+EXCLUDED_MEDIA_TYPES = ("text/event-stream", "application/gzip", "application/zip")
+
+
+def choose_encoding(accept_encoding):
+    """
+    Picks the content coding from an `Accept-Encoding` header, preferring brotli.
+
+    Args:
+        accept_encoding (str): The header value.
+
+    Returns:
+        str or None: "br", "gzip", or None to send the body unencoded.
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    wildcard = qualities.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if qualities.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+class _Compressor:
+    """
+    Incremental compressor for one response body.
+    """
+
+    def __init__(self, coding, config):
+        self.coding = coding
+        if coding == "br":
+            self._compressor = brotli.Compressor(quality=config["brotli_quality"])
+        else:
+            self._compressor = zlib.compressobj(config["gzip_level"], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data, final):
+        if self.coding == "br":
+            out = self._compressor.process(data)
+            return out + (self._compressor.finish() if final else self._compressor.flush())
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def compress(body, coding, config=COMPRESSION_CONFIG):
+    """
+    Compresses a whole body.
+
+    Args:
+        body (bytes): The body.
+        coding (str): "br" or "gzip".
+        config (dict): Compression levels, as in `COMPRESSION_CONFIG`.
+
+    Returns:
+        bytes: The encoded body.
+    """
+    if coding == "br":
+        return brotli.compress(body, quality=config["brotli_quality"])
+    return gzip.compress(body, compresslevel=config["gzip_level"], mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses responses with brotli or gzip, as the client accepts.
+
+    Single-message bodies below `minimum_size` are left alone. Streamed bodies are compressed
+    chunk by chunk and flushed after each one, so consumers still see every batch as soon as
+    it is produced. A compressed response varies on `Accept-Encoding` and its ETag gets a
+    suffix naming the coding (see `etag.encoded`).
+    """
+
+    def __init__(self, app, config=COMPRESSION_CONFIG):
+        self.app = app
+        self.config = config
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+                passthrough = ("content-encoding" in headers or message["status"] in (204, 206, 304)
+                               or media_type in EXCLUDED_MEDIA_TYPES)
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.config["minimum_size"]:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers["Content-Encoding"] = coding
+                if "etag" in headers:
+                    headers["ETag"] = etag.encoded(headers["etag"], coding)
+                if not more_body:
+                    if len(body) >= self.config["thread_minimum_size"]:
+                        body = await run_in_threadpool(compress, body, coding, self.config)
+                    else:
+                        body = compress(body, coding, self.config)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                compressor = _Compressor(coding, self.config)
+                await send(start)
+            await send({"type": "http.response.body", "body": compressor.compress(body, not more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
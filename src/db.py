@@ -1,22 +1,78 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.pool
+from fastapi import HTTPException, status
+
+from . import metrics, prepared, slow_queries
 
 DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'task_manager',
-    'user': 'your_user_name',
-    'password': 'your_user_password',
-    'port': 5432
+    "host": "localhost",
+    "database": "task_manager",
+    "user": "your_user_name",
+    "password": "your_user_password",
+    "port": 5432
+}
+
+# Pool sizing and housekeeping. Every value can be overridden from the environment.
+POOL_CONFIG = {
+    "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 1)),
+    "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+    "acquire_timeout": float(os.environ.get("DB_POOL_ACQUIRE_TIMEOUT", 5.0)),
+    "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800.0)),
+    "health_check_after": float(os.environ.get("DB_POOL_HEALTH_CHECK_AFTER", 30.0)),
 }
 
+# Optional streaming replica that read-only routes may use. Reads go to the primary when unset.
+REPLICA_CONFIG = dict(
+    DB_CONFIG,
+    host=os.environ["DB_REPLICA_HOST"],
+    port=int(os.environ.get("DB_REPLICA_PORT", DB_CONFIG["port"])),
+) if os.environ.get("DB_REPLICA_HOST") else None
+
+ROUTING_CONFIG = {
+    # Seconds after a client's write during which its reads stay on the primary.
+    "read_your_writes": float(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", 5.0)),
+    # Replica lag, in seconds, beyond which reads fall back to the primary.
+    "max_replica_lag": float(os.environ.get("DB_REPLICA_MAX_LAG", 2.0)),
+    # Seconds a replica lag measurement is trusted before it is taken again.
+    "lag_check_interval": float(os.environ.get("DB_REPLICA_LAG_CHECK_INTERVAL", 1.0)),
+}
+
+_BROKEN_CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class Cursor(slow_queries.SlowQueryCursor, prepared.PreparedCursor):
+    """
+    The cursor of every connection: a RealDictCursor that reports slow statements and runs the
+    hot statements as prepared statements. Slow statements are logged with their original text.
+    """
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    """
+    Raised when no connection could be checked out of the pool before the acquire timeout.
+    """
+
 
-def get_connection():
+def get_connection(config=None):
     """
     Establishes and returns a connection to the PostgreSQL database.
 
     The connection is created using the configuration specified in the 
-    `DB_CONFIG` dictionary and uses a RealDictCursor for the cursor factory, 
-    which allows query results to be returned as dictionaries.
+    `DB_CONFIG` dictionary and uses `Cursor`, a RealDictCursor, for the cursor factory,
+    which allows query results to be returned as dictionaries. Statements slower
+    than the slow query threshold are reported to `slow_queries.slow_log`, and those
+    in `queries.PREPARED_STATEMENTS` are prepared on first use (see `prepared`).
+
+    Args:
+        config (Optional[dict]): Connection parameters; `DB_CONFIG` (the primary) when omitted.
 
     Returns:
         psycopg2.extensions.connection: A connection object to interact with the database.
@@ -25,4 +81,346 @@ def get_connection():
         psycopg2.OperationalError: If the connection to the database fails.
         psycopg2.DatabaseError: For other database-related errors.
     """
-    return psycopg2.connect(**DB_CONFIG, cursor_factory=psycopg2.extras.RealDictCursor)
+    return psycopg2.connect(**(config or DB_CONFIG), connection_factory=prepared.PreparedConnection,
+                            cursor_factory=Cursor)
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of PostgreSQL connections shared by all request handlers.
+
+    Connections are handed out most-recently-used first so that a small working set stays
+    warm. On checkout a connection is recycled once it outlives `max_lifetime`, and it is
+    pinged with `SELECT 1` if it sat idle for longer than `health_check_after` seconds.
+    On return any open transaction is rolled back so the next borrower starts clean.
+
+    Attributes:
+        min_size (int): Connections opened eagerly by `open()`.
+        max_size (int): Upper bound on open connections (idle plus in use).
+        acquire_timeout (float): Seconds a caller waits for a free connection before `PoolTimeout`.
+        max_lifetime (float): Seconds after which a connection is closed and replaced.
+        health_check_after (float): Idle seconds after which a connection is pinged on checkout.
+    """
+
+    def __init__(self, connect=get_connection, min_size=1, max_size=10, acquire_timeout=5.0,
+                 max_lifetime=1800.0, health_check_after=30.0):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._born = {}
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._wait_count = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._opened = 0
+        self._discarded = 0
+
+    def open(self):
+        """
+        Pre-opens `min_size` connections so the first requests do not pay the connect cost.
+        """
+        conns = [self.getconn() for _ in range(self.min_size)]
+        for conn in conns:
+            self.putconn(conn)
+
+    def getconn(self, timeout=None):
+        """
+        Checks a connection out of the pool, opening a new one if the pool is below `max_size`.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for a free connection. Defaults to `acquire_timeout`.
+
+        Returns:
+            psycopg2.extensions.connection: A healthy connection with no transaction in progress.
+
+        Raises:
+            PoolTimeout: If no connection became available in time.
+            psycopg2.pool.PoolError: If the pool has been closed.
+            psycopg2.OperationalError: If a new connection could not be established.
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        conn = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"no connection available within {timeout:.2f}s")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+            waited = time.monotonic() - start
+            self._wait_count += 1
+            self._wait_time += waited
+            self._max_wait = max(self._max_wait, waited)
+
+        try:
+            if conn is not None and not self._is_usable(conn, last_used):
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._open_connection()
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """
+        Returns a connection to the pool.
+
+        Args:
+            conn (psycopg2.extensions.connection): The connection obtained from `getconn`.
+            discard (bool): Close the connection instead of keeping it, e.g. after a network error.
+        """
+        if not discard:
+            discard = conn.closed or self._expired(conn) or not self._reset(conn)
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                self._discarded += 1
+                self._born.pop(id(conn), None)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if discard or self._closed:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Context manager that checks a connection out and always gives it back.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for a free connection.
+
+        Yields:
+            psycopg2.extensions.connection: The pooled connection.
+        """
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+        except _BROKEN_CONNECTION_ERRORS:
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def stats(self):
+        """
+        Returns a snapshot of pool usage.
+
+        Returns:
+            dict: Open, in-use, idle and waiting connection counts plus checkout wait times in seconds.
+        """
+        with self._cond:
+            return {
+                "size": self._size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "checkouts": self._wait_count,
+                "wait_time_total": self._wait_time,
+                "wait_time_avg": self._wait_time / self._wait_count if self._wait_count else 0.0,
+                "wait_time_max": self._max_wait,
+                "timeouts": self._timeouts,
+                "opened": self._opened,
+                "discarded": self._discarded,
+            }
+
+    def close(self):
+        """
+        Closes every idle connection and refuses further checkouts. Connections still in use
+        are closed when they are returned.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def _open_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self._born[id(conn)] = time.monotonic()
+            self._opened += 1
+        return conn
+
+    def _expired(self, conn):
+        born = self._born.get(id(conn))
+        return born is not None and time.monotonic() - born > self.max_lifetime
+
+    def _is_usable(self, conn, last_used):
+        if conn.closed or self._expired(conn):
+            return False
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _reset(conn):
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close_quietly(self, conn):
+        with self._cond:
+            self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def has_replica():
+    """
+    Reports whether a read replica is configured.
+
+    Returns:
+        bool: True when `DB_REPLICA_HOST` is set.
+    """
+    return REPLICA_CONFIG is not None
+
+
+def get_pool(role="primary"):
+    """
+    Returns the process-wide connection pool of a server, creating it from `POOL_CONFIG` on first use.
+
+    Args:
+        role (str): "primary", or "replica" for the server in `REPLICA_CONFIG`.
+
+    Returns:
+        ConnectionPool: The shared pool.
+    """
+    pool = _pools.get(role)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(role)
+            if pool is None:
+                config = REPLICA_CONFIG if role == "replica" else DB_CONFIG
+                pool = ConnectionPool(lambda: get_connection(config), **POOL_CONFIG)
+                pool.open()
+                _pools[role] = pool
+    return pool
+
+
+def close_pool():
+    """
+    Closes the process-wide pools that were ever created.
+    """
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def pool_busy_error():
+    """
+    Builds the error returned when no pooled connection is available in time.
+
+    Returns:
+        HTTPException: A 503 response asking the client to retry shortly.
+    """
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Database is busy, try again later",
+        headers={"Retry-After": "1"},
+    )
+
+
+def cursor_for(role="primary", timeout=None):
+    """
+    Generator that yields a `Cursor` on a connection from the pool of `role`.
+
+    The caller is responsible for committing (`cur.connection.commit()`); anything left
+    uncommitted is rolled back when the connection goes back to the pool.
+
+    Args:
+        role (str): "primary" or "replica".
+        timeout (Optional[float]): Seconds to wait for a connection; the pool's `acquire_timeout` when None.
+
+    Yields:
+        Cursor: A dict-row cursor bound to a pooled connection.
+
+    Raises:
+        HTTPException: 503 if no connection could be acquired in time.
+    """
+    pool = get_pool(role)
+    try:
+        with metrics.POOL_ACQUIRE_SECONDS.time(role):
+            conn = pool.getconn(timeout)
+    except PoolTimeout:
+        raise pool_busy_error()
+    discard = False
+    try:
+        with conn.cursor() as cur:
+            yield cur
+    except _BROKEN_CONNECTION_ERRORS:
+        discard = True
+        raise
+    finally:
+        pool.putconn(conn, discard=discard)
+
+
+def get_cursor():
+    """
+    FastAPI dependency that yields a `Cursor` on a pooled primary connection.
+
+    The handler is responsible for committing (`cur.connection.commit()`); anything left
+    uncommitted is rolled back when the connection goes back to the pool.
+
+    Yields:
+        Cursor: A dict-row cursor bound to a pooled connection.
+
+    Raises:
+        HTTPException: 503 if no connection could be acquired before the pool's acquire timeout.
+    """
+    yield from cursor_for("primary")
@@ -0,0 +1,183 @@
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+
+def field(row, name):
+    """
+    Reads a column from a database row or a model instance.
+
+    Args:
+        row (dict or pydantic.BaseModel): The task.
+        name (str): The column name.
+
+    Returns:
+        The column value.
+    """
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def task_etag(task, variant=""):
+    """
+    Builds the strong ETag of a single task from its ID and `updated_at`.
+
+    Every write bumps `updated_at`, so the tag changes exactly when the representation does.
+
+    Args:
+        task (dict or models.Task): The task.
+        variant (str): Suffix naming a non-JSON representation, e.g. "msgpack".
+
+    Returns:
+        str: The quoted entity tag.
+    """
+    updated_at = _as_utc(field(task, "updated_at"))
+    micros = int(updated_at.timestamp()) * 1_000_000 + updated_at.microsecond
+    suffix = f".{variant}" if variant else ""
+    return f'"{field(task, "id")}-{micros:x}{suffix}"'
+
+
+def page_etag(version, variant=""):
+    """
+    Builds the strong ETag of a task listing page from its version aggregate.
+
+    Args:
+        version (dict): `count`, `last_updated` and `id_sum` of the rows in the page.
+        variant (str): Anything else the representation depends on, e.g. the projected fields.
+
+    Returns:
+        str: The quoted entity tag.
+    """
+    last_updated = version["last_updated"]
+    stamp = _as_utc(last_updated).isoformat() if last_updated else ""
+    digest = hashlib.blake2b(f'{version["count"]}|{version["id_sum"]}|{stamp}|{variant}'.encode(),
+                             digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def page_version(tasks):
+    """
+    Computes the same aggregate as `queries.get_tasks_version` from rows already fetched.
+
+    Args:
+        tasks (list): Rows of the page, including `id` and `updated_at`.
+
+    Returns:
+        dict: `count`, `last_updated` and `id_sum` of the rows.
+    """
+    return {
+        "count": len(tasks),
+        "last_updated": max((field(task, "updated_at") for task in tasks), default=None),
+        "id_sum": sum(field(task, "id") for task in tasks),
+    }
+
+
+def validators(tag, last_modified=None):
+    """
+    Builds the validator headers of a response.
+
+    Args:
+        tag (str): The entity tag.
+        last_modified (Optional[datetime]): When the representation last changed.
+
+    Returns:
+        dict: `ETag` and, when known, `Last-Modified` headers.
+    """
+    headers = {"ETag": tag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+# Content codings `encoded` marks a tag with; see `compression.CompressionMiddleware`.
+CONTENT_CODINGS = ("br", "gzip")
+
+
+def encoded(tag, coding):
+    """
+    Derives the entity tag of a compressed response from the tag of its uncompressed body.
+
+    The encoded bytes differ, so a strong tag must differ too, or a cache could combine ranges
+    of the two bodies. Comparisons ignore the suffix, so either tag validates the task.
+
+    Args:
+        tag (str): The quoted tag, weak or strong.
+        coding (str): One of `CONTENT_CODINGS`.
+
+    Returns:
+        str: The tag with `-<coding>` appended inside its quotes.
+    """
+    return f'{tag[:-1]}-{coding}"' if tag.endswith('"') else tag
+
+
+def _tags(header):
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def _unencoded(tag):
+    for coding in CONTENT_CODINGS:
+        if tag.endswith(f'-{coding}"'):
+            return f'{tag[:-len(coding) - 2]}"'
+    return tag
+
+
+def _opaque(tag):
+    return _unencoded(tag[2:] if tag.startswith("W/") else tag)
+
+
+def if_match(header, *tags):
+    """
+    Evaluates an `If-Match` header using strong comparison, ignoring a content-coding suffix.
+
+    Args:
+        header (str): The header value.
+        *tags (str): The current entity tags, one per representation of the resource.
+
+    Returns:
+        bool: True if the request may proceed.
+    """
+    sent = {_unencoded(tag) for tag in _tags(header)}
+    return "*" in sent or any(tag in sent for tag in tags)
+
+
+def is_not_modified(headers, tag, last_modified=None):
+    """
+    Evaluates `If-None-Match`, or `If-Modified-Since` when no `If-None-Match` is sent.
+
+    Args:
+        headers (Mapping[str, str]): The request headers.
+        tag (str): The current entity tag.
+        last_modified (Optional[datetime]): When the representation last changed.
+
+    Returns:
+        bool: True if the client's copy is current and a 304 should be sent.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = _tags(if_none_match)
+        return "*" in tags or _opaque(tag) in {_opaque(candidate) for candidate in tags}
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+
+
+def is_conditional(headers):
+    """
+    Reports whether a GET carries validators worth checking before running the full query.
+
+    Args:
+        headers (Mapping[str, str]): The request headers.
+
+    Returns:
+        bool: True if `If-None-Match` or `If-Modified-Since` is present.
+    """
+    return "if-none-match" in headers or "if-modified-since" in headers
+
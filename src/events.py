@@ -0,0 +1,320 @@
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+
+import psycopg2
+from starlette.concurrency import run_in_threadpool
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CONFIG = {
+    # Channel the `tasks_notify` trigger (schema migration 5) publishes on.
+    "channel": "task_events",
+    # Recent events kept for clients resuming with `Last-Event-ID`.
+    "replay": int(os.environ.get("TASK_EVENTS_REPLAY", 1000)),
+    # Events buffered per subscriber; a subscriber that falls further behind is reset.
+    "queue_size": int(os.environ.get("TASK_EVENTS_QUEUE_SIZE", 256)),
+    # Seconds between keep-alive comments on an idle stream.
+    "heartbeat": float(os.environ.get("TASK_EVENTS_HEARTBEAT", 15.0)),
+    "reconnect_delay": float(os.environ.get("TASK_EVENTS_RECONNECT_DELAY", 1.0)),
+}
+
+# Queued to wake a subscriber that has to start over.
+_RESET = object()
+
+
+class Subscription:
+    """
+    One client's view of the change feed.
+
+    Attributes:
+        queue (asyncio.Queue): Events not yet sent to the client.
+        reset (bool): Set when events were lost for this client, which must then refetch.
+    """
+
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(queue_size)
+        self.reset = False
+
+    def offer(self, event):
+        """
+        Queues an event without waiting.
+
+        Returns:
+            bool: False if the queue is full.
+        """
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self):
+        """
+        Marks the subscription as reset and wakes its reader.
+        """
+        self.reset = True
+        try:
+            self.queue.put_nowait(_RESET)
+        except asyncio.QueueFull:
+            pass
+
+
+class EventBroker:
+    """
+    Fans task change events out to every subscriber of this process.
+
+    Publishing never blocks: each subscriber has a bounded queue, and one that is full is
+    reset instead of buffering without limit. Recent events are kept so that a client that
+    reconnects with the last event ID it saw misses nothing.
+
+    Attributes:
+        queue_size (int): Events buffered per subscriber.
+    """
+
+    def __init__(self, replay=1000, queue_size=256):
+        self.queue_size = queue_size
+        self._history = deque(maxlen=replay)
+        self._subscribers = set()
+        self._published = 0
+        self._resets = 0
+
+    def publish(self, event):
+        """
+        Delivers an event to every subscriber.
+
+        Args:
+            event (dict): The change, with an `event_id`.
+        """
+        self._history.append(event)
+        self._published += 1
+        for subscription in list(self._subscribers):
+            if not subscription.reset and not subscription.offer(event):
+                self._resets += 1
+                subscription.close()
+
+    def reset(self):
+        """
+        Resets every subscriber and forgets the history, after events may have been missed.
+        """
+        self._history.clear()
+        for subscription in list(self._subscribers):
+            self._resets += 1
+            subscription.close()
+
+    def last_event_id(self):
+        """
+        Returns:
+            Optional[int]: ID of the newest event seen, or None.
+        """
+        return self._history[-1]["event_id"] if self._history else None
+
+    def subscribe(self, last_event_id=None):
+        """
+        Registers a subscriber, optionally resuming after an event it has already seen.
+
+        Args:
+            last_event_id (Optional[str]): The `Last-Event-ID` sent by the client.
+
+        Returns:
+            tuple: The `Subscription` and the list of missed events to send first. The
+            subscription is already reset if `last_event_id` is no longer in the history.
+        """
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        if last_event_id is None:
+            return subscription, []
+        history = list(self._history)
+        for position, event in enumerate(history):
+            if str(event["event_id"]) == last_event_id.strip():
+                return subscription, history[position + 1:]
+        self._resets += 1
+        subscription.close()
+        return subscription, []
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def stats(self):
+        """
+        Reports feed activity.
+
+        Returns:
+            dict: Subscribers, events published and kept for replay, and subscriber resets.
+        """
+        return {"subscribers": len(self._subscribers), "published": self._published,
+                "replayable": len(self._history), "resets": self._resets}
+
+
+class Listener:
+    """
+    Holds this process's single `LISTEN` connection and publishes what it receives.
+
+    The connection is watched with the event loop's reader callbacks, so it costs neither a
+    thread nor a pool slot. If it drops, it is re-established and every subscriber is reset,
+    since notifications sent in between are lost.
+
+    Observers registered with `observe` see every change as well, and None whenever the
+    connection is (re)established, since changes may have been missed until then.
+    """
+
+    def __init__(self, broker, channel="task_events", reconnect_delay=1.0, connect=db.get_connection):
+        self.broker = broker
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._connect = connect
+        self._task = None
+        self._reconnects = 0
+        self._observers = []
+
+    def observe(self, callback):
+        """
+        Registers a callback for every change received, if not already registered.
+
+        Args:
+            callback (Callable[[Optional[dict]], None]): Called with each change event, and with
+                None when changes may have been missed.
+        """
+        if callback not in self._observers:
+            self._observers.append(callback)
+
+    def _notify(self, event):
+        for callback in self._observers:
+            callback(event)
+
+    def start(self):
+        """
+        Starts listening in the background, if not already listening.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = await run_in_threadpool(self._connect)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel};")
+                if connected_before:
+                    self._reconnects += 1
+                    self.broker.reset()
+                connected_before = True
+                self._notify(None)
+                readable = asyncio.Event()
+                loop.add_reader(conn.fileno(), readable.set)
+                try:
+                    while True:
+                        await readable.wait()
+                        readable.clear()
+                        conn.poll()
+                        while conn.notifies:
+                            event = parse_event(conn.notifies.pop(0).payload)
+                            if event is None:
+                                continue
+                            self._notify(event)
+                            self.broker.publish(event)
+                finally:
+                    loop.remove_reader(conn.fileno())
+            except (psycopg2.Error, OSError):
+                pass
+            finally:
+                if conn is not None:
+                    conn.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def close(self):
+        """
+        Stops listening and closes the connection.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+            self._task = None
+
+    def stats(self):
+        return {"listening": self._task is not None and not self._task.done(), "reconnects": self._reconnects}
+
+
+def parse_event(payload):
+    """
+    Decodes a notification sent on the change feed's channel.
+
+    Any session may `NOTIFY` the channel, so a payload that is not a task change is logged and
+    skipped rather than allowed to stop the listener.
+
+    Args:
+        payload (str): The notification's payload.
+
+    Returns:
+        Optional[dict]: The change, or None if the payload is not one.
+    """
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        event = None
+    if not isinstance(event, dict) or "event_id" not in event or "id" not in event:
+        logger.warning("ignoring a notification that is not a task change: %.200r", payload)
+        return None
+    return event
+
+
+def format_event(event):
+    """
+    Renders a change event as a Server-Sent Events message.
+
+    Args:
+        event (dict): The change, with an `event_id`.
+
+    Returns:
+        str: The `id`, `event` and `data` lines of the message.
+    """
+    return f"id: {event['event_id']}\nevent: task\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream(broker, subscription, backlog, heartbeat=15.0):
+    """
+    Writes a subscription out as Server-Sent Events until it is reset or the client leaves.
+
+    A `reset` message ends the stream: the client missed events and must refetch the tasks
+    it shows. It carries the newest event ID, so reconnecting resumes from there.
+
+    Args:
+        broker (EventBroker): The broker the subscription belongs to.
+        subscription (Subscription): The subscription to drain.
+        backlog (list): Missed events to send first.
+        heartbeat (float): Seconds between keep-alive comments on an idle stream.
+
+    Yields:
+        str: SSE messages.
+    """
+    try:
+        for event in backlog:
+            yield format_event(event)
+        while not subscription.reset:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is _RESET:
+                break
+            yield format_event(event)
+        last_event_id = broker.last_event_id()
+        yield f"id: {'' if last_event_id is None else last_event_id}\nevent: reset\ndata: {{}}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+broker = EventBroker(EVENTS_CONFIG["replay"], EVENTS_CONFIG["queue_size"])
+listener = Listener(broker, EVENTS_CONFIG["channel"], EVENTS_CONFIG["reconnect_delay"])
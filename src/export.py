@@ -0,0 +1,191 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from . import db, queries, serialize, storage
+
+# Rows fetched from the server-side cursor per round trip, and so per streamed chunk.
+EXPORT_ITERSIZE = int(os.environ.get("TASK_EXPORT_ITERSIZE", 2000))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def render_ndjson(rows, first=False):
+    """
+    Renders a batch of task rows as newline-delimited JSON.
+
+    Args:
+        rows (list): Task rows as dictionaries.
+        first (bool): Unused; present so every renderer has the same signature.
+
+    Returns:
+        str: One JSON object per line.
+    """
+    return "".join(json.dumps(row, default=serialize.json_default) + "\n" for row in rows)
+
+
+def render_csv(rows, first=False):
+    """
+    Renders a batch of task rows as CSV, with the header row before the first batch.
+
+    Args:
+        rows (list): Task rows as dictionaries.
+        first (bool): Whether this is the first batch of the export.
+
+    Returns:
+        str: The CSV text for the batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=queries.TASK_COLUMNS, extrasaction="ignore")
+    if first:
+        writer.writeheader()
+    for row in rows:
+        writer.writerow({key: value.isoformat() if isinstance(value, datetime) else value
+                         for key, value in row.items()})
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    "ndjson": render_ndjson,
+    "csv": render_csv,
+}
+
+
+def _render(batches, export_format):
+    render = RENDERERS[export_format]
+    first = True
+    for rows in batches:
+        yield render(rows, first)
+        first = False
+    if first and export_format == "csv":
+        yield render([], True)
+
+
+class Export:
+    """
+    A streaming export and the pooled connection it reads from.
+
+    Iterating it yields the rendered chunks. `aclose` returns the connection to the pool, and
+    must be called whether the body was read to the end, abandoned part way, or never read.
+    """
+
+    def __init__(self, chunks, release):
+        self._chunks = chunks
+        self._release = release
+        self._closed = False
+
+    def __aiter__(self):
+        if hasattr(self._chunks, "__aiter__"):
+            return self._chunks.__aiter__()
+        return iterate_in_threadpool(self._chunks)
+
+    async def aclose(self):
+        """
+        Stops the export, if it is still running, and returns its connection to the pool.
+        """
+        if not self._closed:
+            self._closed = True
+            await self._release()
+
+
+class ExportResponse(StreamingResponse):
+    """
+    Streams an `Export`, closing it once the response is over however it ended, including a
+    client that went away or a failed send before the first chunk.
+    """
+
+    def __init__(self, content, *args, **kwargs):
+        super().__init__(content, *args, **kwargs)
+        self.export = content
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if hasattr(self.export, "aclose"):
+                await self.export.aclose()
+
+
+def _close_sync(pool, conn, chunks):
+    try:
+        chunks.close()
+    finally:
+        pool.putconn(conn)
+
+
+def _open_sync(pool, conn, export_format, filters):
+    chunks = _render(queries.iter_task_batches(conn, EXPORT_ITERSIZE, **filters), export_format)
+    return Export(chunks, lambda: run_in_threadpool(_close_sync, pool, conn, chunks))
+
+
+async def _stream_async(conn, export_format, filters):
+    from . import async_queries
+
+    render = RENDERERS[export_format]
+    first = True
+    async for rows in async_queries.iter_task_batches(conn, EXPORT_ITERSIZE, **filters):
+        yield render(rows, first)
+        first = False
+    if first and export_format == "csv":
+        yield render([], True)
+
+
+def _open_async(pool, conn, export_format, filters):
+    chunks = _stream_async(conn, export_format, filters)
+
+    async def release():
+        try:
+            await chunks.aclose()
+            await conn.rollback()
+        finally:
+            await pool.putconn(conn)
+
+    return Export(chunks, release)
+
+
+async def stream_tasks(export_format, **filters):
+    """
+    Opens a streaming export of the tasks table on the configured backend.
+
+    The export reads from the replica when `storage.read_role` allows it. A connection is
+    checked out before streaming starts, so an exhausted pool still yields a clean 503 rather
+    than a truncated body. It is returned to the pool when the export is closed, which
+    `ExportResponse` does once the response is over.
+
+    Args:
+        export_format (str): One of the keys of `MEDIA_TYPES`.
+        **filters: Keyword arguments forwarded to `queries.build_task_list_query`.
+
+    Returns:
+        Export: The rendered export, one chunk per fetched batch.
+
+    Raises:
+        HTTPException: 503 if no connection could be acquired in time.
+    """
+    role = await storage.read_role()
+    if storage.is_async():
+        from psycopg_pool import PoolTimeout
+
+        from . import async_db
+
+        pool = await async_db.get_pool(role)
+        try:
+            conn = await pool.getconn()
+        except PoolTimeout:
+            raise db.pool_busy_error()
+        return _open_async(pool, conn, export_format, filters)
+
+    pool = await run_in_threadpool(db.get_pool, role)
+    try:
+        conn = await run_in_threadpool(pool.getconn)
+    except db.PoolTimeout:
+        raise db.pool_busy_error()
+    return _open_sync(pool, conn, export_format, filters)
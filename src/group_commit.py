@@ -0,0 +1,156 @@
+import asyncio
+import bisect
+import os
+import time
+
+from . import storage
+
+GROUP_COMMIT_CONFIG = {
+    # Off by default: a lone request waits up to `window` seconds for company before committing.
+    "enabled": os.environ.get("TASK_GROUP_COMMIT", "off") == "on",
+    "window": float(os.environ.get("TASK_GROUP_COMMIT_WINDOW_MS", 2.0)) / 1000,
+    "max_batch": int(os.environ.get("TASK_GROUP_COMMIT_MAX_BATCH", 128)),
+}
+
+# Upper bounds of the batch size and commit latency (milliseconds) histograms.
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+COMMIT_LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class _Histogram:
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self):
+        buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts)}
+        buckets["+Inf"] = self.counts[-1]
+        return {"count": self.total, "sum": round(self.sum, 3), "max": round(self.max, 3),
+                "mean": round(self.sum / self.total, 3) if self.total else 0.0, "buckets": buckets}
+
+
+class GroupCommitter:
+    """
+    Coalesces concurrent task creations into one multi-row insert and one commit.
+
+    The first creation to arrive opens a batch; the batch is written when `window` seconds have
+    passed or `max_batch` creations have joined, whichever comes first. Each caller waits for
+    the commit and gets its own row back. If the batch fails, every caller in it gets the error.
+
+    Attributes:
+        window (float): Seconds a batch stays open for more creations.
+        max_batch (int): Creations after which a batch is written immediately.
+    """
+
+    def __init__(self, window=0.002, max_batch=128):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        self._inflight = set()
+        self._batch_sizes = _Histogram(BATCH_SIZE_BUCKETS)
+        self._commit_latency = _Histogram(COMMIT_LATENCY_BUCKETS)
+        self._failed_batches = 0
+
+    async def create_task(self, name):
+        """
+        Creates a task as part of the current batch.
+
+        Args:
+            name (str): Name of the new task.
+
+        Returns:
+            dict: The committed task row.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((name, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        row = await future
+        # The batch committed on another task, on behalf of whichever request opened it.
+        storage.sticky_clients.mark_write()
+        return row
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._commit(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _commit(self, batch):
+        started = time.perf_counter()
+        error = None
+        try:
+            async with storage.cursor() as cur:
+                rows = await storage.call("create_tasks", cur, [name for name, _ in batch])
+                await storage.commit(cur)
+            self._commit_latency.observe((time.perf_counter() - started) * 1000)
+            self._batch_sizes.observe(len(batch))
+            # `create_tasks` returns rows in the order of the names it was given.
+            for (_, future), row in zip(batch, rows):
+                if not future.done():
+                    future.set_result(row)
+            if len(rows) != len(batch):
+                error = RuntimeError(f"group commit returned {len(rows)} rows for {len(batch)} tasks")
+        except Exception as exc:
+            error = exc
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            # No caller may be left waiting: whatever went wrong, every unresolved future fails.
+            pending = [future for _, future in batch if not future.done()]
+            if pending:
+                self._failed_batches += 1
+            for future in pending:
+                if isinstance(error, Exception):
+                    future.set_exception(error)
+                else:
+                    future.cancel()
+
+    def stats(self):
+        """
+        Reports batching effectiveness.
+
+        Returns:
+            dict: Batch size and commit latency (ms) histograms, failed and open batches.
+        """
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "pending": len(self._pending),
+            "committing": len(self._inflight),
+            "failed_batches": self._failed_batches,
+            "batch_size": self._batch_sizes.snapshot(),
+            "commit_latency_ms": self._commit_latency.snapshot(),
+        }
+
+
+committer = GroupCommitter(GROUP_COMMIT_CONFIG["window"], GROUP_COMMIT_CONFIG["max_batch"])
+
+
+def is_enabled():
+    """
+    Reports whether `POST /tasks` goes through the group committer.
+
+    Returns:
+        bool: True when `TASK_GROUP_COMMIT` is "on".
+    """
+    return GROUP_COMMIT_CONFIG["enabled"]
@@ -0,0 +1,419 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from . import metrics, storage
+
+IDEMPOTENCY_CONFIG = {
+    # "memory" dedupes within one process; "postgres" across every worker sharing the database.
+    "backend": os.environ.get("TASK_IDEMPOTENCY_BACKEND", "memory"),
+    "max_size": int(os.environ.get("TASK_IDEMPOTENCY_SIZE", 10000)),
+    "ttl": float(os.environ.get("TASK_IDEMPOTENCY_TTL", 86400.0)),
+    # How long a retry waits for the original request before answering 409.
+    "wait_timeout": float(os.environ.get("TASK_IDEMPOTENCY_WAIT", 10.0)),
+    # After this long an unfinished claim is presumed dead and may be taken over (postgres).
+    "lock_timeout": float(os.environ.get("TASK_IDEMPOTENCY_LOCK", 60.0)),
+}
+
+HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+# Response headers stored with the body and sent again on replay.
+REPLAYED_HEADERS = ("etag", "last-modified")
+
+# Outcomes of `IdempotencyStore.claim`.
+OWNED = "owned"
+DONE = "done"
+BUSY = "busy"
+MISMATCH = "mismatch"
+
+
+class IdempotencyStore(ABC):
+    """
+    Interface of the store that remembers the first response to each idempotency key.
+
+    Keys are scoped to a user: `scope` is a `(username, key)` tuple. A request claims its key
+    before it runs; whoever claims a key first owns it and must `complete` it with the response
+    or `release` it on failure. Later requests with the same key replay the stored response,
+    or wait for the owner while it is still running.
+    """
+
+    @abstractmethod
+    async def claim(self, scope, fingerprint):
+        """
+        Claims a key, or reports who holds it.
+
+        Args:
+            scope (tuple): `(username, key)`.
+            fingerprint (str): Digest of the request the key is used for.
+
+        Returns:
+            tuple: `(OWNED, None)` if the caller now owns the key, `(DONE, record)` with the stored
+            response, `(BUSY, None)` while another request holds it, or `(MISMATCH, None)` if the
+            key was used for a different request.
+        """
+
+    @abstractmethod
+    async def wait(self, scope, timeout):
+        """
+        Waits until the request holding a key may have finished.
+
+        Args:
+            scope (tuple): `(username, key)`.
+            timeout (float): Most seconds to wait.
+        """
+
+    @abstractmethod
+    async def complete(self, scope, fingerprint, record):
+        """
+        Stores the response of the request that owns a key.
+
+        Args:
+            scope (tuple): `(username, key)`.
+            fingerprint (str): Digest of the request, as claimed.
+            record (dict): `status`, JSON-able `body` and `headers` of the response.
+        """
+
+    @abstractmethod
+    async def release(self, scope, fingerprint):
+        """
+        Gives up an unfinished claim, so the next request with the key runs again.
+
+        Args:
+            scope (tuple): `(username, key)`.
+            fingerprint (str): Digest of the request, as claimed.
+        """
+
+    @abstractmethod
+    def stats(self):
+        """
+        Reports the store's state.
+
+        Returns:
+            dict: Backend name plus backend-specific counters.
+        """
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "record", "expires_at", "finished")
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.record = None
+        self.expires_at = None
+        self.finished = asyncio.Event()
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """
+    In-process store with LRU eviction and per-entry expiry.
+
+    Waiting retries are woken as soon as the owner completes or releases the key. Keys in
+    flight are never evicted. Only requests served by the same process are deduplicated.
+
+    Attributes:
+        max_size (int): Keys kept before the least recently used finished one is evicted.
+        ttl (float): Seconds a stored response is replayed.
+    """
+
+    def __init__(self, max_size=10000, ttl=86400.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._evictions = 0
+        self._expirations = 0
+
+    async def claim(self, scope, fingerprint):
+        entry = self._entries.get(scope)
+        if entry is not None and entry.record is not None and entry.expires_at <= time.monotonic():
+            del self._entries[scope]
+            self._expirations += 1
+            entry = None
+        if entry is None:
+            self._entries[scope] = _Entry(fingerprint)
+            self._evict()
+            return OWNED, None
+        self._entries.move_to_end(scope)
+        if entry.fingerprint != fingerprint:
+            return MISMATCH, None
+        if entry.record is None:
+            return BUSY, None
+        return DONE, entry.record
+
+    async def wait(self, scope, timeout):
+        entry = self._entries.get(scope)
+        if entry is None or entry.record is not None:
+            return
+        try:
+            await asyncio.wait_for(entry.finished.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def complete(self, scope, fingerprint, record):
+        entry = self._entries.get(scope)
+        if entry is None or entry.fingerprint != fingerprint:
+            return
+        entry.record = record
+        entry.expires_at = time.monotonic() + self.ttl
+        entry.finished.set()
+
+    async def release(self, scope, fingerprint):
+        entry = self._entries.get(scope)
+        if entry is not None and entry.fingerprint == fingerprint and entry.record is None:
+            del self._entries[scope]
+            entry.finished.set()
+
+    def stats(self):
+        return {"backend": "memory", "size": len(self._entries), "max_size": self.max_size,
+                "in_flight": sum(1 for entry in self._entries.values() if entry.record is None),
+                "evictions": self._evictions, "expirations": self._expirations}
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            scope = next((scope for scope, entry in self._entries.items() if entry.record is not None), None)
+            if scope is None:
+                return
+            del self._entries[scope]
+            self._evictions += 1
+
+
+class PostgresIdempotencyStore(IdempotencyStore):
+    """
+    Store backed by the `idempotency_keys` table, shared by every worker process.
+
+    Each operation runs in its own short transaction, committed before the request itself
+    runs, so other workers see the claim at once. Retries poll for the owner's response. A
+    claim not completed within `lock_timeout` (the owning process died) may be taken over.
+    Expired keys are pruned in bounded batches at most once per `prune_interval`.
+
+    Attributes:
+        ttl (float): Seconds a stored response is replayed.
+        lock_timeout (float): Seconds before an unfinished claim may be taken over.
+        poll_interval (float): Seconds between checks while waiting for an owner.
+        prune_interval (float): Seconds between prunes of expired keys.
+    """
+
+    def __init__(self, ttl=86400.0, lock_timeout=60.0, poll_interval=0.05, prune_interval=60.0):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        self._pruned = 0
+
+    async def claim(self, scope, fingerprint):
+        username, key = scope
+        async with storage.cursor() as cur:
+            if time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + self.prune_interval
+                self._pruned += await storage.call("prune_idempotency_keys", cur, self.ttl)
+            row = await storage.call("claim_idempotency_key", cur, username, key, fingerprint, self.ttl,
+                                     self.lock_timeout)
+            await storage.commit(cur)
+        if row is None:
+            return BUSY, None
+        if row["claimed"]:
+            return OWNED, None
+        if row["fingerprint"] != fingerprint:
+            return MISMATCH, None
+        if row["status_code"] is None:
+            return BUSY, None
+        return DONE, {"status": row["status_code"], "body": row["response"], "headers": row["headers"] or {}}
+
+    async def wait(self, scope, timeout):
+        await asyncio.sleep(min(self.poll_interval, timeout))
+
+    async def complete(self, scope, fingerprint, record):
+        username, key = scope
+        async with storage.cursor() as cur:
+            await storage.call("complete_idempotency_key", cur, username, key, fingerprint, record["status"],
+                               json.dumps(record["body"]), json.dumps(record["headers"]))
+            await storage.commit(cur)
+
+    async def release(self, scope, fingerprint):
+        username, key = scope
+        async with storage.cursor() as cur:
+            await storage.call("release_idempotency_key", cur, username, key, fingerprint)
+            await storage.commit(cur)
+
+    def stats(self):
+        return {"backend": "postgres", "ttl": self.ttl, "lock_timeout": self.lock_timeout, "pruned": self._pruned}
+
+
+class NullIdempotencyStore(IdempotencyStore):
+    """
+    A store that never remembers anything, used when idempotency keys are disabled.
+    """
+
+    async def claim(self, scope, fingerprint):
+        return OWNED, None
+
+    async def wait(self, scope, timeout):
+        pass
+
+    async def complete(self, scope, fingerprint, record):
+        pass
+
+    async def release(self, scope, fingerprint):
+        pass
+
+    def stats(self):
+        return {"backend": "none"}
+
+
+class Claim:
+    """
+    Async context manager that runs a mutation at most once per idempotency key.
+
+    On entry it claims the request's key. If the key was already used for the same request,
+    `response` holds the stored response to return instead of running the handler again. The
+    handler passes its result through `save`; leaving the block normally stores it for replay,
+    leaving with an exception releases the key so a retry runs again.
+
+    Attributes:
+        response (Optional[JSONResponse]): The replayed response, or None if the handler should run.
+    """
+
+    def __init__(self, store, scope, fingerprint, wait_timeout):
+        self.store = store
+        self.scope = scope
+        self.fingerprint = fingerprint
+        self.wait_timeout = wait_timeout
+        self.response = None
+        self._owned = False
+        self._record = None
+
+    async def __aenter__(self):
+        if self.scope is None:
+            return self
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            state, record = await self.store.claim(self.scope, self.fingerprint)
+            if state != BUSY:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                metrics.IDEMPOTENCY_REQUESTS.inc("conflict")
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress",
+                                    headers={"Retry-After": "1"})
+            await self.store.wait(self.scope, remaining)
+        if state == MISMATCH:
+            metrics.IDEMPOTENCY_REQUESTS.inc("mismatch")
+            raise HTTPException(status_code=422, detail="Idempotency-Key was used for a different request")
+        if state == DONE:
+            metrics.IDEMPOTENCY_REQUESTS.inc("replayed")
+            self.response = JSONResponse(record["body"], status_code=record["status"],
+                                         headers={**record["headers"], "Idempotent-Replayed": "true"})
+        else:
+            metrics.IDEMPOTENCY_REQUESTS.inc("executed")
+            self._owned = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if not self._owned:
+            return False
+        if exc_type is None and self._record is not None:
+            await self.store.complete(self.scope, self.fingerprint, self._record)
+        else:
+            await self.store.release(self.scope, self.fingerprint)
+        return False
+
+    def save(self, body, response=None, status=200):
+        """
+        Records the handler's result for replay.
+
+        Args:
+            body: The response content, anything `jsonable_encoder` accepts.
+            response (Optional[Response]): The handler's response, for the headers to replay.
+            status (int): HTTP status of the response.
+
+        Returns:
+            The unchanged `body`, for the handler to return.
+        """
+        if self._owned:
+            headers = {} if response is None else {name: response.headers[name] for name in REPLAYED_HEADERS
+                                                   if name in response.headers}
+            self._record = {"status": status, "body": jsonable_encoder(body), "headers": headers}
+        return body
+
+
+async def fingerprint(request):
+    """
+    Digests the parts of a request that must match for a key to be replayed.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        str: Hex SHA-256 of the method, path and body.
+    """
+    digest = hashlib.sha256(f"{request.method} {request.url.path}\n".encode())
+    digest.update(await request.body())
+    return digest.hexdigest()
+
+
+async def claim(request, user):
+    """
+    Prepares the idempotency claim of a request from its `Idempotency-Key` header.
+
+    Requests without the header get a claim that does nothing, so handlers can use it
+    unconditionally.
+
+    Args:
+        request (Request): The incoming request.
+        user (models.User): The authenticated user; keys are scoped per user.
+
+    Returns:
+        Claim: To be entered with `async with` around the mutation.
+
+    Raises:
+        HTTPException: 400 if the key is empty or longer than `MAX_KEY_LENGTH`.
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        return Claim(_store, None, None, 0)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+    return Claim(_store, (user.username, key), await fingerprint(request), IDEMPOTENCY_CONFIG["wait_timeout"])
+
+
+def _create_store():
+    backend = IDEMPOTENCY_CONFIG["backend"]
+    if backend == "memory":
+        return MemoryIdempotencyStore(IDEMPOTENCY_CONFIG["max_size"], IDEMPOTENCY_CONFIG["ttl"])
+    if backend == "postgres":
+        return PostgresIdempotencyStore(IDEMPOTENCY_CONFIG["ttl"], IDEMPOTENCY_CONFIG["lock_timeout"])
+    if backend == "none":
+        return NullIdempotencyStore()
+    raise ValueError(f"TASK_IDEMPOTENCY_BACKEND must be 'memory', 'postgres' or 'none', not {backend!r}")
+
+
+_store = _create_store()
+
+
+def get_store():
+    """
+    Returns the process-wide idempotency store.
+
+    Returns:
+        IdempotencyStore: The configured backend.
+    """
+    return _store
+
+
+def set_store(store):
+    """
+    Replaces the process-wide idempotency store.
+
+    Args:
+        store (IdempotencyStore): The store to use from now on.
+    """
+    global _store
+    _store = store
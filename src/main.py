@@ -1,45 +1,261 @@
-from datetime import timedelta
-from typing import List
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional
 
-from fastapi import Body, Depends, FastAPI, HTTPException
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
-from . import auth, db, models, queries
+from . import (admission, auth, cache, compression, etag, events, export, group_commit, idempotency, metrics, models,
+               queries, routing, serialize, slow_queries, storage, users)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    """
+    Warms the worker up before it serves (see `warm_up`), and releases the change feed listener and the
+    database connection pools when the application shuts down. With an in-process task cache the listener
+    starts right away, to invalidate the cache on changes made by other processes.
+    """
+    application.state.ready = False
+    if cache.is_local():
+        # Other processes write too; their changes reach this process's cache through the change feed.
+        events.listener.observe(cache.on_task_event)
+        events.listener.start()
+    await warm_up()
+    application.state.ready = True
+    yield
+    await events.listener.close()
+    await storage.close()
+
+
+async def warm_up():
+    """
+    Does the work the first requests of a fresh worker would otherwise wait for: loads the JWT library,
+    and opens the connection pools with a statement run on each.
+    """
+    auth.warm_up()
+    await storage.warm_up(READY_TIMEOUT)
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(routing.ClientContextMiddleware)
+app.add_middleware(admission.AdmissionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Role-based dependencies
 admin_required = auth.RoleChecker("admin")
 readonly_or_admin = auth.RoleChecker("readonly", "admin")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 50000
+# Seconds the startup warm-up and each readiness probe wait for the database.
+READY_TIMEOUT = float(os.environ.get("TASK_READY_TIMEOUT", 2.0))
 
 
 @app.get("/tasks", response_model=List[models.Task])
-def list_tasks(user: models.User = Depends(auth.get_current_user),
-               allowed: bool = Depends(readonly_or_admin)):
+async def list_tasks(request: Request, response: Response,
+                     limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                     after: Optional[int] = None,
+                     status: Optional[str] = None,
+                     created_after: Optional[datetime] = None,
+                     created_before: Optional[datetime] = None,
+                     updated_after: Optional[datetime] = None,
+                     updated_before: Optional[datetime] = None,
+                     name_contains: Optional[str] = None,
+                     fields: Optional[str] = None,
+                     archived: bool = False,
+                     user: models.User = Depends(auth.get_current_user),
+                     allowed: bool = Depends(readonly_or_admin),
+                     cur=Depends(storage.get_read_cursor)):
+    """
+    Retrieves a page of tasks for authenticated users with admin or readonly role.
+
+    Tasks are ordered by ID. When more tasks follow the page, the ID to pass as `after` for the
+    next page is returned in the `X-Next-After` header, together with a `Link: rel="next"` URL.
+    The page carries an `ETag`; a matching `If-None-Match` gets a 304 without the page being read.
+    Besides JSON, the page can be requested through `Accept` as MessagePack, or as one array per
+    field in either encoding (see `serialize.MEDIA_TYPES`). With `archived=true` the page lists
+    archived tasks instead; give `created_after`/`created_before` to limit it to the months in range.
+
+    Args:
+        request (Request): The incoming request, used to build the next-page link.
+        response (Response): The outgoing response, used to set pagination headers.
+        limit (int): Maximum number of tasks in the page.
+        after (Optional[int]): ID of the last task of the previous page.
+        status (Optional[str]): Only return tasks with this status.
+        created_after (Optional[datetime]): Only return tasks created after this time.
+        created_before (Optional[datetime]): Only return tasks created before this time.
+        updated_after (Optional[datetime]): Only return tasks updated after this time.
+        updated_before (Optional[datetime]): Only return tasks updated before this time.
+        name_contains (Optional[str]): Only return tasks whose name contains this text, ignoring case.
+        fields (Optional[str]): Comma-separated columns to return; `id` is always included.
+        archived (bool): List archived tasks rather than live ones.
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce role check.
+        cur: Pooled database cursor.
+
+    Returns:
+        List[models.Task]: A page of tasks, or of partial tasks when `fields` is given.
+
+    Raises:
+        HTTPException: If `fields` names an unknown column, or no offered media type is acceptable.
+    """
+    media_type = serialize.negotiate(request.headers.get("accept"))
+    projection = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    unknown = set(projection or ()) - set(queries.TASK_COLUMNS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown task field(s): {', '.join(sorted(unknown))}")
+
+    filters = {"after": after, "status": status,
+               "created_after": created_after, "created_before": created_before,
+               "updated_after": updated_after, "updated_before": updated_before,
+               "name_contains": name_contains, "archived": archived}
+    variant = ",".join(projection or ())
+    if media_type != serialize.JSON:
+        variant = f"{variant}|{media_type}"
+    tag = None
+    if etag.is_conditional(request.headers):
+        # Answer an unchanged page from its version aggregate without running the page query.
+        tag = etag.page_etag(await storage.call("get_tasks_version", cur, limit=limit, **filters), variant)
+        if etag.is_not_modified(request.headers, tag):
+            return Response(status_code=304, headers={"ETag": tag, "Vary": "Accept"})
+
+    # One extra row tells us whether a next page exists without a second query.
+    tasks = await storage.call("get_all_tasks", cur, limit=limit + 1, fields=projection, **filters)
+    headers = {"Vary": "Accept"}
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_after = tasks[-1]["id"]
+        headers["X-Next-After"] = str(next_after)
+        headers["Link"] = f'<{request.url.include_query_params(after=next_after)}>; rel="next"'
+    if not projection or "updated_at" in projection:
+        tag = etag.page_etag(etag.page_version(tasks), variant)
+    elif tag is None:
+        tag = etag.page_etag(await storage.call("get_tasks_version", cur, limit=limit, **filters), variant)
+    headers["ETag"] = tag
+
+    if projection or media_type != serialize.JSON or serialize.is_fast():
+        # Partial rows do not fit `models.Task`, and binary or columnar bodies are not JSON of it;
+        # full JSON rows skip the per-row validation when the fast serializer is enabled.
+        return serialize.RowsResponse(tasks, headers=headers, media_type=media_type, fields=projection)
+    response.headers.update(headers)
+    return tasks
+
+
+@app.get("/tasks/export")
+async def export_tasks(export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+                       status: Optional[str] = None,
+                       created_after: Optional[datetime] = None,
+                       created_before: Optional[datetime] = None,
+                       updated_after: Optional[datetime] = None,
+                       updated_before: Optional[datetime] = None,
+                       name_contains: Optional[str] = None,
+                       archived: bool = False,
+                       user: models.User = Depends(auth.get_current_user),
+                       allowed: bool = Depends(readonly_or_admin)):
+    """
+    Streams every matching task as NDJSON or CSV for authenticated users with admin or readonly role.
+
+    Rows are read through a server-side cursor and written out batch by batch, so memory use
+    stays flat regardless of table size.
+
+    Args:
+        export_format (str): "ndjson" (default) or "csv", passed as the `format` query parameter.
+        status (Optional[str]): Only export tasks with this status.
+        created_after (Optional[datetime]): Only export tasks created after this time.
+        created_before (Optional[datetime]): Only export tasks created before this time.
+        updated_after (Optional[datetime]): Only export tasks updated after this time.
+        updated_before (Optional[datetime]): Only export tasks updated before this time.
+        name_contains (Optional[str]): Only export tasks whose name contains this text, ignoring case.
+        archived (bool): Export archived tasks rather than live ones.
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce role check.
+
+    Returns:
+        export.ExportResponse: The export body.
+    """
+    body = await export.stream_tasks(export_format, status=status,
+                                     created_after=created_after, created_before=created_before,
+                                     updated_after=updated_after, updated_before=updated_before,
+                                     name_contains=name_contains, archived=archived)
+    return export.ExportResponse(
+        body,
+        media_type=export.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{export_format}"'},
+    )
+
+
+@app.get("/tasks/stats", response_model=models.TaskStats)
+async def task_stats(user: models.User = Depends(auth.get_current_user),
+                     allowed: bool = Depends(readonly_or_admin),
+                     cur=Depends(storage.get_read_cursor)):
+    """
+    Reports task counts by status and recent write activity, for authenticated users with admin or readonly role.
+
+    The figures come from counters that triggers keep up to date in the writing transaction,
+    so the cost does not grow with the number of tasks.
+
+    Args:
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce role check.
+        cur: Pooled database cursor.
+
+    Returns:
+        models.TaskStats: Counts by status and created/updated/deleted counts per window.
+    """
+    return await storage.call("get_task_stats", cur)
+
+
+@app.get("/tasks/events")
+async def task_events(last_event_id: Optional[str] = Header(None),
+                      user: models.User = Depends(auth.get_current_user),
+                      allowed: bool = Depends(readonly_or_admin)):
     """
-    Retrieves all tasks for authenticated users with admin or readonly role.
+    Streams task changes as Server-Sent Events for authenticated users with admin or readonly role.
+
+    Every insert, update and delete of a task is published by a database trigger through
+    `LISTEN/NOTIFY` and sent as a `task` event carrying the task ID, the operation and, for
+    inserts and updates, the new status. A client reconnecting with `Last-Event-ID` first gets
+    the events it missed. When that is not possible, or the client falls too far behind, the
+    stream ends with a `reset` event and the client should refetch the tasks it shows.
 
     Args:
+        last_event_id (Optional[str]): ID of the last event the client received.
         user (models.User): The current authenticated user.
         allowed (bool): Dependency to enforce role check.
 
     Returns:
-        List[models.Task]: A list of tasks.
+        StreamingResponse: The event stream.
     """
-    with db.get_connection() as conn:
-        with conn.cursor() as cur:
-            return queries.get_all_tasks(cur)
+    events.listener.start()
+    subscription, backlog = events.broker.subscribe(last_event_id)
+    return StreamingResponse(
+        events.stream(events.broker, subscription, backlog, events.EVENTS_CONFIG["heartbeat"]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/tasks/{task_id}", response_model=models.Task)
-def get_task(task_id: int, user: models.User = Depends(auth.get_current_user),
-             allowed: bool = Depends(readonly_or_admin)):
+async def get_task(task_id: int, request: Request, response: Response,
+                   user: models.User = Depends(auth.get_current_user),
+                   allowed: bool = Depends(readonly_or_admin)):
     """
     Retrieves a specific task by ID for authenticated users with admin or readonly role.
 
+    Tasks, and the fact that a task does not exist, are served from the task cache when
+    possible; a database connection is only checked out on a cache miss. The response carries
+    `ETag` and `Last-Modified`, and a matching `If-None-Match` or `If-Modified-Since` gets a 304.
+    `Accept: application/msgpack` gets the task as MessagePack instead of JSON.
+
     Args:
         task_id (int): ID of the task.
+        request (Request): The incoming request, for its conditional headers.
+        response (Response): The outgoing response, for the validator headers.
         user (models.User): The current authenticated user.
         allowed (bool): Dependency to enforce role check.
 
@@ -47,46 +263,136 @@ def get_task(task_id: int, user: models.User = Depends(auth.get_current_user),
         models.Task: The requested task if found.
 
     Raises:
-        HTTPException: If task is not found.
+        HTTPException: If task is not found, or no offered media type is acceptable.
     """
-    with db.get_connection() as conn:
-        with conn.cursor() as cur:
-            task = queries.get_task_by_id(cur, task_id)
-            if not task:
-                raise HTTPException(status_code=404, detail="Task not found")
-            return task
+    media_type = serialize.negotiate(request.headers.get("accept"), serialize.SINGLE_MEDIA_TYPES)
+    task_cache = cache.get_cache()
+    task = task_cache.get(task_id)
+    if task is cache.MISS:
+        token = task_cache.token()
+        role = await storage.read_role()
+        async with storage.cursor(role) as cur:
+            task = await storage.call("get_task_by_id", cur, task_id)
+        if role == "primary":
+            # A lagging replica may still return the version a write just replaced.
+            task_cache.fill(task_id, task, token)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    variant = "" if media_type == serialize.JSON else "msgpack"
+    tag, updated_at = etag.task_etag(task, variant), etag.field(task, "updated_at")
+    headers = {**etag.validators(tag, updated_at), "Vary": "Accept"}
+    if etag.is_not_modified(request.headers, tag, updated_at):
+        return Response(status_code=304, headers=headers)
+    if media_type != serialize.JSON:
+        return serialize.RowsResponse(serialize.as_row(task), headers=headers, media_type=media_type)
+    response.headers.update(headers)
+    return task
+
+
+@app.get("/tasks/{task_id}/result", response_model=models.TaskResult)
+async def get_task_result(task_id: int, user: models.User = Depends(auth.get_current_user),
+                          allowed: bool = Depends(readonly_or_admin),
+                          cur=Depends(storage.get_read_cursor)):
+    """
+    Retrieves what the worker that finished a task recorded, for authenticated users with admin or readonly role.
+
+    Args:
+        task_id (int): ID of the task.
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce role check.
+        cur: Pooled database cursor.
+
+    Returns:
+        models.TaskResult: The handler's return value or error, with the attempt count.
+
+    Raises:
+        HTTPException: If the task does not exist or has not been finished by a worker.
+    """
+    result = await storage.call("get_task_result", cur, task_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Task result not found")
+    return result
 
 
 @app.post("/tasks", response_model=models.Task)
-def create_task(task: models.TaskCreate, user: models.User = Depends(auth.get_current_user),
-                allowed: bool = Depends(admin_required)):
+async def create_task(task: models.TaskCreate, request: Request,
+                      user: models.User = Depends(auth.get_current_user),
+                      allowed: bool = Depends(admin_required)):
     """
     Creates a new task. Only accessible to users with admin role.
 
+    With group commit enabled, creations arriving together share one insert and one commit.
+    A retry carrying the same `Idempotency-Key` gets the first response back instead of
+    creating another task.
+
     Args:
         task (models.TaskCreate): Task creation data.
+        request (Request): The incoming request, for its `Idempotency-Key` header.
         user (models.User): The current authenticated user.
         allowed (bool): Dependency to enforce admin role.
 
     Returns:
         models.Task: The newly created task.
+
+    Raises:
+        HTTPException: 409 if a request with the same key is still running, 422 if the key
+        was used for a different request.
     """
-    with db.get_connection() as conn:
-        with conn.cursor() as cur:
-            new_task = queries.create_task(cur, task.name)
-            conn.commit()
-            return new_task
+    async with await idempotency.claim(request, user) as claim:
+        if claim.response is not None:
+            return claim.response
+        if group_commit.is_enabled():
+            new_task = await group_commit.committer.create_task(task.name)
+        else:
+            async with storage.cursor() as cur:
+                new_task = await storage.call("create_task", cur, task.name)
+                await storage.commit(cur)
+        cache.get_cache().put(new_task["id"], new_task)
+        return claim.save(models.Task.model_validate(new_task))
+
+
+async def check_if_match(request: Request, cur, task_id: int):
+    """
+    Enforces an `If-Match` precondition before a task is modified.
+
+    The task is locked for the rest of the transaction, so it cannot change between the
+    check and the write.
+
+    Args:
+        request (Request): The incoming request.
+        cur: Pooled database cursor of the writing transaction.
+        task_id (int): ID of the task about to be modified.
+
+    Raises:
+        HTTPException: 404 if the task does not exist, 412 if its ETag does not match.
+    """
+    header = request.headers.get("if-match")
+    if header is None:
+        return
+    current = await storage.call("get_task_for_update", cur, task_id)
+    if not current:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not etag.if_match(header, etag.task_etag(current), etag.task_etag(current, "msgpack")):
+        raise HTTPException(status_code=412, detail="Task has been modified")
 
 
 @app.put("/tasks/{task_id}", response_model=models.Task)
-def update_task(task_id: int, name: str = Body(...), status: str = Body(...),
-                user: models.User = Depends(auth.get_current_user),
-                allowed: bool = Depends(admin_required)):
+async def update_task(task_id: int, request: Request, response: Response,
+                      name: str = Body(...), status: str = Body(...),
+                      user: models.User = Depends(auth.get_current_user),
+                      allowed: bool = Depends(admin_required)):
     """
     Updates an existing task's name and status. Admin-only access.
 
+    With an `If-Match` header the update only happens if the task still has one of the listed
+    ETags, which gives clients optimistic concurrency control. A retry carrying the same
+    `Idempotency-Key` gets the first response back without writing again; the connection is
+    only checked out once the request is known to run.
+
     Args:
         task_id (int): ID of the task to update.
+        request (Request): The incoming request, for its `If-Match` and `Idempotency-Key` headers.
+        response (Response): The outgoing response, for the new `ETag`.
         name (str): New name for the task.
         status (str): New status for the task.
         user (models.User): The current authenticated user.
@@ -96,41 +402,295 @@ def update_task(task_id: int, name: str = Body(...), status: str = Body(...),
         models.Task: The updated task.
 
     Raises:
-        HTTPException: If task is not found.
+        HTTPException: If task is not found, 412 if it no longer matches `If-Match`, 409 if a
+        request with the same key is still running, or 422 if the key was used for a different request.
     """
-    with db.get_connection() as conn:
-        with conn.cursor() as cur:
-            task = queries.update_task(cur, task_id, name, status)
+    async with await idempotency.claim(request, user) as claim:
+        if claim.response is not None:
+            return claim.response
+        async with storage.cursor() as cur:
+            await check_if_match(request, cur, task_id)
+            task = await storage.call("update_task", cur, task_id, name, status)
             if not task:
                 raise HTTPException(status_code=404, detail="Task not found")
-            conn.commit()
-            return task
+            await storage.commit(cur)
+        cache.get_cache().put(task_id, task)
+        response.headers.update(etag.validators(etag.task_etag(task), etag.field(task, "updated_at")))
+        return claim.save(models.Task.model_validate(task), response)
 
 
 @app.delete("/tasks/{task_id}", response_model=models.Task)
-def delete_task(task_id: int, user: models.User = Depends(auth.get_current_user),
-                allowed: bool = Depends(admin_required)):
+async def delete_task(task_id: int, request: Request, user: models.User = Depends(auth.get_current_user),
+                      allowed: bool = Depends(admin_required),
+                      cur=Depends(storage.get_cursor)):
     """
     Deletes a task by ID. Only accessible to users with admin role.
 
+    With an `If-Match` header the task is only deleted if it still has one of the listed ETags.
+
     Args:
         task_id (int): ID of the task to delete.
+        request (Request): The incoming request, for its `If-Match` header.
         user (models.User): The current authenticated user.
         allowed (bool): Dependency to enforce admin role.
+        cur: Pooled database cursor.
 
     Returns:
         models.Task: The deleted task.
 
     Raises:
-        HTTPException: If task is not found.
+        HTTPException: If task is not found, or 412 if it no longer matches `If-Match`.
     """
-    with db.get_connection() as conn:
-        with conn.cursor() as cur:
-            task = queries.delete_task(cur, task_id)
-            if not task:
-                raise HTTPException(status_code=404, detail="Task not found")
-            conn.commit()
-            return task
+    await check_if_match(request, cur, task_id)
+    task = await storage.call("delete_task", cur, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    await storage.commit(cur)
+    cache.get_cache().put(task_id, None)
+    return task
+
+
+def check_batch_size(size: int):
+    """
+    Rejects batch requests larger than `MAX_BATCH_SIZE`.
+
+    Args:
+        size (int): Number of entries in the batch.
+
+    Raises:
+        HTTPException: 413 if the batch is too large.
+    """
+    if size > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batches are limited to {MAX_BATCH_SIZE} entries")
+
+
+@app.post("/tasks:batch", response_model=models.TaskBatchResult)
+async def create_tasks_batch(batch: models.TaskBatchCreate,
+                             user: models.User = Depends(auth.get_current_user),
+                             allowed: bool = Depends(admin_required),
+                             cur=Depends(storage.get_cursor)):
+    """
+    Creates many tasks in a single statement and transaction. Admin-only access.
+
+    Args:
+        batch (models.TaskBatchCreate): Tasks to create.
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce admin role.
+        cur: Pooled database cursor.
+
+    Returns:
+        models.TaskBatchResult: One "created" result per task, in request order.
+    """
+    check_batch_size(len(batch.tasks))
+    tasks = await storage.call("create_tasks", cur, [task.name for task in batch.tasks])
+    await storage.commit(cur)
+    task_cache = cache.get_cache()
+    for task in tasks:
+        task_cache.put(task["id"], task)
+    return {"results": [{"id": task["id"], "result": "created", "task": task} for task in tasks]}
+
+
+@app.patch("/tasks:batch", response_model=models.TaskBatchResult)
+async def update_tasks_batch(batch: models.TaskBatchUpdate,
+                             user: models.User = Depends(auth.get_current_user),
+                             allowed: bool = Depends(admin_required),
+                             cur=Depends(storage.get_cursor)):
+    """
+    Updates the name and status of many tasks in a single statement and transaction. Admin-only access.
+
+    Args:
+        batch (models.TaskBatchUpdate): Tasks to update.
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce admin role.
+        cur: Pooled database cursor.
+
+    Returns:
+        models.TaskBatchResult: An "updated" or "not_found" result per entry, in request order.
+    """
+    check_batch_size(len(batch.tasks))
+    items = {task.id: (task.id, task.name, task.status) for task in batch.tasks}
+    updated = {task["id"]: task for task in await storage.call("update_tasks", cur, list(items.values()))}
+    await storage.commit(cur)
+    task_cache = cache.get_cache()
+    for task_id, task in updated.items():
+        task_cache.put(task_id, task)
+    return {"results": [{"id": task.id, "result": "updated" if task.id in updated else "not_found",
+                         "task": updated.get(task.id)} for task in batch.tasks]}
+
+
+@app.delete("/tasks:batch", response_model=models.TaskBatchResult)
+async def delete_tasks_batch(batch: models.TaskBatchDelete,
+                             user: models.User = Depends(auth.get_current_user),
+                             allowed: bool = Depends(admin_required),
+                             cur=Depends(storage.get_cursor)):
+    """
+    Deletes many tasks in a single statement and transaction. Admin-only access.
+
+    Args:
+        batch (models.TaskBatchDelete): IDs of the tasks to delete.
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce admin role.
+        cur: Pooled database cursor.
+
+    Returns:
+        models.TaskBatchResult: A "deleted" or "not_found" result per ID, in request order.
+    """
+    check_batch_size(len(batch.ids))
+    deleted = {task["id"]: task for task in await storage.call("delete_tasks", cur, list(dict.fromkeys(batch.ids)))}
+    await storage.commit(cur)
+    task_cache = cache.get_cache()
+    for task_id in deleted:
+        task_cache.put(task_id, None)
+    return {"results": [{"id": task_id, "result": "deleted" if task_id in deleted else "not_found",
+                         "task": deleted.get(task_id)} for task_id in batch.ids]}
+
+
+@app.get("/admin/pool")
+async def pool_stats(user: models.User = Depends(auth.get_current_user),
+                     allowed: bool = Depends(admin_required)):
+    """
+    Reports connection pool usage. Admin-only access.
+
+    Args:
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce admin role.
+
+    Returns:
+        dict: In-use, idle and waiting connection counts plus checkout wait times.
+    """
+    return await storage.pool_stats()
+
+
+@app.get("/admin/cache")
+async def cache_stats(user: models.User = Depends(auth.get_current_user),
+                      allowed: bool = Depends(admin_required)):
+    """
+    Reports task cache hit and miss counters. Admin-only access.
+
+    Args:
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce admin role.
+
+    Returns:
+        dict: Hits, negative hits, misses, evictions, expirations and current size.
+    """
+    return cache.get_cache().stats()
+
+
+@app.get("/admin/group-commit")
+async def group_commit_stats(user: models.User = Depends(auth.get_current_user),
+                             allowed: bool = Depends(admin_required)):
+    """
+    Reports how task creations are being batched. Admin-only access.
+
+    Args:
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce admin role.
+
+    Returns:
+        dict: Batch size and commit latency histograms, plus failed and open batches.
+    """
+    return {"enabled": group_commit.is_enabled(), **group_commit.committer.stats()}
+
+
+@app.get("/admin/events")
+async def events_stats(user: models.User = Depends(auth.get_current_user),
+                       allowed: bool = Depends(admin_required)):
+    """
+    Reports change feed activity. Admin-only access.
+
+    Args:
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce admin role.
+
+    Returns:
+        dict: Subscribers, events published, resets and listener state.
+    """
+    return {**events.broker.stats(), **events.listener.stats()}
+
+
+@app.get("/admin/admission")
+async def admission_stats(user: models.User = Depends(auth.get_current_user),
+                          allowed: bool = Depends(admin_required)):
+    """
+    Reports admission control and per-user rate limiting. Admin-only access.
+
+    Args:
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce admin role.
+
+    Returns:
+        dict: Requests in progress and queued per route class, rejections, and rate limiter state.
+    """
+    return admission.stats()
+
+
+@app.get("/admin/idempotency")
+async def idempotency_stats(user: models.User = Depends(auth.get_current_user),
+                            allowed: bool = Depends(admin_required)):
+    """
+    Reports the idempotency key store. Admin-only access.
+
+    Args:
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce admin role.
+
+    Returns:
+        dict: Backend, size and eviction counters of the store.
+    """
+    return idempotency.get_store().stats()
+
+
+@app.get("/admin/slow-queries")
+async def slow_query_log(user: models.User = Depends(auth.get_current_user),
+                         allowed: bool = Depends(admin_required)):
+    """
+    Lists recent statements slower than `TASK_SLOW_QUERY_MS`, newest first. Admin-only access.
+
+    Parameters are shown as their types only. A sample of the entries carries the
+    statement's `EXPLAIN (ANALYZE, BUFFERS)` plan.
+
+    Args:
+        user (models.User): The current authenticated user.
+        allowed (bool): Dependency to enforce admin role.
+
+    Returns:
+        dict: Capture settings and counts, and the recent slow statements.
+    """
+    return {**slow_queries.slow_log.stats(), "recent": slow_queries.slow_log.recent()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Exposes request, query, connection pool and authentication timings for Prometheus.
+
+    Unauthenticated, like most scrape targets; restrict access to it at the network level.
+
+    Returns:
+        Response: The metrics in the Prometheus text exposition format.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/ready", include_in_schema=False)
+async def readiness():
+    """
+    Readiness probe for load balancers and orchestrators.
+
+    Unauthenticated and not admission controlled, so it can be polled while the worker is busy.
+
+    Returns:
+        dict: `{"status": "ready"}` once the worker has warmed up and the primary database answers.
+
+    Raises:
+        HTTPException: 503 while the worker starts up, or when the database does not answer in time.
+    """
+    if not getattr(app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Starting up", headers={"Retry-After": "1"})
+    if not await storage.ping(timeout=READY_TIMEOUT):
+        raise HTTPException(status_code=503, detail="Database unavailable", headers={"Retry-After": "1"})
+    return {"status": "ready"}
 
 
 @app.post("/token")
@@ -143,8 +703,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
     Returns:
         dict: Access token and token type.
+
+    Raises:
+        HTTPException: 401 for bad credentials, 503 if password verification is saturated.
     """
-    user = auth.authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await auth.authenticate_user(form_data.username, form_data.password)
+    except users.HasherBusy:
+        raise HTTPException(status_code=503, detail="Too many login attempts in progress",
+                            headers={"Retry-After": "1"})
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
 
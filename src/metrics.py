@@ -0,0 +1,317 @@
+import bisect
+import threading
+import time
+
+# Upper bounds, in seconds, of request latency buckets (the Prometheus client defaults).
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Finer buckets for the steps inside a request.
+STEP_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Prometheus text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Every metric, in the order `render` lists them.
+REGISTRY = []
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A monotonically increasing count per label combination.
+
+    Attributes:
+        name (str): Metric name, ending in `_total`.
+        documentation (str): The `# HELP` text.
+        labelnames (tuple): Names of the labels, given positionally to `inc`.
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        """
+        Adds `amount` to the series of `labels`.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge:
+    """
+    A value that goes up and down, per label combination.
+
+    Attributes:
+        name (str): Metric name.
+        documentation (str): The `# HELP` text.
+        labelnames (tuple): Names of the labels, given positionally to `set` and `inc`.
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def set(self, value, *labels):
+        """
+        Sets the series of `labels` to `value`.
+        """
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        """
+        Adds `amount`, which may be negative, to the series of `labels`.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """
+    Observations counted into cumulative buckets, with their sum, per label combination.
+
+    Attributes:
+        name (str): Metric name.
+        documentation (str): The `# HELP` text.
+        labelnames (tuple): Names of the labels, given positionally to `observe`.
+        buckets (tuple): Increasing upper bounds; `+Inf` is implied.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        """
+        Records one observation in the series of `labels`.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labels):
+        """
+        Times a block and records its duration in seconds.
+
+        Returns:
+            Timer: A context manager.
+        """
+        return Timer(self, labels)
+
+    def collect(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = 'le="{}"'.format(bound if bound == "+Inf" else _number(float(bound)))
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Timer:
+    """
+    Context manager that observes the seconds spent in its block.
+    """
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time to serve a request, by route template.",
+                            ("method", "route", "status"))
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "Time spent in a query function.", ("query",),
+                          STEP_BUCKETS)
+QUERY_ROWS = Counter("db_query_rows_total", "Rows returned by a query function.", ("query",))
+QUERY_ERRORS = Counter("db_query_errors_total", "Query function calls that raised.", ("query",))
+POOL_ACQUIRE_SECONDS = Histogram("db_pool_acquire_seconds", "Time to check a connection out of the pool.",
+                                 ("role",), STEP_BUCKETS)
+AUTH_SECONDS = Histogram("auth_duration_seconds", "Time to authenticate a bearer token, by outcome.",
+                         ("result",), STEP_BUCKETS)
+ADMISSION_INFLIGHT = Gauge("admission_inflight_requests", "Requests admitted and not yet finished.",
+                           ("route_class",))
+ADMISSION_QUEUED = Gauge("admission_queued_requests", "Requests waiting to be admitted.", ("route_class",))
+ADMISSION_WAIT_SECONDS = Histogram("admission_wait_seconds", "Time admitted requests waited in the queue.",
+                                   ("route_class",), STEP_BUCKETS)
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Requests turned away, by reason.",
+                             ("route_class", "reason"))
+IDEMPOTENCY_REQUESTS = Counter("idempotency_requests_total",
+                               "Requests with an Idempotency-Key: executed, replayed, conflict or mismatch.",
+                               ("outcome",))
+PREPARED_STATEMENTS = Counter("db_prepared_statements_total",
+                              "Statements prepared on a pooled connection, and cached plans invalidated.",
+                              ("event",))
+ENCODE_SECONDS = Histogram("response_encode_seconds", "Time to encode rows straight into a response body.",
+                           ("media_type",), STEP_BUCKETS)
+
+
+def row_count(result):
+    """
+    Counts the rows in the return value of a query function.
+
+    Args:
+        result: A list of rows, a single row, or None.
+
+    Returns:
+        int: Number of rows.
+    """
+    if isinstance(result, list):
+        return len(result)
+    return 1 if isinstance(result, dict) else 0
+
+
+def timed_query(name, func, cursor, *args, **kwargs):
+    """
+    Calls a synchronous query function and records its duration and row count.
+
+    Args:
+        name (str): Query label, the function's name in `queries`.
+        func (Callable): The query function.
+        cursor: The cursor to run it on.
+        *args: Remaining positional arguments of the query function.
+        **kwargs: Keyword arguments of the query function.
+
+    Returns:
+        The query function's return value.
+    """
+    started = time.perf_counter()
+    try:
+        result = func(cursor, *args, **kwargs)
+    except Exception:
+        QUERY_ERRORS.inc(name)
+        raise
+    finally:
+        QUERY_SECONDS.observe(time.perf_counter() - started, name)
+    QUERY_ROWS.inc(name, amount=row_count(result))
+    return result
+
+
+async def timed_async_query(name, func, cursor, *args, **kwargs):
+    """
+    Awaits an async query function and records its duration and row count.
+
+    Args:
+        name (str): Query label, the function's name in `async_queries`.
+        func (Callable): The query coroutine function.
+        cursor: The cursor to run it on.
+        *args: Remaining positional arguments of the query function.
+        **kwargs: Keyword arguments of the query function.
+
+    Returns:
+        The query function's return value.
+    """
+    started = time.perf_counter()
+    try:
+        result = await func(cursor, *args, **kwargs)
+    except Exception:
+        QUERY_ERRORS.inc(name)
+        raise
+    finally:
+        QUERY_SECONDS.observe(time.perf_counter() - started, name)
+    QUERY_ROWS.inc(name, amount=row_count(result))
+    return result
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records the latency of every HTTP request in `REQUEST_SECONDS`.
+
+    Requests are labelled with the route template (`/tasks/{task_id}`), not the raw path, so
+    the number of series stays bounded; requests that match no route share "unmatched".
+    For streamed responses the time runs until the last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"],
+                                    getattr(route, "path", "unmatched"), str(status))
+
+
+def render():
+    """
+    Renders every metric in the Prometheus text exposition format.
+
+    Returns:
+        bytes: The `/metrics` response body.
+    """
+    return ("\n".join(line for metric in REGISTRY for line in metric.collect()) + "\n").encode()
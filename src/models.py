@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -55,6 +56,120 @@ class Task(TaskBase):
         orm_mode = True
 
 
+class TaskUpdate(TaskBase):
+    """
+    One entry of a batch update: the task to change and its new name and status.
+
+    Attributes:
+        id (int): Identifier of the task to update.
+        status (str): New status of the task.
+    """
+    id: int
+    status: str
+
+
+class TaskBatchCreate(BaseModel):
+    """
+    Request body of `POST /tasks:batch`.
+
+    Attributes:
+        tasks (List[TaskCreate]): Tasks to create, in order.
+    """
+    tasks: List[TaskCreate]
+
+
+class TaskBatchUpdate(BaseModel):
+    """
+    Request body of `PATCH /tasks:batch`.
+
+    Attributes:
+        tasks (List[TaskUpdate]): Tasks to update. If an ID repeats, its last entry wins.
+    """
+    tasks: List[TaskUpdate]
+
+
+class TaskBatchDelete(BaseModel):
+    """
+    Request body of `DELETE /tasks:batch`.
+
+    Attributes:
+        ids (List[int]): IDs of the tasks to delete.
+    """
+    ids: List[int]
+
+
+class TaskBatchItem(BaseModel):
+    """
+    Outcome of one entry of a batch request.
+
+    Attributes:
+        id (int): Identifier of the task the entry refers to.
+        result (str): "created", "updated", "deleted" or "not_found".
+        task (Optional[Task]): The task as written or deleted, absent when not found.
+    """
+    id: int
+    result: str
+    task: Optional[Task] = None
+
+
+class TaskBatchResult(BaseModel):
+    """
+    Response body of the batch endpoints.
+
+    Attributes:
+        results (List[TaskBatchItem]): One outcome per request entry, in request order.
+    """
+    results: List[TaskBatchItem]
+
+
+class TaskActivity(BaseModel):
+    """
+    Task writes over a trailing time window.
+
+    Attributes:
+        created (int): Tasks created.
+        updated (int): Task updates.
+        deleted (int): Tasks deleted.
+    """
+    created: int
+    updated: int
+    deleted: int
+
+
+class TaskStats(BaseModel):
+    """
+    Response body of the task statistics endpoint.
+
+    Attributes:
+        total (int): Number of tasks.
+        by_status (Dict[str, int]): Number of tasks per status.
+        windows (Dict[str, TaskActivity]): Write activity per trailing window, e.g. "5m", "1h".
+    """
+    total: int
+    by_status: Dict[str, int]
+    windows: Dict[str, TaskActivity]
+
+
+class TaskResult(BaseModel):
+    """
+    Outcome a worker recorded for a task.
+
+    Attributes:
+        task_id (int): Identifier of the task.
+        result (Any): The handler's return value, absent if it failed.
+        error (Optional[str]): Why the handler failed, absent if it succeeded.
+        attempts (int): Times the task was claimed, including the final one.
+        worker (str): ID of the worker that finished the task.
+        finished_at (datetime): When the outcome was recorded.
+    """
+    task_id: int
+    result: Any = None
+    error: Optional[str] = None
+    attempts: int
+    worker: str
+    finished_at: datetime
+
+
 class User(BaseModel):
     """
     Represents a user in the system.
@@ -0,0 +1,208 @@
+"""
+Server-side prepared statements for the hot single-row queries.
+
+Postgres parses, analyses and plans every statement it receives. For the short lookups and
+writes behind most requests that work costs as much as running them, so the statements in
+`queries.PREPARED_STATEMENTS` are prepared once per pooled connection and then only executed.
+
+- Sync backend: psycopg2 has no protocol-level prepare, so `PreparedCursor` sends
+  `PREPARE name AS ...` the first time a connection runs a statement and `EXECUTE name (...)`
+  from then on. The statements prepared on a connection are kept in its `StatementCache`.
+- Async backend: psycopg 3 prepares natively; `async_db.PreparedCursor` asks it to
+  (`prepare=True`) and notes whether a transaction wrote, so that `async_db.cursor_for` can end
+  read-only transactions with a COMMIT, because psycopg drops its prepared statements on ROLLBACK.
+
+A connection that reconnects starts with an empty cache. A schema change that alters a
+statement's result type fails its cached plan; the cache is then dropped and the statement is
+prepared again, retried transparently if it was the first of its transaction.
+Set `DB_PREPARED_STATEMENTS=off` behind a transaction-pooling proxy such as PgBouncer, where
+consecutive transactions may run on different server connections.
+"""
+
+import hashlib
+import os
+import re
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+from . import metrics, queries
+
+PREPARED_CONFIG = {
+    "enabled": os.environ.get("DB_PREPARED_STATEMENTS", "on").lower() not in ("off", "false", "0"),
+}
+
+# A statement whose plan no longer fits the schema ("cached plan must not change result type"),
+# or that is gone from the server, e.g. after a `DISCARD ALL`.
+PLAN_INVALIDATED = (psycopg2.errors.FeatureNotSupported, psycopg2.errors.InvalidSqlStatementName)
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+_SELECT = re.compile(r"\s*select\b", re.IGNORECASE)
+
+
+def should_prepare(query):
+    """
+    Reports whether a statement is run as a prepared statement.
+
+    Args:
+        query: The statement passed to `execute`.
+
+    Returns:
+        bool: True for a statement in `queries.PREPARED_STATEMENTS`, unless disabled.
+    """
+    return PREPARED_CONFIG["enabled"] and isinstance(query, str) and query in queries.PREPARED_STATEMENTS
+
+
+def is_read(query):
+    """
+    Reports whether a statement only reads, so that committing it is the same as rolling it back.
+
+    Args:
+        query: The statement passed to `execute`.
+
+    Returns:
+        bool: True for a SELECT (with or without `FOR UPDATE`); False for anything else.
+    """
+    if isinstance(query, bytes):
+        query = query.decode()
+    return isinstance(query, str) and _SELECT.match(query) is not None
+
+
+class Statement:
+    """
+    A statement with psycopg placeholders rewritten for `PREPARE`.
+
+    Attributes:
+        name (str): Server-side name, derived from the text so every connection uses the same one.
+        prepare_sql (str): The `PREPARE name AS ...` statement, with `$n` parameters.
+        execute_sql (str): The `EXECUTE name (...)` statement, with psycopg placeholders.
+        keys (Optional[list]): Parameter names in `$n` order for `%(name)s` statements, else None.
+    """
+
+    def __init__(self, sql):
+        self.name = "stmt_" + hashlib.sha1(sql.encode()).hexdigest()[:16]
+        self.keys = None
+        count = 0
+
+        def number(match):
+            nonlocal count
+            if match.group(0) == "%%":
+                return "%"
+            if match.group(1) is None:
+                count += 1
+                return f"${count}"
+            if self.keys is None:
+                self.keys = []
+            if match.group(1) not in self.keys:
+                self.keys.append(match.group(1))
+            return f"${self.keys.index(match.group(1)) + 1}"
+
+        text = _PLACEHOLDER.sub(number, sql.strip().rstrip(";").strip())
+        count = len(self.keys) if self.keys is not None else count
+        self.prepare_sql = f"PREPARE {self.name} AS {text};"
+        placeholders = ", ".join(["%s"] * count)
+        self.execute_sql = f"EXECUTE {self.name} ({placeholders});" if count else f"EXECUTE {self.name};"
+
+    def bind(self, params):
+        """
+        Orders a statement's parameters for its `EXECUTE`.
+
+        Args:
+            params (Optional[Sequence or Mapping]): The parameters given with the original statement.
+
+        Returns:
+            list or None: The parameter values in `$n` order.
+        """
+        if self.keys is not None:
+            return [params[key] for key in self.keys]
+        return list(params) if params else None
+
+
+class StatementCache:
+    """
+    The statements prepared on one connection.
+
+    Attributes:
+        prepares (int): Statements prepared on the connection so far.
+    """
+
+    def __init__(self):
+        self._statements = {}
+        self._stale = False
+        self.prepares = 0
+
+    def __len__(self):
+        return len(self._statements)
+
+    def execute(self, run, sql, params=None, rollback=None):
+        """
+        Runs a statement as a prepared statement, preparing it first if the connection has not yet.
+
+        Args:
+            run (Callable): Executes a statement with its parameters on the connection.
+            sql (str): The statement, with psycopg placeholders.
+            params (Optional[Sequence or Mapping]): Its parameters.
+            rollback (Optional[Callable]): Ends the failed transaction, so that a statement whose
+                plan was invalidated can be retried; None when the statement did not start the
+                transaction, in which case the error is raised.
+
+        Returns:
+            Whatever `run` returns for the `EXECUTE`.
+
+        Raises:
+            psycopg2.Error: As raised by the statement.
+        """
+        try:
+            return self._execute(run, sql, params)
+        except PLAN_INVALIDATED:
+            self.invalidate()
+            metrics.PREPARED_STATEMENTS.inc("invalidated")
+            if rollback is None:
+                raise
+            rollback()
+            return self._execute(run, sql, params)
+
+    def invalidate(self):
+        """
+        Forgets every prepared statement; they are deallocated before the next one is prepared.
+        """
+        self._statements.clear()
+        self._stale = True
+
+    def _execute(self, run, sql, params):
+        statement = self._statements.get(sql)
+        if statement is None:
+            if self._stale:
+                run("DEALLOCATE ALL;", None)
+                self._stale = False
+            statement = Statement(sql)
+            run(statement.prepare_sql, None)
+            self._statements[sql] = statement
+            self.prepares += 1
+            metrics.PREPARED_STATEMENTS.inc("prepared")
+        return run(statement.execute_sql, statement.bind(params))
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """
+    A psycopg2 connection that keeps the `StatementCache` of the statements prepared on it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = StatementCache()
+
+
+class PreparedCursor(psycopg2.extensions.cursor):
+    """
+    A cursor that runs the statements of `queries.PREPARED_STATEMENTS` through `PREPARE`/`EXECUTE`
+    on a `PreparedConnection`, and everything else as usual.
+    """
+
+    def execute(self, query, vars=None):
+        cache = getattr(self.connection, "statements", None)
+        if cache is None or not should_prepare(query):
+            return super().execute(query, vars)
+        began = self.connection.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        return cache.execute(super().execute, query, vars, self.connection.rollback if began else None)
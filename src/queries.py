@@ -1,14 +1,560 @@
-def get_all_tasks(cursor):
+import csv
+import io
+
+# SQL text is shared with `async_queries` so both backends run identical statements.
+TASK_COLUMNS = ("id", "name", "status", "created_at", "updated_at")
+
+# Finished tasks are moved to `tasks_archive` after a while (see `src.archive`); a lookup that
+# misses the live table falls through to the archive. The LIMIT stops the scan at the first
+# branch that finds the task, so live tasks never touch the archive.
+GET_TASK_BY_ID_SQL = """
+    SELECT id, name, status, created_at, updated_at FROM tasks WHERE id = %(id)s
+    UNION ALL
+    SELECT id, name, status, created_at, updated_at FROM tasks_archive WHERE id = %(id)s
+    LIMIT 1;
+"""
+
+GET_TASK_FOR_UPDATE_SQL = "SELECT * FROM tasks WHERE id = %s FOR UPDATE;"
+
+CREATE_TASK_SQL = """
+    INSERT INTO tasks (name, status, created_at, updated_at)
+    VALUES (%s, 'queued', now(), now())
+    RETURNING *;
+"""
+
+UPDATE_TASK_SQL = """
+    UPDATE tasks
+    SET name = %s,
+        status = %s,
+        updated_at = now()
+    WHERE id = %s
+    RETURNING *;
+"""
+
+DELETE_TASK_SQL = "DELETE FROM tasks WHERE id = %s RETURNING *;"
+
+CREATE_USERS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS users (
+        username text PRIMARY KEY,
+        password_hash text NOT NULL,
+        role text NOT NULL,
+        created_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+
+GET_USER_BY_USERNAME_SQL = "SELECT username, password_hash, role FROM users WHERE username = %s;"
+
+UPSERT_USER_SQL = """
+    INSERT INTO users (username, password_hash, role)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (username) DO UPDATE
+    SET password_hash = EXCLUDED.password_hash,
+        role = EXCLUDED.role
+    RETURNING username, role;
+"""
+
+# Batches at or above this size are loaded with COPY into a staging table instead of
+# being sent as statement parameters.
+BATCH_COPY_THRESHOLD = 5000
+
+CREATE_TASKS_SQL = """
+    INSERT INTO tasks (name, status, created_at, updated_at)
+    SELECT item.name, 'queued', now(), now()
+    FROM unnest(%s::text[]) WITH ORDINALITY AS item(name, ord)
+    ORDER BY item.ord
+    RETURNING *;
+"""
+
+UPDATE_TASKS_SQL = """
+    UPDATE tasks
+    SET name = item.name,
+        status = item.status,
+        updated_at = now()
+    FROM unnest(%s::bigint[], %s::text[], %s::text[]) AS item(id, name, status)
+    WHERE tasks.id = item.id
+    RETURNING tasks.*;
+"""
+
+DELETE_TASKS_SQL = "DELETE FROM tasks WHERE id = ANY(%s::bigint[]) RETURNING *;"
+
+CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS task_import (
+        ord bigint,
+        id bigint,
+        name text,
+        status text
+    ) ON COMMIT DELETE ROWS;
+"""
+
+INSERT_FROM_STAGING_SQL = """
+    INSERT INTO tasks (name, status, created_at, updated_at)
+    SELECT name, 'queued', now(), now()
+    FROM task_import
+    ORDER BY ord
+    RETURNING *;
+"""
+
+UPDATE_FROM_STAGING_SQL = """
+    UPDATE tasks
+    SET name = item.name,
+        status = item.status,
+        updated_at = now()
+    FROM task_import AS item
+    WHERE tasks.id = item.id
+    RETURNING tasks.*;
+"""
+
+
+# Trailing windows reported by `GET /tasks/stats`, in minutes.
+STATS_WINDOWS = {"5m": 5, "1h": 60, "24h": 1440}
+
+# Counters are spread over shards so concurrent writers rarely wait on the same row.
+GET_STATUS_COUNTS_SQL = """
+    SELECT status, sum(total)::bigint AS total
+    FROM task_status_counts
+    GROUP BY status
+    HAVING sum(total) <> 0
+    ORDER BY status;
+"""
+
+GET_ACTIVITY_SQL = "SELECT " + ",\n       ".join(
+    f"coalesce(sum({metric}) FILTER (WHERE bucket > now() - interval '{minutes} minutes'), 0)::bigint"
+    f" AS {metric}_{label}"
+    for label, minutes in STATS_WINDOWS.items() for metric in ("created", "updated", "deleted")
+) + f"\nFROM task_activity WHERE bucket > now() - interval '{max(STATS_WINDOWS.values())} minutes';"
+
+# Archived tasks still count. The lock also holds the archive job off, which deletes from `tasks`.
+RECONCILE_STATUS_COUNTS_SQL = """
+    LOCK TABLE tasks IN SHARE MODE;
+    DELETE FROM task_status_counts;
+    INSERT INTO task_status_counts (status, shard, total)
+    SELECT status, 0, count(*) FROM (
+        SELECT status FROM tasks
+        UNION ALL
+        SELECT status FROM tasks_archive
+    ) AS all_tasks GROUP BY status;
+"""
+
+PRUNE_ACTIVITY_SQL = "DELETE FROM task_activity WHERE bucket < now() - %s * interval '1 day';"
+
+
+# Zero on a primary, or on a standby that has replayed everything it received.
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag;
+"""
+
+# Bounds every later statement of the current transaction; see `storage.ping`.
+SET_STATEMENT_TIMEOUT_SQL = """
+    SELECT set_config('statement_timeout', %(timeout)s, true);
+"""
+
+# Worker statements (see `src.worker`). SKIP LOCKED lets any number of workers claim at once
+# without waiting on each other's rows; a lease is only honoured for the worker that holds it.
+CLAIM_TASKS_SQL = """
+    WITH claimable AS (
+        SELECT id FROM tasks
+        WHERE status = 'queued'
+        ORDER BY id
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ), started AS (
+        UPDATE tasks SET status = 'running', updated_at = now()
+        FROM claimable
+        WHERE tasks.id = claimable.id
+        RETURNING tasks.id, tasks.name
+    ), leased AS (
+        INSERT INTO task_leases (task_id, owner, expires_at)
+        SELECT id, %(owner)s, now() + %(lease)s * interval '1 second' FROM started
+        ON CONFLICT (task_id) DO UPDATE
+            SET owner = EXCLUDED.owner,
+                expires_at = EXCLUDED.expires_at,
+                attempts = task_leases.attempts + 1
+        RETURNING task_id, attempts
+    )
+    SELECT started.id, started.name, leased.attempts
+    FROM started JOIN leased ON leased.task_id = started.id
+    ORDER BY started.id;
+"""
+
+RENEW_LEASES_SQL = """
+    UPDATE task_leases
+    SET expires_at = now() + %(lease)s * interval '1 second'
+    WHERE owner = %(owner)s AND task_id = ANY(%(ids)s::bigint[])
+    RETURNING task_id;
+"""
+
+COMPLETE_TASKS_SQL = """
+    WITH outcome AS (
+        SELECT * FROM unnest(%(ids)s::bigint[], %(statuses)s::text[], %(results)s::text[], %(errors)s::text[])
+            AS item(id, status, result, error)
+    ), released AS (
+        DELETE FROM task_leases
+        USING outcome
+        WHERE task_leases.task_id = outcome.id AND task_leases.owner = %(owner)s
+        RETURNING task_leases.task_id, task_leases.attempts
+    ), finished AS (
+        UPDATE tasks SET status = outcome.status, updated_at = now()
+        FROM outcome JOIN released ON released.task_id = outcome.id
+        WHERE tasks.id = outcome.id
+    )
+    INSERT INTO task_results (task_id, result, error, attempts, worker, finished_at)
+    SELECT outcome.id, outcome.result::jsonb, outcome.error, released.attempts, %(owner)s, now()
+    FROM outcome JOIN released ON released.task_id = outcome.id
+    ON CONFLICT (task_id) DO UPDATE
+        SET result = EXCLUDED.result,
+            error = EXCLUDED.error,
+            attempts = EXCLUDED.attempts,
+            worker = EXCLUDED.worker,
+            finished_at = EXCLUDED.finished_at
+    RETURNING task_id;
+"""
+
+# Requeues tasks whose worker stopped renewing its lease, or fails them once they have been
+# attempted `max_attempts` times. Clearing the owner fences the old worker out. A failed task gets
+# its result row, so that its outcome can be read like any other, and its lease is deleted.
+REAP_EXPIRED_LEASES_SQL = """
+    WITH expired AS (
+        SELECT task_id, owner FROM task_leases
+        WHERE owner IS NOT NULL AND expires_at < now()
+        FOR UPDATE SKIP LOCKED
+    ), requeued AS (
+        UPDATE task_leases SET owner = NULL
+        FROM expired
+        WHERE task_leases.task_id = expired.task_id AND task_leases.attempts < %(max_attempts)s
+        RETURNING task_leases.task_id, task_leases.attempts, expired.owner
+    ), exhausted AS (
+        DELETE FROM task_leases
+        USING expired
+        WHERE task_leases.task_id = expired.task_id AND task_leases.attempts >= %(max_attempts)s
+        RETURNING task_leases.task_id, task_leases.attempts, expired.owner
+    ), reaped AS (
+        UPDATE tasks
+        SET status = CASE WHEN released.attempts >= %(max_attempts)s THEN 'failed' ELSE 'queued' END,
+            updated_at = now()
+        FROM (SELECT * FROM requeued UNION ALL SELECT * FROM exhausted) AS released
+        WHERE tasks.id = released.task_id AND tasks.status = 'running'
+        RETURNING tasks.id, tasks.status, released.attempts, released.owner
+    ), recorded AS (
+        INSERT INTO task_results (task_id, result, error, attempts, worker, finished_at)
+        SELECT id, NULL, 'lease expired after ' || attempts || ' attempts', attempts, owner, now()
+        FROM reaped
+        WHERE status = 'failed'
+        ON CONFLICT (task_id) DO UPDATE
+            SET result = EXCLUDED.result,
+                error = EXCLUDED.error,
+                attempts = EXCLUDED.attempts,
+                worker = EXCLUDED.worker,
+                finished_at = EXCLUDED.finished_at
+    )
+    SELECT id, status FROM reaped;
+"""
+
+GET_TASK_RESULT_SQL = """
+    SELECT task_id, result, error, attempts, worker, finished_at FROM task_results WHERE task_id = %(id)s
+    UNION ALL
+    SELECT id, result, error, attempts, worker, finished_at FROM tasks_archive
+    WHERE id = %(id)s AND finished_at IS NOT NULL
+    LIMIT 1;
+"""
+
+# Archival (see `src.archive`). Candidates are finished tasks untouched for the retention period,
+# locked so that a concurrent update either waits for the move or is skipped by it.
+ARCHIVE_CANDIDATES_SQL = """
+    SELECT id, date_trunc('month', created_at AT TIME ZONE 'UTC') AS month FROM tasks
+    WHERE status = ANY(%(statuses)s::text[]) AND updated_at < now() - %(days)s * interval '1 day'
+    ORDER BY id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED;
+"""
+
+# The move runs with `tasks.archiving` set, which the delete triggers check: a task going to the
+# archive is neither a deletion for the change feed nor for the status counters. Every statement
+# sees the rows as they were before it, so the join still finds the results the delete cascades to.
+ARCHIVE_TASKS_SQL = """
+    WITH moved AS (
+        DELETE FROM tasks WHERE id = ANY(%(ids)s::bigint[])
+        RETURNING id, name, status, created_at, updated_at
+    )
+    INSERT INTO tasks_archive (id, name, status, created_at, updated_at, result, error, attempts, worker,
+                               finished_at)
+    SELECT moved.id, moved.name, moved.status, moved.created_at, moved.updated_at,
+           task_results.result, task_results.error, task_results.attempts, task_results.worker,
+           task_results.finished_at
+    FROM moved LEFT JOIN task_results ON task_results.task_id = moved.id;
+"""
+
+ARCHIVE_PARTITIONS_SQL = """
+    SELECT child.relname AS name FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = 'tasks_archive';
+"""
+
+# Idempotency keys (see `src.idempotency`). A key is claimed by inserting its row; an existing
+# row is only taken over once it has expired, or while in flight if its claim went stale (the
+# request that held it died). Otherwise the existing row is returned so the caller can replay
+# or wait. A row committed after this statement started is not visible to it; the caller then
+# sees no row at all and tries again.
+CLAIM_IDEMPOTENCY_KEY_SQL = """
+    WITH claimed AS (
+        INSERT INTO idempotency_keys (username, key, fingerprint, locked_until)
+        VALUES (%(username)s, %(key)s, %(fingerprint)s, now() + %(lock)s * interval '1 second')
+        ON CONFLICT (username, key) DO UPDATE
+            SET fingerprint = EXCLUDED.fingerprint,
+                locked_until = EXCLUDED.locked_until,
+                status_code = NULL,
+                response = NULL,
+                headers = NULL,
+                created_at = now()
+            WHERE idempotency_keys.created_at < now() - %(ttl)s * interval '1 second'
+               OR (idempotency_keys.status_code IS NULL AND idempotency_keys.locked_until < now())
+        RETURNING true AS claimed, fingerprint, status_code, response, headers
+    )
+    SELECT * FROM claimed
+    UNION ALL
+    SELECT false, fingerprint, status_code, response, headers FROM idempotency_keys
+    WHERE username = %(username)s AND key = %(key)s AND NOT EXISTS (SELECT 1 FROM claimed);
+"""
+
+COMPLETE_IDEMPOTENCY_KEY_SQL = """
+    UPDATE idempotency_keys
+    SET status_code = %(status)s, response = %(response)s::jsonb, headers = %(headers)s::jsonb, locked_until = NULL
+    WHERE username = %(username)s AND key = %(key)s AND fingerprint = %(fingerprint)s AND status_code IS NULL;
+"""
+
+RELEASE_IDEMPOTENCY_KEY_SQL = """
+    DELETE FROM idempotency_keys
+    WHERE username = %(username)s AND key = %(key)s AND fingerprint = %(fingerprint)s AND status_code IS NULL;
+"""
+
+# Bounded, so one prune never holds many row locks.
+PRUNE_IDEMPOTENCY_KEYS_SQL = """
+    DELETE FROM idempotency_keys
+    WHERE ctid = ANY(ARRAY(
+        SELECT ctid FROM idempotency_keys
+        WHERE created_at < now() - %(ttl)s * interval '1 second'
+        LIMIT %(limit)s
+    ));
+"""
+
+# The single-row statements behind most requests, prepared once per pooled connection (see
+# `src.prepared`). Only statements whose parameters are scalars belong here: psycopg2 sends
+# `EXECUTE` arguments as literals, from which Postgres cannot tell an array's element type.
+PREPARED_STATEMENTS = frozenset({
+    GET_TASK_BY_ID_SQL,
+    GET_TASK_FOR_UPDATE_SQL,
+    CREATE_TASK_SQL,
+    UPDATE_TASK_SQL,
+    DELETE_TASK_SQL,
+    GET_USER_BY_USERNAME_SQL,
+    GET_TASK_RESULT_SQL,
+})
+
+
+def build_task_list_query(limit=None, after=None, status=None, created_after=None, created_before=None,
+                          updated_after=None, updated_before=None, name_contains=None, fields=None, archived=False):
+    """
+    Builds the keyset-paginated, filtered task listing query.
+
+    Pages are ordered by `id`, and `after` is the last `id` of the previous page, so every page
+    is an index range scan on the primary key no matter how deep the client has paged.
+    With `archived` the archive is listed instead; it is partitioned by month of `created_at`,
+    so `created_after` and `created_before` limit the scan to the partitions in range.
+
+    Args:
+        limit (Optional[int]): Maximum number of rows to return.
+        after (Optional[int]): Only return tasks with an ID greater than this.
+        status (Optional[str]): Only return tasks with this status.
+        created_after (Optional[datetime]): Only return tasks created after this time.
+        created_before (Optional[datetime]): Only return tasks created before this time.
+        updated_after (Optional[datetime]): Only return tasks updated after this time.
+        updated_before (Optional[datetime]): Only return tasks updated before this time.
+        name_contains (Optional[str]): Only return tasks whose name contains this text, ignoring case.
+        fields (Optional[Iterable[str]]): Columns to select; `id` is always included. All columns if empty.
+        archived (bool): List archived tasks rather than live ones.
+
+    Returns:
+        tuple: The SQL text and its parameters.
+
+    Raises:
+        ValueError: If `fields` names a column that is not in `TASK_COLUMNS`.
+    """
+    columns = ", ".join(TASK_COLUMNS) if archived else "*"
+    if fields:
+        unknown = set(fields) - set(TASK_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown task field(s): {', '.join(sorted(unknown))}")
+        columns = ", ".join(column for column in TASK_COLUMNS if column == "id" or column in fields)
+
+    if name_contains is not None:
+        escaped = name_contains.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        name_contains = f"%{escaped}%"
+
+    conditions, params = [], []
+    for clause, value in (("id > %s", after),
+                          ("status = %s", status),
+                          ("created_at > %s", created_after),
+                          ("created_at < %s", created_before),
+                          ("updated_at > %s", updated_after),
+                          ("updated_at < %s", updated_before),
+                          ("name ILIKE %s", name_contains)):
+        if value is not None:
+            conditions.append(clause)
+            params.append(value)
+
+    sql = f"SELECT {columns} FROM {'tasks_archive' if archived else 'tasks'}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql + ";", tuple(params)
+
+
+def build_task_version_query(**filters):
+    """
+    Builds a query for the version aggregate of a task listing page.
+
+    The aggregate (row count, latest `updated_at` and sum of IDs) changes whenever a task
+    enters, leaves or changes within the page, and is much cheaper to compute than the page itself.
+
+    Args:
+        **filters: Keyword arguments of `build_task_list_query`, except `fields`.
+
+    Returns:
+        tuple: The SQL text and its parameters.
+    """
+    page_sql, params = build_task_list_query(fields=("updated_at",), **filters)
+    sql = ("SELECT count(*) AS count, max(updated_at) AS last_updated, coalesce(sum(id), 0) AS id_sum "
+           f"FROM ({page_sql.rstrip(';')}) AS page;")
+    return sql, params
+
+
+def get_tasks_version(cursor, **filters):
     """
-    Retrieve all tasks from the database, ordered by their ID.
+    Retrieve the version aggregate of a task listing page, used to answer conditional requests.
 
     Args:
         cursor: A database cursor object used to execute SQL queries.
+        **filters: Keyword arguments forwarded to `build_task_version_query`.
 
     Returns:
-        list: A list of tuples, where each tuple represents a row in the 'tasks' table.
+        dict: `count`, `last_updated` and `id_sum` of the rows in the page.
+    """
+    cursor.execute(*build_task_version_query(**filters))
+    return cursor.fetchone()
+
+
+def get_all_tasks(cursor, **filters):
     """
-    cursor.execute("SELECT * FROM tasks ORDER BY id;")
+    Retrieve tasks from the database, ordered by their ID.
+
+    Without filters every task is returned; see `build_task_list_query` for the accepted
+    pagination, filter and projection keywords.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        **filters: Keyword arguments forwarded to `build_task_list_query`.
+
+    Returns:
+        list: A list of rows from the 'tasks' table.
+    """
+    cursor.execute(*build_task_list_query(**filters))
+    return cursor.fetchall()
+
+
+def iter_task_batches(connection, itersize=2000, **filters):
+    """
+    Streams tasks through a named (server-side) cursor, `itersize` rows at a time.
+
+    Only one batch is held in memory at once, whatever the size of the table. The cursor lives
+    in the connection's current transaction, which the caller ends once iteration is done.
+
+    Args:
+        connection (psycopg2.extensions.connection): A connection with no other open named cursor.
+        itersize (int): Number of rows fetched from the server per round trip.
+        **filters: Keyword arguments forwarded to `build_task_list_query`.
+
+    Yields:
+        list: Successive batches of task rows, ordered by ID.
+    """
+    with connection.cursor(name="export_tasks") as cursor:
+        cursor.execute(*build_task_list_query(**filters))
+        while True:
+            rows = cursor.fetchmany(itersize)
+            if not rows:
+                break
+            yield rows
+
+
+def _copy_to_staging(cursor, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+    buffer.seek(0)
+    cursor.execute(CREATE_STAGING_SQL)
+    cursor.copy_expert(f"COPY task_import ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def create_tasks(cursor, names):
+    """
+    Inserts many tasks in one statement, each with a default status of 'queued'.
+
+    Batches of `BATCH_COPY_THRESHOLD` names or more are streamed into a staging table with
+    COPY first; smaller ones are sent as a single array parameter.
+
+    Args:
+        cursor (psycopg2.cursor): The database cursor used to execute the SQL query.
+        names (list): Names of the tasks to create.
+
+    Returns:
+        list: The created task rows, in the same order as `names`.
+    """
+    if len(names) >= BATCH_COPY_THRESHOLD:
+        _copy_to_staging(cursor, ("ord", "name"), enumerate(names))
+        cursor.execute(INSERT_FROM_STAGING_SQL)
+    else:
+        cursor.execute(CREATE_TASKS_SQL, (list(names),))
+    return sorted(cursor.fetchall(), key=lambda row: row["id"])
+
+
+def update_tasks(cursor, items):
+    """
+    Updates the name and status of many tasks in one statement.
+
+    Args:
+        cursor (psycopg2.cursor): The database cursor to execute the query.
+        items (list): `(task_id, name, status)` tuples; task IDs must be unique.
+
+    Returns:
+        list: The updated task rows. Tasks that do not exist are absent.
+    """
+    if len(items) >= BATCH_COPY_THRESHOLD:
+        _copy_to_staging(cursor, ("ord", "id", "name", "status"),
+                         ((ord_, *item) for ord_, item in enumerate(items)))
+        cursor.execute(UPDATE_FROM_STAGING_SQL)
+    else:
+        ids, names, statuses = (list(column) for column in zip(*items)) if items else ([], [], [])
+        cursor.execute(UPDATE_TASKS_SQL, (ids, names, statuses))
+    return cursor.fetchall()
+
+
+def delete_tasks(cursor, task_ids):
+    """
+    Deletes many tasks in one statement.
+
+    Args:
+        cursor (psycopg2.cursor): The database cursor used to execute the query.
+        task_ids (list): IDs of the tasks to delete.
+
+    Returns:
+        list: The deleted task rows. Tasks that do not exist are absent.
+    """
+    cursor.execute(DELETE_TASKS_SQL, (list(task_ids),))
     return cursor.fetchall()
 
 
@@ -21,15 +567,31 @@ def get_task_by_id(cursor, task_id):
         task_id (int): The ID of the task to retrieve.
 
     Returns:
-        dict or None: A dictionary representing the task if found, or None if no task exists with the given ID.
+        dict or None: A dictionary representing the task if found, live or archived, or None if no
+        task exists with the given ID.
+    """
+    cursor.execute(GET_TASK_BY_ID_SQL, {"id": task_id})
+    return cursor.fetchone()
+
+
+def get_task_for_update(cursor, task_id):
+    """
+    Retrieve a task and lock it until the end of the current transaction.
+
+    Args:
+        cursor (psycopg2.cursor): The database cursor used to execute the SQL query.
+        task_id (int): The ID of the task to lock.
+
+    Returns:
+        dict or None: The task, or None if no task exists with the given ID.
     """
-    cursor.execute("SELECT * FROM tasks WHERE id = %s;", (task_id,))
+    cursor.execute(GET_TASK_FOR_UPDATE_SQL, (task_id,))
     return cursor.fetchone()
 
 
 def create_task(cursor, name):
     """
-    Inserts a new task into the 'tasks' table with the given name and a default status of 'running'.
+    Inserts a new task into the 'tasks' table with the given name and a default status of 'queued'.
 
     Args:
         cursor (psycopg2.cursor): The database cursor used to execute the SQL query.
@@ -38,11 +600,7 @@ def create_task(cursor, name):
     Returns:
         tuple: A tuple representing the newly created task, as returned by the database.
     """
-    cursor.execute("""
-        INSERT INTO tasks (name, status, created_at, updated_at)
-        VALUES (%s, 'running', now(), now())
-        RETURNING *;
-    """, (name,))
+    cursor.execute(CREATE_TASK_SQL, (name,))
     return cursor.fetchone()
 
 
@@ -59,14 +617,7 @@ def update_task(cursor, task_id, name, status):
     Returns:
         tuple: The updated task record as a tuple, or None if no task was updated.
     """
-    cursor.execute("""
-        UPDATE tasks
-        SET name = %s,
-            status = %s,
-            updated_at = now()
-        WHERE id = %s
-        RETURNING *;
-    """, (name, status, task_id))
+    cursor.execute(UPDATE_TASK_SQL, (name, status, task_id))
     return cursor.fetchone()
 
 
@@ -81,5 +632,330 @@ def delete_task(cursor, task_id):
     Returns:
         tuple: The deleted task's details as a tuple, or None if no task was deleted.
     """
-    cursor.execute("DELETE FROM tasks WHERE id = %s RETURNING *;", (task_id,))
+    cursor.execute(DELETE_TASK_SQL, (task_id,))
+    return cursor.fetchone()
+
+
+def get_user_by_username(cursor, username):
+    """
+    Retrieve a user's credentials and role.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        username (str): The user to look up.
+
+    Returns:
+        dict or None: `username`, `password_hash` and `role`, or None if the user does not exist.
+    """
+    cursor.execute(GET_USER_BY_USERNAME_SQL, (username,))
+    return cursor.fetchone()
+
+
+def upsert_user(cursor, username, password_hash, role):
+    """
+    Creates a user, or replaces the password hash and role of an existing one.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        username (str): The user to create or update.
+        password_hash (str): The encoded password hash from `users.hash_password`.
+        role (str): The user's role, e.g. "admin" or "readonly".
+
+    Returns:
+        dict: The user's `username` and `role`.
+    """
+    cursor.execute(UPSERT_USER_SQL, (username, password_hash, role))
+    return cursor.fetchone()
+
+
+def get_task_stats(cursor):
+    """
+    Reads the incrementally maintained task counters.
+
+    Both statements read a bounded number of counter rows, whatever the size of `tasks`.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+
+    Returns:
+        dict: Row counts by status under `by_status`, and the `created`, `updated` and `deleted`
+        counts of each of `STATS_WINDOWS` under `windows`.
+    """
+    cursor.execute(GET_STATUS_COUNTS_SQL)
+    by_status = {row["status"]: row["total"] for row in cursor.fetchall()}
+    cursor.execute(GET_ACTIVITY_SQL)
+    return stats_from_rows(by_status, cursor.fetchone())
+
+
+def stats_from_rows(by_status, activity):
+    """
+    Shapes the results of the stats statements into the `GET /tasks/stats` body.
+
+    Args:
+        by_status (dict): Status to task count.
+        activity (dict): The single row of `GET_ACTIVITY_SQL`.
+
+    Returns:
+        dict: `total`, `by_status` and `windows`.
+    """
+    windows = {label: {metric: activity[f"{metric}_{label}"] for metric in ("created", "updated", "deleted")}
+               for label in STATS_WINDOWS}
+    return {"total": sum(by_status.values()), "by_status": by_status, "windows": windows}
+
+
+def reconcile_task_stats(cursor, retention_days=7):
+    """
+    Rebuilds the status counters from the live and archived tasks and prunes old activity buckets.
+
+    Writes to `tasks` wait while the counters are rebuilt. Activity counts cannot be
+    recomputed, since updates and deletes leave no trace, so they are only pruned.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        retention_days (int): Activity buckets older than this many days are deleted.
+
+    Returns:
+        dict: Task count by status after the rebuild.
+    """
+    cursor.execute(RECONCILE_STATUS_COUNTS_SQL)
+    cursor.execute(PRUNE_ACTIVITY_SQL, (retention_days,))
+    cursor.execute(GET_STATUS_COUNTS_SQL)
+    return {row["status"]: row["total"] for row in cursor.fetchall()}
+
+
+def get_replica_lag(cursor):
+    """
+    Measures how far behind the primary the server is, in seconds.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+
+    Returns:
+        float: Seconds since the last replayed transaction, 0 when fully caught up or not a replica.
+    """
+    cursor.execute(REPLICA_LAG_SQL)
+    return float(cursor.fetchone()["lag"])
+
+
+def set_statement_timeout(cursor, seconds):
+    """
+    Makes the server cancel any later statement of the current transaction that runs too long.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        seconds (float): The limit; it ends with the transaction.
+    """
+    cursor.execute(SET_STATEMENT_TIMEOUT_SQL, {"timeout": f"{max(1, int(seconds * 1000))}ms"})
+
+
+def get_task_result(cursor, task_id):
+    """
+    Retrieves the outcome a worker recorded for a task, live or archived.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        task_id (int): The ID of the task.
+
+    Returns:
+        dict or None: The result row, or None if no worker has finished the task.
+    """
+    cursor.execute(GET_TASK_RESULT_SQL, {"id": task_id})
     return cursor.fetchone()
+
+
+def claim_tasks(cursor, owner, limit, lease_seconds):
+    """
+    Moves up to `limit` queued tasks to 'running' and leases them to `owner`.
+
+    Rows locked by another claim are skipped rather than waited for.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        owner (str): ID of the claiming worker.
+        limit (int): Most tasks to claim.
+        lease_seconds (float): How long the lease lasts unless renewed.
+
+    Returns:
+        list: `id`, `name` and `attempts` of each claimed task, in ID order.
+    """
+    cursor.execute(CLAIM_TASKS_SQL, {"owner": owner, "limit": limit, "lease": lease_seconds})
+    return cursor.fetchall()
+
+
+def renew_leases(cursor, owner, task_ids, lease_seconds):
+    """
+    Extends the leases `owner` still holds on the given tasks.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        owner (str): ID of the worker.
+        task_ids (list): IDs of the tasks it is running.
+        lease_seconds (float): New lease length, counted from now.
+
+    Returns:
+        set: IDs whose lease was renewed; the others were lost to the reaper.
+    """
+    cursor.execute(RENEW_LEASES_SQL, {"owner": owner, "ids": list(task_ids), "lease": lease_seconds})
+    return {row["task_id"] for row in cursor.fetchall()}
+
+
+def complete_tasks(cursor, owner, outcomes):
+    """
+    Records the outcome of finished tasks and releases their leases, in one statement.
+
+    Tasks whose lease `owner` no longer holds are left alone.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        owner (str): ID of the worker.
+        outcomes (list): `(task_id, status, result_json, error)` tuples.
+
+    Returns:
+        set: IDs whose outcome was recorded.
+    """
+    ids, statuses, results, errors = (list(column) for column in zip(*outcomes)) if outcomes else ([],) * 4
+    cursor.execute(COMPLETE_TASKS_SQL, {"owner": owner, "ids": ids, "statuses": statuses,
+                                        "results": results, "errors": errors})
+    return {row["task_id"] for row in cursor.fetchall()}
+
+
+def reap_expired_leases(cursor, max_attempts):
+    """
+    Takes back tasks whose lease expired, requeueing them or failing them for good.
+
+    A task failed this way gets a `task_results` row with the error "lease expired after N
+    attempts", and its lease is deleted.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        max_attempts (int): Attempts after which an expired task is failed instead of requeued.
+
+    Returns:
+        dict: Task ID to its new status.
+    """
+    cursor.execute(REAP_EXPIRED_LEASES_SQL, {"max_attempts": max_attempts})
+    return {row["id"]: row["status"] for row in cursor.fetchall()}
+
+
+def claim_idempotency_key(cursor, username, key, fingerprint, ttl, lock_seconds):
+    """
+    Claims an idempotency key for a request, or reads back whoever holds it.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        username (str): The user the key belongs to.
+        key (str): The client's `Idempotency-Key`.
+        fingerprint (str): Digest of the request the key is used for.
+        ttl (float): Seconds after which a key may be reused.
+        lock_seconds (float): Seconds after which an unfinished claim may be taken over.
+
+    Returns:
+        dict or None: `claimed`, `fingerprint`, `status_code`, `response` and `headers`, or None
+        if the key was claimed by a transaction that committed after this one started.
+    """
+    cursor.execute(CLAIM_IDEMPOTENCY_KEY_SQL, {"username": username, "key": key, "fingerprint": fingerprint,
+                                              "ttl": ttl, "lock": lock_seconds})
+    return cursor.fetchone()
+
+
+def complete_idempotency_key(cursor, username, key, fingerprint, status, response, headers):
+    """
+    Stores the response of the request that claimed an idempotency key.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        username (str): The user the key belongs to.
+        key (str): The client's `Idempotency-Key`.
+        fingerprint (str): Digest of the request, as claimed.
+        status (int): HTTP status of the response.
+        response (str): The response body as JSON.
+        headers (str): Replayed response headers as a JSON object.
+
+    Returns:
+        int: 1 if the response was stored, 0 if the claim had been taken over meanwhile.
+    """
+    cursor.execute(COMPLETE_IDEMPOTENCY_KEY_SQL, {"username": username, "key": key, "fingerprint": fingerprint,
+                                                 "status": status, "response": response, "headers": headers})
+    return cursor.rowcount
+
+
+def release_idempotency_key(cursor, username, key, fingerprint):
+    """
+    Gives up an unfinished claim on an idempotency key, so a retry runs the request again.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        username (str): The user the key belongs to.
+        key (str): The client's `Idempotency-Key`.
+        fingerprint (str): Digest of the request, as claimed.
+
+    Returns:
+        int: 1 if the claim was released.
+    """
+    cursor.execute(RELEASE_IDEMPOTENCY_KEY_SQL, {"username": username, "key": key, "fingerprint": fingerprint})
+    return cursor.rowcount
+
+
+def prune_idempotency_keys(cursor, ttl, limit=1000):
+    """
+    Deletes up to `limit` expired idempotency keys.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        ttl (float): Seconds a key is kept.
+        limit (int): Most keys to delete.
+
+    Returns:
+        int: Number of keys deleted.
+    """
+    cursor.execute(PRUNE_IDEMPOTENCY_KEYS_SQL, {"ttl": ttl, "limit": limit})
+    return cursor.rowcount
+
+
+def get_archive_candidates(cursor, statuses, days, limit):
+    """
+    Locks the next batch of finished tasks due for the archive.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        statuses (list): Statuses a task is finished in.
+        days (float): Days since its last update after which a finished task is archived.
+        limit (int): Most tasks to return.
+
+    Returns:
+        list: `id` and `month` (of `created_at`, in UTC) of each task, in ID order.
+    """
+    cursor.execute(ARCHIVE_CANDIDATES_SQL, {"statuses": list(statuses), "days": days, "limit": limit})
+    return cursor.fetchall()
+
+
+def archive_tasks(cursor, task_ids):
+    """
+    Moves tasks and their results to the archive, in one statement.
+
+    Must run with `tasks.archiving` set for the transaction (see `src.archive`), and after the
+    archive partitions for the tasks' months exist.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+        task_ids (list): IDs of the tasks to move.
+
+    Returns:
+        int: Number of tasks moved.
+    """
+    cursor.execute(ARCHIVE_TASKS_SQL, {"ids": list(task_ids)})
+    return cursor.rowcount
+
+
+def get_archive_partitions(cursor):
+    """
+    Lists the partitions of the archive.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+
+    Returns:
+        set: Partition table names.
+    """
+    cursor.execute(ARCHIVE_PARTITIONS_SQL)
+    return {row["name"] for row in cursor.fetchall()}
@@ -0,0 +1,158 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+
+from starlette.datastructures import Headers
+
+# Identifies the client of the request being handled: its credentials, or its address when
+# it sent none. Set by `ClientContextMiddleware`.
+current_client = contextvars.ContextVar("current_client", default=None)
+
+
+def client_key(headers, client=None):
+    """
+    Derives the key read-your-writes stickiness is tracked under.
+
+    Args:
+        headers (Mapping[str, str]): The request headers.
+        client (Optional[tuple]): The `(host, port)` of the peer.
+
+    Returns:
+        str or None: The key, or None if the client cannot be identified.
+    """
+    authorization = headers.get("authorization")
+    if authorization:
+        return authorization
+    return client[0] if client else None
+
+
+class ClientContextMiddleware:
+    """
+    ASGI middleware that records the client of each request in `current_client`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_client.set(client_key(Headers(scope=scope), scope.get("client")))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_client.reset(token)
+
+
+class StickyClients:
+    """
+    Remembers which clients wrote recently, so that their reads can see their own writes.
+
+    Bounded LRU; a client pushed out early merely risks reading from the replica sooner.
+    Stickiness is per process, so it holds for clients that keep a connection to one worker.
+
+    Attributes:
+        window (float): Seconds after a write during which the client's reads use the primary.
+        max_size (int): Clients remembered at once.
+    """
+
+    def __init__(self, window=5.0, max_size=10000):
+        self.window = window
+        self.max_size = max_size
+        self._until = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark_write(self, key=None):
+        """
+        Records a committed write by a client.
+
+        Args:
+            key (Optional[str]): The client; the one of the current request when omitted.
+        """
+        key = current_client.get() if key is None else key
+        if key is None or self.window <= 0:
+            return
+        with self._lock:
+            self._until[key] = time.monotonic() + self.window
+            self._until.move_to_end(key)
+            while len(self._until) > self.max_size:
+                self._until.popitem(last=False)
+
+    def is_sticky(self, key=None):
+        """
+        Reports whether a client wrote within the last `window` seconds.
+
+        Args:
+            key (Optional[str]): The client; the one of the current request when omitted.
+
+        Returns:
+            bool: True if its reads must go to the primary.
+        """
+        key = current_client.get() if key is None else key
+        if key is None:
+            return False
+        with self._lock:
+            until = self._until.get(key)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._until[key]
+                return False
+            return True
+
+
+class LagGuard:
+    """
+    Tracks replica lag, measuring it at most once per `check_interval`.
+
+    Attributes:
+        max_lag (float): Lag in seconds up to which the replica may serve reads.
+        check_interval (float): Seconds a measurement is trusted.
+    """
+
+    def __init__(self, max_lag=2.0, check_interval=1.0):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag = None
+        self._checked_at = None
+        self._lock = None
+        self._fallbacks = 0
+
+    async def replica_usable(self, measure):
+        """
+        Decides whether the replica is fresh enough, measuring its lag if the last value is stale.
+
+        Only one measurement runs at a time; concurrent callers use the previous value.
+
+        Args:
+            measure (Callable[[], Awaitable[Optional[float]]]): Returns the lag in seconds, or
+                None if the replica could not be reached.
+
+        Returns:
+            bool: True if reads may go to the replica.
+        """
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            if not self._lock.locked():
+                async with self._lock:
+                    self._lag = await measure()
+                    self._checked_at = time.monotonic()
+        usable = self._lag is not None and self._lag <= self.max_lag
+        if not usable:
+            self._fallbacks += 1
+        return usable
+
+    def stats(self):
+        """
+        Reports the last measurement.
+
+        Returns:
+            dict: Last lag in seconds (None if unreachable), its age and reads sent to the primary.
+        """
+        age = None if self._checked_at is None else time.monotonic() - self._checked_at
+        return {"replica_lag": self._lag, "measured_ago": age, "max_lag": self.max_lag,
+                "lag_fallbacks": self._fallbacks}
@@ -0,0 +1,388 @@
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from . import queries
+
+# Ordered schema migrations: (version, description, SQL). Each one is applied in its own
+# transaction and recorded in `schema_migrations`; never edit a migration that has shipped,
+# append a new one instead.
+MIGRATIONS = [
+    (1, "create tasks table", """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            name text NOT NULL,
+            status text NOT NULL DEFAULT 'running',
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now()
+        );
+    """),
+    (2, "create users table", queries.CREATE_USERS_TABLE_SQL),
+    (3, "index tasks for listing filters", """
+        -- status = %s AND id > %s ORDER BY id LIMIT n: one range scan per page.
+        CREATE INDEX IF NOT EXISTS tasks_status_id_idx ON tasks (status, id);
+        -- updated_at range filters and ordering (incremental sync, change polling).
+        CREATE INDEX IF NOT EXISTS tasks_updated_at_id_idx ON tasks (updated_at, id);
+        CREATE INDEX IF NOT EXISTS tasks_created_at_idx ON tasks (created_at);
+    """),
+    (4, "index task names for substring search", """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        -- name ILIKE '%...%' cannot use a btree; a trigram index serves it.
+        CREATE INDEX IF NOT EXISTS tasks_name_trgm_idx ON tasks USING gin (name gin_trgm_ops);
+    """),
+    (5, "publish task changes on task_events", """
+        CREATE SEQUENCE IF NOT EXISTS task_event_seq;
+        -- Notifications are delivered on commit, in commit order, to every listening process.
+        CREATE OR REPLACE FUNCTION notify_task_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM pg_notify('task_events', json_build_object(
+                    'event_id', nextval('task_event_seq'), 'op', 'delete', 'id', OLD.id)::text);
+                RETURN OLD;
+            END IF;
+            PERFORM pg_notify('task_events', json_build_object(
+                'event_id', nextval('task_event_seq'), 'op', lower(TG_OP), 'id', NEW.id,
+                'status', NEW.status, 'updated_at', NEW.updated_at)::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS tasks_notify ON tasks;
+        CREATE TRIGGER tasks_notify AFTER INSERT OR UPDATE OR DELETE ON tasks
+            FOR EACH ROW EXECUTE FUNCTION notify_task_change();
+    """),
+    (6, "maintain task counters", """
+        CREATE TABLE IF NOT EXISTS task_status_counts (
+            status text NOT NULL,
+            shard smallint NOT NULL,
+            total bigint NOT NULL,
+            PRIMARY KEY (status, shard)
+        );
+        CREATE TABLE IF NOT EXISTS task_activity (
+            bucket timestamptz NOT NULL,
+            shard smallint NOT NULL,
+            created bigint NOT NULL DEFAULT 0,
+            updated bigint NOT NULL DEFAULT 0,
+            deleted bigint NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket, shard)
+        );
+        -- Statement-level, so a batch of any size costs one counter update per status.
+        -- Writers pick a shard by backend so concurrent transactions rarely share a row.
+        CREATE OR REPLACE FUNCTION count_task_changes() RETURNS trigger AS $$
+        DECLARE
+            _shard smallint := pg_backend_pid() % 8;
+            _bucket timestamptz := date_trunc('minute', now());
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO task_status_counts (status, shard, total)
+                SELECT status, _shard, count(*) FROM new_rows GROUP BY status
+                ON CONFLICT (status, shard) DO UPDATE SET total = task_status_counts.total + EXCLUDED.total;
+                INSERT INTO task_activity (bucket, shard, created)
+                SELECT _bucket, _shard, count(*) FROM new_rows HAVING count(*) > 0
+                ON CONFLICT (bucket, shard) DO UPDATE SET created = task_activity.created + EXCLUDED.created;
+            ELSIF TG_OP = 'DELETE' THEN
+                INSERT INTO task_status_counts (status, shard, total)
+                SELECT status, _shard, -count(*) FROM old_rows GROUP BY status
+                ON CONFLICT (status, shard) DO UPDATE SET total = task_status_counts.total + EXCLUDED.total;
+                INSERT INTO task_activity (bucket, shard, deleted)
+                SELECT _bucket, _shard, count(*) FROM old_rows HAVING count(*) > 0
+                ON CONFLICT (bucket, shard) DO UPDATE SET deleted = task_activity.deleted + EXCLUDED.deleted;
+            ELSE
+                INSERT INTO task_status_counts (status, shard, total)
+                SELECT status, _shard, sum(delta) FROM (
+                    SELECT status, 1 AS delta FROM new_rows
+                    UNION ALL
+                    SELECT status, -1 FROM old_rows
+                ) AS changes GROUP BY status HAVING sum(delta) <> 0
+                ON CONFLICT (status, shard) DO UPDATE SET total = task_status_counts.total + EXCLUDED.total;
+                INSERT INTO task_activity (bucket, shard, updated)
+                SELECT _bucket, _shard, count(*) FROM new_rows HAVING count(*) > 0
+                ON CONFLICT (bucket, shard) DO UPDATE SET updated = task_activity.updated + EXCLUDED.updated;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        -- A trigger with transition tables can only handle one kind of event.
+        DROP TRIGGER IF EXISTS tasks_count_insert ON tasks;
+        CREATE TRIGGER tasks_count_insert AFTER INSERT ON tasks REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION count_task_changes();
+        DROP TRIGGER IF EXISTS tasks_count_update ON tasks;
+        CREATE TRIGGER tasks_count_update AFTER UPDATE ON tasks
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION count_task_changes();
+        DROP TRIGGER IF EXISTS tasks_count_delete ON tasks;
+        CREATE TRIGGER tasks_count_delete AFTER DELETE ON tasks REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION count_task_changes();
+        -- The triggers hold writes off until this commits, so the backfill cannot miss a row.
+        DELETE FROM task_status_counts;
+        INSERT INTO task_status_counts (status, shard, total)
+        SELECT status, 0, count(*) FROM tasks GROUP BY status;
+    """),
+    (7, "worker leases and task results", """
+        -- New tasks wait in 'queued' until a worker claims them (see src/worker.py).
+        ALTER TABLE tasks ALTER COLUMN status SET DEFAULT 'queued';
+        CREATE INDEX IF NOT EXISTS tasks_queued_idx ON tasks (id) WHERE status = 'queued';
+        -- A lease whose owner is NULL was released; the row keeps the attempt count.
+        CREATE TABLE IF NOT EXISTS task_leases (
+            task_id bigint PRIMARY KEY REFERENCES tasks (id) ON DELETE CASCADE,
+            owner text,
+            expires_at timestamptz NOT NULL,
+            attempts integer NOT NULL DEFAULT 1
+        );
+        CREATE INDEX IF NOT EXISTS task_leases_expires_idx ON task_leases (expires_at) WHERE owner IS NOT NULL;
+        CREATE TABLE IF NOT EXISTS task_results (
+            task_id bigint PRIMARY KEY REFERENCES tasks (id) ON DELETE CASCADE,
+            result jsonb,
+            error text,
+            attempts integer NOT NULL,
+            worker text NOT NULL,
+            finished_at timestamptz NOT NULL DEFAULT now()
+        );
+    """),
+    (8, "idempotency keys", """
+        -- One row per (user, Idempotency-Key). While the request that claimed it runs,
+        -- status_code is NULL and locked_until bounds how long others wait for it.
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            username text NOT NULL,
+            key text NOT NULL,
+            fingerprint text NOT NULL,
+            status_code integer,
+            response jsonb,
+            headers jsonb,
+            locked_until timestamptz,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (username, key)
+        );
+        CREATE INDEX IF NOT EXISTS idempotency_keys_created_at_idx ON idempotency_keys (created_at);
+    """),
+    (9, "archive finished tasks", """
+        -- Cold storage for finished tasks (see src/archive.py), one partition per month of
+        -- created_at, created by the archive job as needed. A task keeps its ID and its result.
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id bigint NOT NULL,
+            name text NOT NULL,
+            status text NOT NULL,
+            created_at timestamptz NOT NULL,
+            updated_at timestamptz NOT NULL,
+            archived_at timestamptz NOT NULL DEFAULT now(),
+            result jsonb,
+            error text,
+            attempts integer,
+            worker text,
+            finished_at timestamptz,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        CREATE INDEX IF NOT EXISTS tasks_archive_status_id_idx ON tasks_archive (status, id);
+        CREATE INDEX IF NOT EXISTS tasks_archive_updated_at_id_idx ON tasks_archive (updated_at, id);
+        -- Moving a task to the archive is not a deletion: the archive job sets tasks.archiving
+        -- for its transaction, and the change feed and status counters ignore its deletes.
+        DROP TRIGGER IF EXISTS tasks_notify ON tasks;
+        CREATE TRIGGER tasks_notify AFTER INSERT OR UPDATE ON tasks
+            FOR EACH ROW EXECUTE FUNCTION notify_task_change();
+        DROP TRIGGER IF EXISTS tasks_notify_delete ON tasks;
+        CREATE TRIGGER tasks_notify_delete AFTER DELETE ON tasks
+            FOR EACH ROW WHEN (current_setting('tasks.archiving', true) IS DISTINCT FROM 'on')
+            EXECUTE FUNCTION notify_task_change();
+        DROP TRIGGER IF EXISTS tasks_count_delete ON tasks;
+        CREATE TRIGGER tasks_count_delete AFTER DELETE ON tasks REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT WHEN (current_setting('tasks.archiving', true) IS DISTINCT FROM 'on')
+            EXECUTE FUNCTION count_task_changes();
+    """),
+]
+
+MIGRATIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version integer PRIMARY KEY,
+        description text NOT NULL,
+        applied_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+
+# Serialises concurrent `migrate` runs, e.g. several containers starting at once.
+MIGRATION_LOCK_ID = 7_210_001
+
+
+def applied_versions(cursor):
+    """
+    Lists the migrations already applied to the database.
+
+    Args:
+        cursor: A database cursor object used to execute SQL queries.
+
+    Returns:
+        set: Versions recorded in `schema_migrations`.
+    """
+    cursor.execute(MIGRATIONS_TABLE_SQL)
+    cursor.execute("SELECT version FROM schema_migrations;")
+    return {row["version"] for row in cursor.fetchall()}
+
+
+def migrate(conn, target=None):
+    """
+    Applies every pending migration up to `target`, each in its own transaction.
+
+    Args:
+        conn (psycopg2.extensions.connection): A connection with rights to run DDL.
+        target (Optional[int]): Highest version to apply; all of them when omitted.
+
+    Returns:
+        list: Versions applied by this call.
+    """
+    applied = []
+    for version, description, sql in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_ID,))
+            if version in applied_versions(cur):
+                conn.rollback()
+                continue
+            cur.execute(sql)
+            cur.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                        (version, description))
+        conn.commit()
+        applied.append(version)
+    return applied
+
+
+# Statement constants of `queries` with no explain case, and why. Every other one must have a case.
+UNEXPLAINED = {
+    "CREATE_USERS_TABLE_SQL": "DDL",
+    "CREATE_STAGING_SQL": "DDL",
+    "INSERT_FROM_STAGING_SQL": "reads the temporary table that CREATE_STAGING_SQL creates per session",
+    "UPDATE_FROM_STAGING_SQL": "reads the temporary table that CREATE_STAGING_SQL creates per session",
+    "RECONCILE_STATUS_COUNTS_SQL": "several statements; it rebuilds the counters from full scans by design",
+}
+
+
+def explain_cases():
+    """
+    Lists every statement in `queries`, except those in `UNEXPLAINED`, with representative parameters.
+
+    Returns:
+        list: `(label, sql, params)` tuples.
+    """
+    day_ago = datetime.now(timezone.utc) - timedelta(days=1)
+    return [
+        ("get_all_tasks: first page", *queries.build_task_list_query(limit=101)),
+        ("get_all_tasks: later page", *queries.build_task_list_query(limit=101, after=1000)),
+        ("get_all_tasks: status filter", *queries.build_task_list_query(limit=101, after=0, status="running")),
+        ("get_all_tasks: updated since", *queries.build_task_list_query(limit=101, updated_after=day_ago)),
+        ("get_all_tasks: name search", *queries.build_task_list_query(limit=101, name_contains="backup")),
+        ("get_all_tasks: archive, created range",
+         *queries.build_task_list_query(limit=101, archived=True, created_after=day_ago - timedelta(days=30),
+                                        created_before=day_ago)),
+        ("get_tasks_version", *queries.build_task_version_query(limit=100, status="running")),
+        ("iter_task_batches", *queries.build_task_list_query()),
+        ("get_task_by_id", queries.GET_TASK_BY_ID_SQL, {"id": 1}),
+        ("get_task_for_update", queries.GET_TASK_FOR_UPDATE_SQL, (1,)),
+        ("create_task", queries.CREATE_TASK_SQL, ("explain",)),
+        ("update_task", queries.UPDATE_TASK_SQL, ("explain", "done", 1)),
+        ("delete_task", queries.DELETE_TASK_SQL, (1,)),
+        ("create_tasks", queries.CREATE_TASKS_SQL, (["a", "b"],)),
+        ("update_tasks", queries.UPDATE_TASKS_SQL, ([1, 2], ["a", "b"], ["done", "done"])),
+        ("delete_tasks", queries.DELETE_TASKS_SQL, ([1, 2],)),
+        ("get_user_by_username", queries.GET_USER_BY_USERNAME_SQL, ("admin",)),
+        ("get_task_stats: status counts", queries.GET_STATUS_COUNTS_SQL, ()),
+        ("get_task_stats: activity", queries.GET_ACTIVITY_SQL, ()),
+        ("reconcile_task_stats: prune activity", queries.PRUNE_ACTIVITY_SQL, (7,)),
+        ("get_replica_lag", queries.REPLICA_LAG_SQL, ()),
+        ("set_statement_timeout", queries.SET_STATEMENT_TIMEOUT_SQL, {"timeout": "2000ms"}),
+        ("upsert_user", queries.UPSERT_USER_SQL, ("explain", "x", "readonly")),
+        ("get_task_result", queries.GET_TASK_RESULT_SQL, {"id": 1}),
+        ("claim_tasks", queries.CLAIM_TASKS_SQL, {"owner": "explain", "limit": 16, "lease": 30}),
+        ("renew_leases", queries.RENEW_LEASES_SQL, {"owner": "explain", "ids": [1, 2], "lease": 30}),
+        ("complete_tasks", queries.COMPLETE_TASKS_SQL,
+         {"owner": "explain", "ids": [1], "statuses": ["done"], "results": ["null"], "errors": [None]}),
+        ("reap_expired_leases", queries.REAP_EXPIRED_LEASES_SQL, {"max_attempts": 3}),
+        ("claim_idempotency_key", queries.CLAIM_IDEMPOTENCY_KEY_SQL,
+         {"username": "explain", "key": "k", "fingerprint": "f", "ttl": 86400, "lock": 60}),
+        ("complete_idempotency_key", queries.COMPLETE_IDEMPOTENCY_KEY_SQL,
+         {"username": "explain", "key": "k", "fingerprint": "f", "status": 200, "response": "{}", "headers": "{}"}),
+        ("release_idempotency_key", queries.RELEASE_IDEMPOTENCY_KEY_SQL,
+         {"username": "explain", "key": "k", "fingerprint": "f"}),
+        ("prune_idempotency_keys", queries.PRUNE_IDEMPOTENCY_KEYS_SQL, {"ttl": 86400, "limit": 1000}),
+        ("get_archive_candidates", queries.ARCHIVE_CANDIDATES_SQL,
+         {"statuses": ["done", "failed"], "days": 30, "limit": 1000}),
+        ("archive_tasks", queries.ARCHIVE_TASKS_SQL, {"ids": [1, 2]}),
+        ("get_archive_partitions", queries.ARCHIVE_PARTITIONS_SQL, ()),
+    ]
+
+
+def explain(conn, analyze=False):
+    """
+    Collects the query plan of every statement in `queries`.
+
+    With `analyze` the statements really run (so the plans show actual timings and buffer
+    usage), inside a transaction that is always rolled back.
+
+    Args:
+        conn (psycopg2.extensions.connection): A connection to the database to inspect.
+        analyze (bool): Use `EXPLAIN (ANALYZE, BUFFERS)` instead of a plain `EXPLAIN`.
+
+    Returns:
+        list: `(label, plan)` tuples, the plan as text.
+    """
+    prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+    plans = []
+    try:
+        with conn.cursor() as cur:
+            for label, sql, params in explain_cases():
+                cur.execute("SAVEPOINT explain_case;")
+                cur.execute(prefix + sql.strip(), params)
+                plans.append((label, "\n".join(row["QUERY PLAN"] for row in cur.fetchall())))
+                cur.execute("ROLLBACK TO SAVEPOINT explain_case;")
+    finally:
+        conn.rollback()
+    return plans
+
+
+def main():
+    """
+    Command line entry point.
+
+        python -m src.schema migrate [--target N]
+        python -m src.schema status
+        python -m src.schema explain [--analyze]
+        python -m src.schema reconcile-stats [--retention-days N]
+    """
+    from . import db
+
+    parser = argparse.ArgumentParser(description="Manage the task manager database schema.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser("migrate", help="apply pending migrations")
+    migrate_parser.add_argument("--target", type=int, help="highest version to apply")
+    commands.add_parser("status", help="list migrations and whether they are applied")
+    explain_parser = commands.add_parser("explain", help="print the plan of every query in src/queries.py")
+    explain_parser.add_argument("--analyze", action="store_true",
+                                help="run the statements (rolled back) and include actual timings and buffers")
+    reconcile_parser = commands.add_parser("reconcile-stats",
+                                           help="rebuild the task counters behind GET /tasks/stats")
+    reconcile_parser.add_argument("--retention-days", type=int, default=7,
+                                  help="delete activity buckets older than this")
+    args = parser.parse_args()
+
+    conn = db.get_connection()
+    try:
+        if args.command == "migrate":
+            applied = migrate(conn, args.target)
+            print(f"Applied {', '.join(map(str, applied))}." if applied else "Schema is up to date.")
+        elif args.command == "status":
+            with conn.cursor() as cur:
+                done = applied_versions(cur)
+            conn.commit()
+            for version, description, _ in MIGRATIONS:
+                print(f"{'applied' if version in done else 'pending':>8}  {version:>3}  {description}")
+        elif args.command == "reconcile-stats":
+            with conn.cursor() as cur:
+                counts = queries.reconcile_task_stats(cur, args.retention_days)
+            conn.commit()
+            for status, total in counts.items():
+                print(f"{total:>12}  {status}")
+        else:
+            for label, plan in explain(conn, args.analyze):
+                print(f"-- {label}\n{plan}\n")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
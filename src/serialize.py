@@ -0,0 +1,251 @@
+import json
+import os
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from . import metrics, queries
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+# "pydantic" validates list rows into `models.Task` before encoding them; "fast" encodes the
+# database rows directly. Both produce the same JSON.
+SERIALIZER = os.environ.get("TASK_SERIALIZER", "pydantic")
+
+if SERIALIZER not in ("pydantic", "fast"):
+    raise ValueError(f"TASK_SERIALIZER must be 'pydantic' or 'fast', not {SERIALIZER!r}")
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+# One array per task field instead of one object per task: field names are sent once per
+# page, and consumers loading into dataframes or column stores skip the pivot.
+COLUMNS_JSON = "application/vnd.task-columns+json"
+COLUMNS_MSGPACK = "application/vnd.task-columns+msgpack"
+
+# Media types that may be asked for, in server preference order for equal quality values.
+MEDIA_TYPES = (JSON, MSGPACK, COLUMNS_JSON, COLUMNS_MSGPACK)
+SINGLE_MEDIA_TYPES = (JSON, MSGPACK)
+
+_ALIASES = {"application/x-msgpack": MSGPACK}
+
+
+def is_fast():
+    """
+    Reports whether task lists skip the Pydantic round trip.
+
+    Returns:
+        bool: True when `SERIALIZER` is "fast".
+    """
+    return SERIALIZER == "fast"
+
+
+def _parse_accept(header):
+    ranges = []
+    for position, item in enumerate(header.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        ranges.append((media_type.lower(), quality, position))
+    return ranges
+
+
+def _quality(media_type, ranges):
+    best, best_specificity = 0.0, -1
+    main_type = media_type.split("/")[0]
+    for candidate, quality, _ in ranges:
+        candidate = _ALIASES.get(candidate, candidate)
+        if candidate == media_type:
+            specificity = 2
+        elif candidate == f"{main_type}/*":
+            specificity = 1
+        elif candidate == "*/*":
+            specificity = 0
+        else:
+            continue
+        if specificity > best_specificity:
+            best, best_specificity = quality, specificity
+    return best
+
+
+def negotiate(accept, offered=MEDIA_TYPES):
+    """
+    Picks the response media type from an `Accept` header.
+
+    Args:
+        accept (Optional[str]): The header value; JSON is used when it is missing or empty.
+        offered (Sequence[str]): Media types the endpoint can produce, JSON first. MessagePack
+            types are dropped when msgpack is not installed.
+
+    Returns:
+        str: The chosen media type.
+
+    Raises:
+        HTTPException: 406 if none of `offered` is acceptable.
+    """
+    if msgpack is None:
+        offered = [media_type for media_type in offered if not media_type.endswith("msgpack")]
+    if not accept or not accept.strip():
+        return JSON
+    ranges = _parse_accept(accept)
+    quality, media_type = max(((_quality(media_type, ranges), -index), media_type)
+                              for index, media_type in enumerate(offered))
+    if quality[0] <= 0:
+        raise HTTPException(status_code=406, detail=f"Supported media types: {', '.join(offered)}")
+    return media_type
+
+
+def json_default(value):
+    """
+    Encodes the values the standard `json` module cannot, as the JSON API renders them.
+
+    Args:
+        value: A value found while encoding.
+
+    Returns:
+        str or dict: A `datetime` in ISO 8601, with "Z" for UTC, the same form as Pydantic; a
+        model (e.g. a `models.Task` from a mocked or cached query) as its fields.
+
+    Raises:
+        TypeError: For any other type.
+    """
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        if value.utcoffset() is not None and not value.utcoffset():
+            text = text[:-6] + "Z"
+        return text
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _orjson_default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _msgpack_default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, datetime):
+        # The MessagePack timestamp extension: 8-12 bytes instead of a 20-30 character string.
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+
+def dumps(rows):
+    """
+    Encodes database rows as compact JSON, the way the response models would render them.
+
+    Uses orjson when it is installed and the standard library otherwise.
+
+    Args:
+        rows (list or dict): Rows as dictionaries, with `datetime` values for timestamps. Model
+            instances are accepted too and encoded as their fields.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(rows, default=_orjson_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(rows, default=json_default, separators=(",", ":")).encode()
+
+
+def packb(rows):
+    """
+    Encodes database rows as MessagePack, with timestamps as timestamp extension values.
+
+    Args:
+        rows (list or dict): Rows as dictionaries.
+
+    Returns:
+        bytes: The MessagePack document.
+    """
+    return msgpack.packb(rows, default=_msgpack_default)
+
+
+def to_columns(rows, fields=None):
+    """
+    Pivots task rows into one array per field.
+
+    Args:
+        rows (list): Task rows as dictionaries.
+        fields (Optional[Iterable[str]]): Projected fields; all task columns when empty.
+
+    Returns:
+        dict: Field name to list of values, in table column order.
+    """
+    if rows:
+        names = [column for column in queries.TASK_COLUMNS if column in rows[0]]
+    else:
+        names = [column for column in queries.TASK_COLUMNS if not fields or column == "id" or column in fields]
+    return {name: [row[name] for row in rows] for name in names}
+
+
+def as_row(task):
+    """
+    Returns a task as a plain dictionary, whether it is a database row or a model instance.
+
+    Args:
+        task (dict or models.Task): The task.
+
+    Returns:
+        dict: Column name to value.
+    """
+    return task if isinstance(task, dict) else dict(task)
+
+
+def encode(rows, media_type, fields=None):
+    """
+    Renders task rows in a negotiated media type.
+
+    Args:
+        rows (list or dict): Task rows, or a single task row.
+        media_type (str): One of `MEDIA_TYPES`; the columnar types require a list.
+        fields (Optional[Iterable[str]]): Projected fields, used for an empty columnar page.
+
+    Returns:
+        bytes: The response body.
+    """
+    if media_type in (COLUMNS_JSON, COLUMNS_MSGPACK):
+        rows = to_columns(rows, fields)
+    if media_type in (MSGPACK, COLUMNS_MSGPACK):
+        return packb(rows)
+    return dumps(rows)
+
+
+class RowsResponse(Response):
+    """
+    A response built straight from database rows, bypassing `response_model` validation.
+
+    The body is encoded according to `media_type`, JSON by default.
+    """
+    media_type = JSON
+
+    def __init__(self, content, status_code=200, headers=None, media_type=None, fields=None):
+        self.fields = fields
+        super().__init__(content, status_code=status_code, headers=headers, media_type=media_type)
+
+    def render(self, content):
+        with metrics.ENCODE_SECONDS.time(self.media_type):
+            return encode(content, self.media_type, self.fields)
@@ -0,0 +1,258 @@
+"""
+Production entry point: preforked uvicorn workers sharing one listening socket.
+
+    python -m src.serve --workers 4 --host 0.0.0.0 --port 8000
+
+The parent imports the application and loads what every request needs (`preload`), then forks
+the workers, so that those pages are shared copy-on-write instead of being loaded once per
+worker. The garbage collector is frozen before the fork; otherwise its first pass in a worker
+would write to every preloaded object and unshare their pages. Database connections cannot
+survive a fork, so each worker opens its own pools during its startup warm-up, and only then
+does its `GET /ready` answer 200.
+
+uvicorn's own `--workers` starts every worker as a fresh interpreter that imports everything
+again; use this module instead. The parent replaces workers that die, and on SIGTERM or SIGINT
+stops them all, giving each up to `graceful_timeout` seconds to finish its requests.
+
+What a worker keeps in memory is its own: with several workers, idempotency keys default to the
+Postgres store (see `configure`), while `/metrics` and read-your-writes stickiness stay per worker.
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+SERVE_CONFIG = {
+    "workers": int(os.environ.get("TASK_WORKERS", os.cpu_count() or 1)),
+    "host": os.environ.get("TASK_HOST", "127.0.0.1"),
+    "port": int(os.environ.get("TASK_PORT", 8000)),
+    "backlog": int(os.environ.get("TASK_BACKLOG", 2048)),
+    # Import the application in the parent, before forking. Off, every worker imports it itself.
+    "preload": os.environ.get("TASK_PRELOAD", "on") != "off",
+    "graceful_timeout": float(os.environ.get("TASK_GRACEFUL_TIMEOUT", 30.0)),
+}
+
+# A worker that dies sooner than this after it was started is replaced only after a pause,
+# so a worker that cannot start does not fork in a tight loop.
+MIN_WORKER_LIFETIME = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def configure(workers, environ=os.environ):
+    """
+    Adjusts the settings whose defaults only hold within one process to `workers` processes.
+
+    A retried request may reach another worker than the original, so with several workers the
+    idempotency store defaults to Postgres, and the in-process one is refused. Runs before the
+    application is imported, which reads the setting.
+
+    Args:
+        workers (int): Worker processes to be started.
+        environ (MutableMapping[str, str]): The environment the application reads its settings from.
+
+    Raises:
+        ValueError: If `TASK_IDEMPOTENCY_BACKEND=memory` was asked for with several workers.
+    """
+    if workers > 1 and environ.setdefault("TASK_IDEMPOTENCY_BACKEND", "postgres") == "memory":
+        raise ValueError("TASK_IDEMPOTENCY_BACKEND=memory only dedupes retries within one worker; "
+                         "use postgres (the default with several workers) or none")
+
+
+def preload():
+    """
+    Imports the application and loads the JWT library, then freezes the garbage collector.
+
+    Returns:
+        fastapi.FastAPI: The application.
+    """
+    from . import auth
+    from .main import app
+
+    auth.warm_up()
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def bind(host, port, backlog=2048):
+    """
+    Opens the listening socket that every worker accepts connections on.
+
+    Args:
+        host (str): Address to listen on.
+        port (int): Port to listen on; 0 picks a free one.
+        backlog (int): Connections the kernel queues before the workers accept them.
+
+    Returns:
+        socket.socket: The bound, listening socket, inherited by the workers.
+    """
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock, app=None, graceful_timeout=30.0):
+    """
+    Serves the application on `sock` until told to stop; runs in a forked worker.
+
+    Args:
+        sock (socket.socket): The listening socket from `bind`.
+        app (Optional[fastapi.FastAPI]): The preloaded application; imported here when None.
+        graceful_timeout (float): Seconds to let requests in progress finish on shutdown.
+    """
+    import uvicorn
+
+    if app is None:
+        from .main import app
+    config = uvicorn.Config(app, lifespan="on", access_log=False, timeout_graceful_shutdown=graceful_timeout)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Arbiter:
+    """
+    Forks and supervises a fixed number of worker processes.
+
+    Attributes:
+        target (Callable): Run in each worker; the worker exits when it returns.
+        workers (int): Worker processes kept running.
+        graceful_timeout (float): Seconds workers get to exit after SIGTERM before they are killed.
+    """
+
+    def __init__(self, target, workers, graceful_timeout=30.0):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.target = target
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.pids = {}
+        self.restarts = 0
+        self._stopping = False
+
+    def spawn(self):
+        """
+        Forks one worker.
+
+        Returns:
+            int: Its process ID.
+        """
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                self.target()
+            except BaseException:
+                logger.exception("worker %d failed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.pids[pid] = time.monotonic()
+        return pid
+
+    def stop(self, *_):
+        """
+        Asks `run` to stop the workers and return; also the SIGTERM and SIGINT handler.
+        """
+        self._stopping = True
+
+    def run(self, poll_interval=0.1, install_signals=True):
+        """
+        Starts the workers and replaces any that exit, until `stop` is called.
+
+        Args:
+            poll_interval (float): Seconds between checks for exited workers.
+            install_signals (bool): Stop on SIGTERM and SIGINT.
+        """
+        if install_signals:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        while len(self.pids) < self.workers:
+            self.spawn()
+        while not self._stopping:
+            for pid in self._reap():
+                started = self.pids.pop(pid)
+                logger.warning("worker %d exited, starting another", pid)
+                self.restarts += 1
+                if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                    time.sleep(MIN_WORKER_LIFETIME)
+                if not self._stopping:
+                    self.spawn()
+            time.sleep(poll_interval)
+        self._terminate()
+
+    def _reap(self):
+        exited = []
+        while self.pids:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self.pids:
+                exited.append(pid)
+        return exited
+
+    def _terminate(self):
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.pids and time.monotonic() < deadline:
+            for pid in self._reap():
+                self.pids.pop(pid)
+            time.sleep(0.05)
+        for pid in list(self.pids):
+            logger.warning("worker %d did not stop in time, killing it", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self.pids.pop(pid)
+
+
+def main():
+    """
+    Command line entry point.
+
+        python -m src.serve [--workers N] [--host H] [--port P] [--no-preload]
+    """
+    parser = argparse.ArgumentParser(description="Serve the application with preforked workers.")
+    parser.add_argument("--workers", type=int, default=SERVE_CONFIG["workers"], help="worker processes")
+    parser.add_argument("--host", default=SERVE_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=SERVE_CONFIG["port"])
+    parser.add_argument("--backlog", type=int, default=SERVE_CONFIG["backlog"])
+    parser.add_argument("--no-preload", dest="preload", action="store_false", default=SERVE_CONFIG["preload"],
+                        help="import the application in every worker instead of once before forking")
+    args = parser.parse_args()
+    try:
+        configure(args.workers)
+    except ValueError as error:
+        parser.error(str(error))
+    logging.basicConfig(level=logging.INFO)
+
+    app = preload() if args.preload else None
+    sock = bind(args.host, args.port, args.backlog)
+    logger.info("listening on %s:%d with %d workers", args.host, sock.getsockname()[1], args.workers)
+    arbiter = Arbiter(lambda: run_worker(sock, app, SERVE_CONFIG["graceful_timeout"]), args.workers,
+                      SERVE_CONFIG["graceful_timeout"])
+    try:
+        arbiter.run()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import psycopg2.extensions
+import psycopg2.extras
+
+SLOW_QUERY_CONFIG = {
+    "threshold": float(os.environ.get("TASK_SLOW_QUERY_MS", 200.0)) / 1000,
+    # Fraction of slow statements whose plan is captured with EXPLAIN (ANALYZE, BUFFERS).
+    # That runs the statement a second time, inside a savepoint that is rolled back.
+    "explain_sample": float(os.environ.get("TASK_SLOW_QUERY_EXPLAIN_SAMPLE", 0.1)),
+    "keep": int(os.environ.get("TASK_SLOW_QUERY_KEEP", 100)),
+}
+
+# Only single statements of these kinds are explained; EXPLAIN rejects the rest.
+EXPLAINABLE = ("select", "with", "insert", "update", "delete", "values")
+
+EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+logger = logging.getLogger(__name__)
+
+
+def shape(sql):
+    """
+    Collapses a statement's whitespace so that every run of it logs the same text.
+
+    Args:
+        sql (str or bytes): The statement, with placeholders rather than values.
+
+    Returns:
+        str: The statement on one line.
+    """
+    if isinstance(sql, bytes):
+        sql = sql.decode()
+    return " ".join(str(sql).split())
+
+
+def redact(params):
+    """
+    Replaces parameter values with their types, so logs never hold task names or credentials.
+
+    Args:
+        params (Optional[Sequence or Mapping]): The statement's parameters.
+
+    Returns:
+        list or dict or None: The parameters' types, with the length of lists.
+    """
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _redact_value(value) for key, value in params.items()}
+    return [_redact_value(value) for value in params]
+
+
+def _redact_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return f"<{type(value).__name__}[{len(value)}]>"
+    return f"<{type(value).__name__}>"
+
+
+def explainable(sql):
+    """
+    Reports whether EXPLAIN can be run on a statement.
+
+    Args:
+        sql (str): The statement.
+
+    Returns:
+        bool: True for a single SELECT, WITH, INSERT, UPDATE, DELETE or VALUES statement.
+    """
+    text = shape(sql).rstrip(";").strip()
+    return text.split(" ", 1)[0].lower() in EXPLAINABLE and ";" not in text
+
+
+class SlowQueryLog:
+    """
+    Logs statements slower than `threshold` and keeps the most recent ones.
+
+    Attributes:
+        threshold (float): Seconds from which a statement counts as slow.
+        explain_sample (float): Fraction of slow statements whose plan is captured.
+        keep (int): Slow statements kept for `GET /admin/slow-queries`.
+    """
+
+    def __init__(self, threshold=0.2, explain_sample=0.1, keep=100):
+        self.threshold = threshold
+        self.explain_sample = explain_sample
+        self._recent = deque(maxlen=keep)
+        self._captured = 0
+        self._explained = 0
+        self._lock = threading.Lock()
+
+    def is_slow(self, elapsed):
+        return elapsed >= self.threshold
+
+    def should_explain(self, sql):
+        """
+        Decides whether to capture the plan of a slow statement.
+
+        Args:
+            sql (str): The statement.
+
+        Returns:
+            bool: True for a sampled, explainable statement.
+        """
+        return self.explain_sample > 0 and random.random() < self.explain_sample and explainable(sql)
+
+    def record(self, sql, params, elapsed, rows, plan=None):
+        """
+        Logs a slow statement and adds it to the recent ones.
+
+        Args:
+            sql (str): The statement.
+            params: Its parameters; only their types are kept.
+            elapsed (float): Seconds it took.
+            rows (int): Rows it returned or affected, -1 if unknown.
+            plan (Optional[str]): Its `EXPLAIN (ANALYZE, BUFFERS)` output, if captured.
+        """
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "sql": shape(sql),
+            "params": redact(params),
+            "duration_ms": round(elapsed * 1000, 3),
+            "rows": rows,
+            "plan": plan,
+        }
+        with self._lock:
+            self._recent.append(entry)
+            self._captured += 1
+            self._explained += plan is not None
+        logger.warning("slow query: %.1f ms, %s rows: %s params=%s", entry["duration_ms"], rows,
+                       entry["sql"], entry["params"])
+
+    def recent(self):
+        """
+        Lists the slow statements kept, newest first.
+
+        Returns:
+            list: Entries with `at`, `sql`, redacted `params`, `duration_ms`, `rows` and `plan`.
+        """
+        with self._lock:
+            return list(reversed(self._recent))
+
+    def stats(self):
+        """
+        Reports the capture settings and counts.
+
+        Returns:
+            dict: Threshold, sample rate, slow statements seen and plans captured since start.
+        """
+        return {"threshold_ms": self.threshold * 1000, "explain_sample": self.explain_sample,
+                "captured": self._captured, "explained": self._explained, "kept": self._recent.maxlen}
+
+
+slow_log = SlowQueryLog(SLOW_QUERY_CONFIG["threshold"], SLOW_QUERY_CONFIG["explain_sample"],
+                        SLOW_QUERY_CONFIG["keep"])
+
+
+def explain(conn, sql, params):
+    """
+    Captures the plan of a statement by running it again under EXPLAIN (ANALYZE, BUFFERS).
+
+    The statement runs inside a savepoint that is always rolled back, so writes are undone
+    and the rest of the transaction is unaffected. Connections outside a transaction
+    (autocommit, or a failed transaction) are not explained.
+
+    Args:
+        conn (psycopg2.extensions.connection): The connection the statement ran on.
+        sql (str): The statement.
+        params: Its parameters.
+
+    Returns:
+        str or None: The plan, or None if it could not be captured.
+    """
+    if conn.autocommit or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+        return None
+    # A plain cursor, so that the EXPLAIN is not itself timed and explained.
+    with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+        cur.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT};")
+        try:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql.strip(), params)
+            return "\n".join(row[0] for row in cur.fetchall())
+        except psycopg2.Error:
+            return None
+        finally:
+            cur.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT};")
+            cur.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT};")
+
+
+class SlowQueryCursor(psycopg2.extras.RealDictCursor):
+    """
+    A RealDictCursor that reports statements slower than the threshold to `slow_log`.
+    """
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        result = super().execute(query, vars)
+        elapsed = time.perf_counter() - started
+        if slow_log.is_slow(elapsed):
+            plan = explain(self.connection, query, vars) if slow_log.should_explain(query) else None
+            slow_log.record(query, vars, elapsed, self.rowcount, plan)
+        return result
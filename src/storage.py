@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import os
+import sys
+from contextlib import asynccontextmanager, contextmanager
+
+from starlette.concurrency import run_in_threadpool
+
+from . import db, metrics, queries, routing
+
+# "sync" runs psycopg2 queries on the threadpool; "async" runs psycopg 3 queries on the event loop.
+DB_BACKEND = os.environ.get("TASK_DB_BACKEND", "sync")
+
+if DB_BACKEND == "async":
+    from . import async_db, async_queries
+    get_cursor = async_db.get_cursor
+elif DB_BACKEND == "sync":
+    get_cursor = db.get_cursor
+else:
+    raise ValueError(f"TASK_DB_BACKEND must be 'sync' or 'async', not {DB_BACKEND!r}")
+
+
+def is_async():
+    """
+    Reports whether the async psycopg 3 backend is selected.
+
+    Returns:
+        bool: True when `DB_BACKEND` is "async".
+    """
+    return DB_BACKEND == "async"
+
+
+logger = logging.getLogger(__name__)
+
+sticky_clients = routing.StickyClients(db.ROUTING_CONFIG["read_your_writes"])
+lag_guard = routing.LagGuard(db.ROUTING_CONFIG["max_replica_lag"], db.ROUTING_CONFIG["lag_check_interval"])
+
+
+@asynccontextmanager
+async def cursor(role="primary", timeout=None):
+    """
+    Checks a cursor out of the configured backend's pool for the duration of a block.
+
+    Use this instead of the `get_cursor` dependency when a handler only needs the database
+    on some paths, e.g. on a cache miss.
+
+    Args:
+        role (str): "primary", or "replica" as chosen by `read_role`.
+        timeout (Optional[float]): Seconds to wait for a connection; the pool's acquire timeout when None.
+
+    Yields:
+        A cursor, as `get_cursor` would provide it.
+    """
+    if is_async():
+        async with asynccontextmanager(async_db.cursor_for)(role, timeout) as cur:
+            yield cur
+        return
+    manager = contextmanager(db.cursor_for)(role, timeout)
+    cur = await run_in_threadpool(manager.__enter__)
+    try:
+        yield cur
+    except BaseException:
+        if not await run_in_threadpool(manager.__exit__, *sys.exc_info()):
+            raise
+    else:
+        await run_in_threadpool(manager.__exit__, None, None, None)
+
+
+async def _measure_replica_lag():
+    try:
+        async with cursor("replica") as cur:
+            return await call("get_replica_lag", cur)
+    except Exception:
+        return None
+
+
+async def read_role():
+    """
+    Picks the server a read of the current request should go to.
+
+    Reads use the replica, if one is configured, unless the client wrote within the
+    read-your-writes window or the replica lags (or cannot be reached).
+
+    Returns:
+        str: "replica" or "primary".
+    """
+    if not db.has_replica() or sticky_clients.is_sticky():
+        return "primary"
+    return "replica" if await lag_guard.replica_usable(_measure_replica_lag) else "primary"
+
+
+async def get_read_cursor():
+    """
+    FastAPI dependency for read-only routes: a cursor on the server chosen by `read_role`.
+
+    Yields:
+        A cursor, as `get_cursor` would provide it.
+    """
+    async with cursor(await read_role()) as cur:
+        yield cur
+
+
+async def call(name, cursor, *args, **kwargs):
+    """
+    Runs the query function `name` on the configured backend.
+
+    The function is looked up at call time in `async_queries` (awaited on the event loop)
+    or in `queries` (run on the threadpool), so both modules must define it. Its duration,
+    row count and failures are recorded under `name` in `metrics`.
+
+    Args:
+        name (str): Name of the query function, e.g. "get_task_by_id".
+        cursor: A cursor obtained from `get_cursor`.
+        *args: Remaining positional arguments of the query function.
+        **kwargs: Keyword arguments of the query function.
+
+    Returns:
+        The query function's return value.
+    """
+    if is_async():
+        return await metrics.timed_async_query(name, getattr(async_queries, name), cursor, *args, **kwargs)
+    # Timed on the worker thread, so time spent waiting for a thread is not counted.
+    return await run_in_threadpool(metrics.timed_query, name, getattr(queries, name), cursor, *args, **kwargs)
+
+
+async def commit(cursor):
+    """
+    Commits the transaction of the connection that `cursor` belongs to.
+
+    The client of the current request then reads from the primary for a while, so it sees
+    its own write even if the replica has not replayed it yet.
+
+    Args:
+        cursor: A cursor obtained from `get_cursor`.
+    """
+    if is_async():
+        await cursor.connection.commit()
+    else:
+        await run_in_threadpool(cursor.connection.commit)
+    sticky_clients.mark_write()
+
+
+async def pool_stats():
+    """
+    Reports usage of the configured backend's connection pools.
+
+    Returns:
+        dict: In-use, idle and waiting connection counts plus checkout wait times. With a
+        replica configured, one such dict per server under "primary" and "replica", plus
+        the replica lag guard's state under "routing".
+    """
+    roles = ("primary", "replica") if db.has_replica() else ("primary",)
+    if is_async():
+        stats = {role: await async_db.pool_stats(role) for role in roles}
+    else:
+        stats = {role: await run_in_threadpool(lambda role=role: db.get_pool(role).stats()) for role in roles}
+    if not db.has_replica():
+        return stats["primary"]
+    return {**stats, "routing": lag_guard.stats()}
+
+
+async def ping(role="primary", timeout=2.0):
+    """
+    Checks that a server answers, through the configured backend's pool.
+
+    The timeout bounds the pool checkout and, as a `statement_timeout`, the statement itself, so
+    that on the sync backend the threadpool worker gives up too rather than only the caller.
+
+    Args:
+        role (str): "primary" or "replica".
+        timeout (float): Seconds to wait for a connection and the answer.
+
+    Returns:
+        bool: True if a statement ran in time.
+    """
+    async def run():
+        async with cursor(role, timeout) as cur:
+            await call("set_statement_timeout", cur, timeout)
+            await call("get_replica_lag", cur)
+
+    try:
+        await asyncio.wait_for(run(), timeout)
+        return True
+    except Exception:
+        return False
+
+
+async def warm_up(timeout=5.0):
+    """
+    Opens the configured backend's pools and runs a statement on each, so the first requests find
+    connections ready. A server that is not reachable yet is logged, not raised: `ping` reports it.
+
+    Args:
+        timeout (float): Seconds to wait for each server.
+
+    Returns:
+        bool: True if every server answered.
+    """
+    roles = ("primary", "replica") if db.has_replica() else ("primary",)
+    ready = True
+    for role in roles:
+        if not await ping(role, timeout):
+            logger.warning("warm-up: the %s database did not answer within %.1fs", role, timeout)
+            ready = False
+    return ready
+
+
+async def close():
+    """
+    Closes the connection pools opened by this process.
+    """
+    if is_async():
+        await async_db.close_pool()
+    db.close_pool()
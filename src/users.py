@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import base64
+import getpass
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import cache, storage
+
+# scrypt cost parameters for new hashes; existing hashes keep the parameters they were made with.
+SCRYPT_PARAMS = {
+    "n": int(os.environ.get("PASSWORD_SCRYPT_N", 2 ** 14)),
+    "r": 8,
+    "p": 1,
+}
+
+HASHER_CONFIG = {
+    # Threads hashing passwords in parallel; hashlib releases the GIL while it works.
+    "workers": int(os.environ.get("PASSWORD_HASH_WORKERS", 4)),
+    # Verifications allowed to wait for a worker before logins are turned away.
+    "max_pending": int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 64)),
+}
+
+USER_CACHE_CONFIG = {
+    "max_size": int(os.environ.get("USER_CACHE_SIZE", 1024)),
+    "ttl": float(os.environ.get("USER_CACHE_TTL", 60.0)),
+    "negative_ttl": float(os.environ.get("USER_CACHE_NEGATIVE_TTL", 10.0)),
+}
+
+
+class HasherBusy(Exception):
+    """
+    Raised when too many password verifications are already queued.
+    """
+
+
+def hash_password(password, salt=None):
+    """
+    Hashes a password with scrypt.
+
+    Args:
+        password (str): The plaintext password.
+        salt (Optional[bytes]): A salt; a random 16-byte salt is generated when omitted.
+
+    Returns:
+        str: `scrypt$n$r$p$salt$hash`, with salt and hash base64-encoded.
+    """
+    salt = salt or secrets.token_bytes(16)
+    n, r, p = SCRYPT_PARAMS["n"], SCRYPT_PARAMS["r"], SCRYPT_PARAMS["p"]
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32)
+    return "$".join(["scrypt", str(n), str(r), str(p),
+                     base64.b64encode(salt).decode(), base64.b64encode(digest).decode()])
+
+
+def verify_password(password, encoded):
+    """
+    Checks a password against a hash produced by `hash_password`, in constant time.
+
+    Args:
+        password (str): The plaintext password.
+        encoded (str): The stored hash.
+
+    Returns:
+        bool: True if the password matches.
+    """
+    try:
+        scheme, n, r, p, salt, expected = encoded.split("$")
+    except ValueError:
+        return False
+    if scheme != "scrypt":
+        return False
+    expected = base64.b64decode(expected)
+    digest = hashlib.scrypt(password.encode(), salt=base64.b64decode(salt),
+                            n=int(n), r=int(r), p=int(p), dklen=len(expected))
+    return hmac.compare_digest(digest, expected)
+
+
+class PasswordHasher:
+    """
+    Runs password hashing on a bounded thread pool so it never blocks the event loop.
+
+    Attributes:
+        max_pending (int): Verifications allowed in flight (running or queued) at once.
+    """
+
+    def __init__(self, workers=4, max_pending=64):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+
+    async def run(self, func, *args):
+        """
+        Runs a hashing function on the pool.
+
+        Args:
+            func (Callable): `hash_password` or `verify_password`.
+            *args: Its arguments.
+
+        Returns:
+            The function's result.
+
+        Raises:
+            HasherBusy: If `max_pending` calls are already in flight.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise HasherBusy("too many password verifications in flight")
+            self._pending += 1
+        try:
+            return await asyncio.wrap_future(self._executor.submit(func, *args))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        """
+        Reports hashing load.
+
+        Returns:
+            dict: Calls in flight and calls rejected so far.
+        """
+        with self._lock:
+            return {"pending": self._pending, "max_pending": self.max_pending, "rejected": self._rejected}
+
+
+hasher = PasswordHasher(HASHER_CONFIG["workers"], HASHER_CONFIG["max_pending"])
+
+user_cache = cache.LRUCache(USER_CACHE_CONFIG["max_size"], USER_CACHE_CONFIG["ttl"],
+                            USER_CACHE_CONFIG["negative_ttl"])
+
+_dummy_hash = None
+
+
+async def get_user(username):
+    """
+    Looks a user record up, from `user_cache` when possible.
+
+    Args:
+        username (str): The user to look up.
+
+    Returns:
+        dict or None: `username`, `password_hash` and `role`, or None if the user does not exist.
+    """
+    record = user_cache.get(username)
+    if record is cache.MISS:
+        token = user_cache.token()
+        async with storage.cursor() as cur:
+            record = await storage.call("get_user_by_username", cur, username)
+        user_cache.fill(username, record, token)
+    return record
+
+
+async def authenticate(username, password):
+    """
+    Verifies a username and password against the user store.
+
+    Unknown users are checked against a dummy hash so that response times do not reveal
+    which usernames exist.
+
+    Args:
+        username (str): The username.
+        password (str): The plaintext password.
+
+    Returns:
+        dict or None: The user record if the credentials are valid, otherwise None.
+
+    Raises:
+        HasherBusy: If the hashing pool is saturated.
+    """
+    global _dummy_hash
+    record = await get_user(username)
+    if record is None:
+        if _dummy_hash is None:
+            _dummy_hash = await hasher.run(hash_password, secrets.token_urlsafe(16))
+        await hasher.run(verify_password, password, _dummy_hash)
+        return None
+    if not await hasher.run(verify_password, password, record["password_hash"]):
+        return None
+    return record
+
+
+def main():
+    """
+    Command line entry point that creates users or resets their password and role.
+
+        python -m src.users create-user admin --role admin
+
+    The `users` table is created by `python -m src.schema migrate`, which must run first.
+    """
+    from . import db, queries
+
+    parser = argparse.ArgumentParser(description="Manage API users.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create-user", help="create a user or reset their password and role")
+    create.add_argument("username")
+    create.add_argument("--role", choices=("admin", "readonly"), default="readonly")
+    args = parser.parse_args()
+
+    password = getpass.getpass(f"Password for {args.username}: ")
+    conn = db.get_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            queries.upsert_user(cur, args.username, hash_password(password), args.role)
+    finally:
+        conn.close()
+    print(f"Saved {args.role} user {args.username}.")
+
+
+if __name__ == "__main__":
+    main()
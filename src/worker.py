@@ -0,0 +1,315 @@
+"""
+Background worker that executes queued tasks.
+
+A worker claims queued tasks in batches, runs each one through the handler registered for
+it on a thread or process pool, and records the outcome. Claims use `FOR UPDATE SKIP LOCKED`,
+so any number of workers, on any number of machines, can share one database without
+waiting on each other. A claimed task is leased to its worker for `lease_seconds` and the
+lease is renewed while the task runs; if the worker dies the lease expires and another
+worker's reaper puts the task back in the queue, or fails it with a "lease expired" result
+once it has used up its attempts.
+
+    python -m src.worker --concurrency 8 --executor process --handlers myapp.handlers
+"""
+
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent import futures
+
+import psycopg2
+
+from . import db, queries
+
+WORKER_CONFIG = {
+    # Tasks run at once by one worker; one per core suits CPU-bound handlers on processes.
+    "concurrency": int(os.environ.get("TASK_WORKER_CONCURRENCY", os.cpu_count() or 4)),
+    # "thread" for handlers that mostly wait on I/O, "process" for CPU-bound ones.
+    "executor": os.environ.get("TASK_WORKER_EXECUTOR", "thread"),
+    "batch_size": int(os.environ.get("TASK_WORKER_BATCH_SIZE", 16)),
+    "lease_seconds": float(os.environ.get("TASK_WORKER_LEASE_SECONDS", 30.0)),
+    "heartbeat_interval": float(os.environ.get("TASK_WORKER_HEARTBEAT_SECONDS", 10.0)),
+    "poll_interval": float(os.environ.get("TASK_WORKER_POLL_SECONDS", 1.0)),
+    "max_attempts": int(os.environ.get("TASK_WORKER_MAX_ATTEMPTS", 3)),
+}
+
+EXECUTORS = ("thread", "process")
+
+# Task kind to handler. A task named "kind: argument" is run as `HANDLERS[kind](argument)`.
+HANDLERS = {}
+
+
+def handler(kind):
+    """
+    Registers a function as the handler of a task kind.
+
+    Handlers must be module-level functions so that process pools can run them.
+
+    Args:
+        kind (str): The part of a task's name before the first ":".
+
+    Returns:
+        Callable: A decorator that registers and returns the function.
+    """
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+@handler("noop")
+def noop(argument):
+    return None
+
+
+@handler("echo")
+def echo(argument):
+    return argument
+
+
+@handler("sleep")
+def sleep(argument):
+    seconds = float(argument or 0)
+    time.sleep(seconds)
+    return {"slept": seconds}
+
+
+@handler("hash")
+def hash_rounds(argument):
+    digest = b""
+    for _ in range(int(argument or 1)):
+        digest = hashlib.sha256(digest).digest()
+    return digest.hex()
+
+
+def execute(name):
+    """
+    Runs the handler of a task.
+
+    Args:
+        name (str): The task's name.
+
+    Returns:
+        The handler's return value.
+
+    Raises:
+        LookupError: If no handler is registered for the task's kind.
+    """
+    kind, _, argument = name.partition(":")
+    func = HANDLERS.get(kind.strip())
+    if func is None:
+        raise LookupError(f"no handler for task kind {kind.strip()!r}")
+    return func(argument.strip())
+
+
+def load_handlers(modules):
+    """
+    Imports modules for the handlers they register. Also the initializer of process pools.
+
+    Args:
+        modules (Iterable[str]): Dotted module names.
+    """
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _outcome(task_id, future):
+    try:
+        result = future.result()
+    except Exception as exc:
+        return task_id, "failed", None, f"{type(exc).__name__}: {exc}"
+    return task_id, "done", json.dumps(result, default=str), None
+
+
+class Worker:
+    """
+    Claims, runs and records tasks until stopped.
+
+    All database work happens on the calling thread over one connection, each step in its
+    own short transaction; only handlers run on the pool. Claims are made whenever slots are
+    free, in batches of up to `batch_size`, and the outcomes of finished tasks are recorded
+    together in one statement.
+
+    Attributes:
+        worker_id (str): Lease owner recorded for claimed tasks.
+        concurrency (int): Most tasks running at once.
+        executor (str): "thread" or "process".
+        batch_size (int): Most tasks claimed per statement.
+        lease_seconds (float): Lease length, renewed every `heartbeat_interval`.
+        heartbeat_interval (float): Seconds between lease renewals and reaper runs.
+        poll_interval (float): Seconds to wait before polling an empty queue again.
+        max_attempts (int): Expired leases after which a task is failed instead of requeued.
+    """
+
+    def __init__(self, worker_id=None, concurrency=4, executor="thread", batch_size=16, lease_seconds=30.0,
+                 heartbeat_interval=10.0, poll_interval=1.0, max_attempts=3, handler_modules=(),
+                 connect=db.get_connection):
+        if executor not in EXECUTORS:
+            raise ValueError(f"executor must be one of {EXECUTORS}")
+        if heartbeat_interval >= lease_seconds:
+            raise ValueError("heartbeat_interval must be shorter than lease_seconds")
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.concurrency = concurrency
+        self.executor = executor
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.handler_modules = tuple(handler_modules)
+        self._connect = connect
+        self._conn = None
+        self._pool = None
+        self._running = {}
+        self._outcomes = []
+        self._stopping = threading.Event()
+        self._counts = {"claimed": 0, "done": 0, "failed": 0, "lost": 0, "reaped": 0, "db_errors": 0}
+
+    def stop(self):
+        """
+        Stops claiming; `run` returns once the running tasks are recorded.
+        """
+        self._stopping.set()
+
+    def run(self, exit_when_idle=False):
+        """
+        Processes tasks until `stop` is called.
+
+        Args:
+            exit_when_idle (bool): Also return once the queue is empty and nothing is running.
+
+        Returns:
+            dict: Final `stats`.
+        """
+        load_handlers(self.handler_modules)
+        if self.executor == "process":
+            self._pool = futures.ProcessPoolExecutor(self.concurrency, initializer=load_handlers,
+                                                     initargs=(self.handler_modules,))
+        else:
+            self._pool = futures.ThreadPoolExecutor(self.concurrency, thread_name_prefix="task-worker")
+        next_heartbeat = 0.0
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_heartbeat:
+                    self._db(self._heartbeat)
+                    next_heartbeat = now + self.heartbeat_interval
+                self._collect()
+                if self._outcomes:
+                    self._db(self._record)
+                # None when the claim failed, which does not mean the queue is empty.
+                claimed = None
+                if not self._stopping.is_set() and len(self._running) < self.concurrency:
+                    claimed = self._db(self._claim)
+                if not self._running and not self._outcomes:
+                    if self._stopping.is_set() or (exit_when_idle and claimed == 0):
+                        break
+                if claimed and len(self._running) < self.concurrency:
+                    continue
+                timeout = min(self.poll_interval, max(next_heartbeat - time.monotonic(), 0))
+                if self._running:
+                    futures.wait(self._running, timeout, return_when=futures.FIRST_COMPLETED)
+                else:
+                    self._stopping.wait(timeout)
+        finally:
+            self._pool.shutdown(wait=True)
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        return self.stats()
+
+    def _db(self, step):
+        # A failed step is retried on the next pass; outcomes stay queued until recorded.
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = self._connect()
+            with self._conn.cursor() as cur:
+                value = step(cur)
+            self._conn.commit()
+            return value
+        except (psycopg2.Error, OSError):
+            self._counts["db_errors"] += 1
+            if self._conn is not None and not self._conn.closed:
+                try:
+                    self._conn.rollback()
+                except psycopg2.Error:
+                    self._conn.close()
+            return None
+
+    def _claim(self, cur):
+        limit = min(self.batch_size, self.concurrency - len(self._running))
+        rows = queries.claim_tasks(cur, self.worker_id, limit, self.lease_seconds)
+        for row in rows:
+            self._running[self._pool.submit(execute, row["name"])] = row["id"]
+        self._counts["claimed"] += len(rows)
+        return len(rows)
+
+    def _heartbeat(self, cur):
+        reaped = queries.reap_expired_leases(cur, self.max_attempts)
+        self._counts["reaped"] += len(reaped)
+        if self._running:
+            # A task whose lease was lost keeps running; its outcome is discarded when recorded.
+            queries.renew_leases(cur, self.worker_id, self._running.values(), self.lease_seconds)
+
+    def _collect(self):
+        for future in [future for future in self._running if future.done()]:
+            self._outcomes.append(_outcome(self._running.pop(future), future))
+
+    def _record(self, cur):
+        recorded = queries.complete_tasks(cur, self.worker_id, self._outcomes)
+        for task_id, status, _, _ in self._outcomes:
+            if task_id in recorded:
+                self._counts[status] += 1
+            else:
+                self._counts["lost"] += 1
+        self._outcomes = []
+
+    def stats(self):
+        """
+        Reports what this worker has done so far.
+
+        Returns:
+            dict: Claimed, done, failed, lost and reaped task counts, failed database steps,
+            and tasks currently running.
+        """
+        return dict(self._counts, worker_id=self.worker_id, running=len(self._running))
+
+
+def main():
+    """
+    Command line entry point.
+
+        python -m src.worker [--concurrency N] [--executor thread|process] [--handlers MODULE ...]
+    """
+    parser = argparse.ArgumentParser(description="Execute queued tasks.")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONFIG["concurrency"],
+                        help="tasks run at once")
+    parser.add_argument("--executor", choices=EXECUTORS, default=WORKER_CONFIG["executor"],
+                        help="run handlers on threads or processes")
+    parser.add_argument("--batch-size", type=int, default=WORKER_CONFIG["batch_size"],
+                        help="most tasks claimed per statement")
+    parser.add_argument("--handlers", nargs="*", default=(),
+                        help="modules to import for the handlers they register")
+    parser.add_argument("--exit-when-idle", action="store_true",
+                        help="stop once the queue is empty instead of polling")
+    args = parser.parse_args()
+
+    worker = Worker(concurrency=args.concurrency, executor=args.executor, batch_size=args.batch_size,
+                    lease_seconds=WORKER_CONFIG["lease_seconds"],
+                    heartbeat_interval=WORKER_CONFIG["heartbeat_interval"],
+                    poll_interval=WORKER_CONFIG["poll_interval"], max_attempts=WORKER_CONFIG["max_attempts"],
+                    handler_modules=args.handlers)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop())
+    print(json.dumps(worker.run(exit_when_idle=args.exit_when_idle)))
+
+
+if __name__ == "__main__":
+    main()
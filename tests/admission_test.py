@@ -0,0 +1,136 @@
+import asyncio
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+from src import auth
+from src.admission import AdmissionMiddleware, Limiter, UserRateLimiter
+
+
+def http_scope(method="GET", path="/tasks"):
+    return {"type": "http", "method": method, "path": path, "headers": []}
+
+
+async def call(middleware, scope):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, receive, send)
+    start = messages[0]
+    return start["status"], dict(start["headers"])
+
+
+class LimiterTestCase(unittest.TestCase):
+
+    def test_waiters_get_freed_slots_in_order(self):
+        """
+        Requests beyond the limit wait, and each released slot goes to the oldest waiter.
+        """
+        limiter = Limiter("read", limit=1, max_queue=2, queue_timeout=1.0)
+
+        async def run():
+            self.assertIsNone(await limiter.acquire())
+            order = []
+
+            async def wait(label):
+                await limiter.acquire()
+                order.append(label)
+
+            waiters = [asyncio.ensure_future(wait("first")), asyncio.ensure_future(wait("second"))]
+            await asyncio.sleep(0)
+            self.assertEqual(limiter.stats()["queued"], 2)
+            limiter.release()
+            await asyncio.sleep(0)
+            limiter.release()
+            await asyncio.gather(*waiters)
+            limiter.release()
+            return order
+
+        self.assertEqual(asyncio.run(run()), ["first", "second"])
+        self.assertEqual(limiter.inflight, 0)
+
+    def test_sheds_when_queue_is_full_or_wait_runs_out(self):
+        """
+        A full queue rejects at once; a queued request gives up after the timeout.
+        """
+        limiter = Limiter("write", limit=1, max_queue=1, queue_timeout=0.01)
+
+        async def run():
+            await limiter.acquire()
+            queued = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            return await limiter.acquire(), await queued
+
+        self.assertEqual(asyncio.run(run()), ("queue_full", "timeout"))
+        self.assertEqual(limiter.stats()["rejected"], {"queue_full": 1, "timeout": 1})
+        self.assertEqual(limiter.stats()["queued"], 0)
+
+
+class AdmissionMiddlewareTestCase(unittest.TestCase):
+
+    def test_excess_requests_get_503_with_retry_after(self):
+        """
+        While every slot is busy and nothing may queue, requests are shed quickly; exempt paths are not.
+        """
+        async def run():
+            gate = asyncio.Event()
+
+            async def app(scope, receive, send):
+                if scope["path"] == "/tasks/slow":
+                    await gate.wait()
+                await send({"type": "http.response.start", "status": 200, "headers": []})
+                await send({"type": "http.response.body", "body": b""})
+
+            limiters = {"read": Limiter("read", 1, max_queue=0), "write": Limiter("write", 1, max_queue=0)}
+            middleware = AdmissionMiddleware(app, limiters=limiters, retry_after=3)
+            busy = asyncio.ensure_future(call(middleware, http_scope(path="/tasks/slow")))
+            await asyncio.sleep(0)
+            shed = await call(middleware, http_scope(path="/tasks/1"))
+            write = await call(middleware, http_scope("POST", "/tasks"))
+            exempt = await call(middleware, http_scope(path="/admin/pool"))
+            gate.set()
+            await busy
+            return shed, write, exempt, limiters["read"].inflight
+
+        shed, write, exempt, inflight = asyncio.run(run())
+        self.assertEqual(shed[0], 503)
+        self.assertEqual(shed[1][b"retry-after"], b"3")
+        self.assertEqual(write[0], 200)
+        self.assertEqual(exempt[0], 200)
+        self.assertEqual(inflight, 0)
+
+
+class UserRateLimiterTestCase(unittest.TestCase):
+
+    def test_burst_then_limited_per_user(self):
+        """
+        A user may burst up to the bucket size, then waits; other users are unaffected.
+        """
+        limiter = UserRateLimiter(rate=10, burst=2)
+        self.assertEqual([limiter.take("a") for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(limiter.take("a"), 0.1, places=2)
+        self.assertEqual(limiter.take("b"), 0.0)
+        self.assertEqual(UserRateLimiter(rate=0).take("a"), 0.0)
+
+    def test_get_current_user_enforces_the_limit(self):
+        """
+        Authentication answers 429 with `Retry-After` once the user is over their limit.
+        """
+        token = auth.create_access_token({"sub": "alice", "role": "readonly"}, timedelta(minutes=5))
+        with patch("src.admission.user_limits", new=UserRateLimiter(rate=0.5, burst=1)):
+            asyncio.run(auth.get_current_user(token))
+            with self.assertRaises(HTTPException) as raised:
+                asyncio.run(auth.get_current_user(token))
+        self.assertEqual(raised.exception.status_code, 429)
+        self.assertEqual(raised.exception.headers["Retry-After"], "2")
+
+
+if __name__ == '__main__':
+    unittest.main()
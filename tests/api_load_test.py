@@ -0,0 +1,52 @@
+import unittest
+
+from benchmarks import api_load
+
+
+def result(**endpoints):
+    return {"meta": {}, "endpoints": endpoints}
+
+
+def entry(throughput=100.0, p95=10.0, p99=20.0, errors=0, requests=1000):
+    return {"throughput": throughput, "p95_ms": p95, "p99_ms": p99, "errors": errors, "requests": requests}
+
+
+class SummarizeTestCase(unittest.TestCase):
+
+    def test_nearest_rank_percentiles(self):
+        """
+        Percentiles use the nearest rank, and throughput is requests over elapsed time.
+        """
+        summary = api_load.summarize([i / 1000 for i in range(100, 0, -1)], errors=2, elapsed=2.0)
+        self.assertEqual((summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]), (50.0, 95.0, 99.0))
+        self.assertEqual((summary["requests"], summary["errors"], summary["throughput"]), (100, 2, 50.0))
+        self.assertEqual(api_load.summarize([], 0, 1.0)["p99_ms"], 0.0)
+
+
+class CompareTestCase(unittest.TestCase):
+
+    def test_flags_changes_beyond_tolerance(self):
+        """
+        Lower throughput, higher tail latency and more errors are regressions; noise is not.
+        """
+        baseline = result(**{"GET /tasks": entry(), "POST /tasks": entry(p95=0.2, p99=0.4),
+                             "GET /tasks/stats": entry()})
+        current = result(**{"GET /tasks": entry(throughput=80.0, p99=30.0),
+                            "POST /tasks": entry(p95=0.5, p99=0.9),
+                            "GET /tasks/stats": entry(throughput=95.0, errors=10)})
+        regressions = api_load.compare(baseline, current, tolerance=0.1)
+        self.assertEqual(regressions, [
+            ("GET /tasks", "throughput", 100.0, 80.0),
+            ("GET /tasks", "p99_ms", 20.0, 30.0),
+            ("GET /tasks/stats", "error_rate", 0.0, 0.01),
+        ])
+
+    def test_routes_missing_from_either_run_are_skipped(self):
+        """
+        Only routes measured in both runs are compared.
+        """
+        self.assertEqual(api_load.compare(result(**{"GET /tasks": entry()}), result()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from src import archive, queries
+
+
+class FakeCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        if sql is queries.ARCHIVE_PARTITIONS_SQL:
+            self._rows = [{"name": name} for name in self.conn.partitions]
+        elif sql is queries.ARCHIVE_CANDIDATES_SQL:
+            batch = self.conn.due[:params["limit"]]
+            self._rows = [{"id": task_id, "month": month} for task_id, month in batch]
+        elif sql is queries.ARCHIVE_TASKS_SQL:
+            if self.conn.fail:
+                raise RuntimeError("connection lost")
+            self.rowcount = len(params["ids"])
+            self.conn.pending = params["ids"]
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConnection:
+
+    def __init__(self, due=(), partitions=(), fail=False):
+        self.due = list(due)
+        self.partitions = set(partitions)
+        self.fail = fail
+        self.pending = []
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.due = [item for item in self.due if item[0] not in self.pending]
+        self.pending = []
+        self.commits += 1
+
+    def rollback(self):
+        self.pending = []
+        self.rollbacks += 1
+
+
+class PartitionTestCase(unittest.TestCase):
+
+    def test_monthly_bounds_roll_over_the_year(self):
+        """
+        Each partition covers one calendar month in UTC.
+        """
+        self.assertEqual(archive.partition_name(datetime(2024, 12, 5)), "tasks_archive_2024_12")
+        self.assertEqual(archive.create_partition_sql(datetime(2024, 12, 1)),
+                         "CREATE TABLE IF NOT EXISTS tasks_archive_2024_12 PARTITION OF tasks_archive "
+                         "FOR VALUES FROM ('2024-12-01+00') TO ('2025-01-01+00');")
+
+
+class ArchiveTestCase(unittest.TestCase):
+
+    def test_moves_batches_until_nothing_is_due(self):
+        """
+        Every batch commits on its own and only creates the partitions that are missing.
+        """
+        jan, feb = datetime(2024, 1, 1), datetime(2024, 2, 1)
+        conn = FakeConnection(due=[(1, jan), (2, jan), (3, feb)], partitions={"tasks_archive_2024_01"})
+        with patch("time.sleep"):
+            stats = archive.archive(conn, batch_size=2, pause=0)
+        self.assertEqual(stats, {"moved": 3, "batches": 2})
+        self.assertEqual(conn.commits, 2)
+        created = [sql for sql in conn.statements if sql.startswith("CREATE TABLE")]
+        self.assertEqual(created, [archive.create_partition_sql(feb)])
+        self.assertEqual(conn.statements.count("SET LOCAL tasks.archiving = 'on';"), 2)
+
+    def test_failed_batch_is_rolled_back(self):
+        """
+        A batch that fails leaves its tasks in place for the next run.
+        """
+        conn = FakeConnection(due=[(1, datetime(2024, 1, 1))], fail=True)
+        with self.assertRaises(RuntimeError):
+            archive.archive(conn)
+        self.assertEqual((conn.commits, conn.rollbacks), (0, 1))
+        self.assertEqual(len(conn.due), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import asyncio
+import time
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+from src import auth
+from src.models import User
+
+
+class TokenCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        auth.token_cache.clear()
+        self.token = auth.create_access_token({"sub": "admin", "role": "admin"}, timedelta(minutes=5))
+
+    def tearDown(self):
+        auth.revocation_check = None
+        auth.token_cache.clear()
+
+    def test_repeat_token_skips_decoding(self):
+        """
+        A token verified once is answered from the cache without decoding it again.
+        """
+        asyncio.run(auth.get_current_user(self.token))
+        with patch("src.auth.jwt.decode") as decode:
+            user = asyncio.run(auth.get_current_user(self.token))
+        decode.assert_not_called()
+        self.assertEqual(user.username, "admin")
+        self.assertEqual(auth.token_cache.stats()["hits"], 1)
+
+    def test_entry_expires_with_token(self):
+        """
+        Cached entries are dropped once the token's `exp` has passed.
+        """
+        auth.token_cache.put("token", User(username="admin", role="admin"), time.time() - 1)
+        self.assertIsNone(auth.token_cache.get("token"))
+
+    def test_revoke_user_evicts_tokens(self):
+        """
+        Revoking a user evicts their cached tokens, so the next request is verified again.
+        """
+        asyncio.run(auth.get_current_user(self.token))
+        auth.revoke_user("admin")
+        auth.revocation_check = lambda payload: payload["sub"] == "admin"
+        with self.assertRaises(HTTPException) as raised:
+            asyncio.run(auth.get_current_user(self.token))
+        self.assertEqual(raised.exception.status_code, 401)
+
+    def test_cache_is_bounded(self):
+        """
+        The least recently used token is evicted once the cache is full.
+        """
+        cache = auth.TokenCache(max_size=1)
+        cache.put("a", User(username="a", role="admin"), time.time() + 60)
+        cache.put("b", User(username="b", role="admin"), time.time() + 60)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from src import cache
+from src.cache import MISS, LRUCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        """
+        Once full, the entry that was read least recently is evicted first.
+        """
+        task_cache = LRUCache(max_size=2)
+        task_cache.put(1, {"id": 1})
+        task_cache.put(2, {"id": 2})
+        task_cache.get(1)
+        task_cache.put(3, {"id": 3})
+        self.assertIs(task_cache.get(2), MISS)
+        self.assertEqual(task_cache.get(1), {"id": 1})
+        self.assertEqual(task_cache.stats()["evictions"], 1)
+
+    def test_entries_expire(self):
+        """
+        Found and not-found entries expire after their respective TTLs.
+        """
+        task_cache = LRUCache(ttl=0.01, negative_ttl=60)
+        task_cache.put(1, {"id": 1})
+        task_cache.put(2, None)
+        time.sleep(0.02)
+        self.assertIs(task_cache.get(1), MISS)
+        self.assertIsNone(task_cache.get(2))
+
+    def test_fill_dropped_after_concurrent_write(self):
+        """
+        A read that started before a write must not overwrite what the write stored.
+        """
+        task_cache = LRUCache()
+        token = task_cache.token()
+        task_cache.put(1, {"id": 1, "status": "done"})
+        task_cache.fill(1, {"id": 1, "status": "running"}, token)
+        self.assertEqual(task_cache.get(1)["status"], "done")
+
+    def test_changes_from_other_processes_invalidate(self):
+        """
+        A change notification drops the task's entry; a missed-changes signal drops them all.
+        """
+        task_cache = LRUCache()
+        task_cache.put(1, {"id": 1, "status": "running"})
+        task_cache.put(2, {"id": 2, "status": "queued"})
+        with patch("src.cache._cache", new=task_cache):
+            self.assertTrue(cache.is_local())
+            cache.on_task_event({"event_id": 9, "op": "update", "id": 1, "status": "done"})
+            self.assertIs(task_cache.get(1), MISS)
+            self.assertEqual(task_cache.get(2)["status"], "queued")
+            cache.on_task_event(None)
+            self.assertIs(task_cache.get(2), MISS)
+
+
+if __name__ == '__main__':
+    unittest.main()
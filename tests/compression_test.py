@@ -0,0 +1,97 @@
+import gzip
+import unittest
+
+import brotli
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.compression import CompressionMiddleware, choose_encoding
+
+config = {"minimum_size": 100, "gzip_level": 6, "brotli_quality": 4, "thread_minimum_size": 1000}
+large = "task," * 200
+
+
+def stream(request):
+    async def chunks():
+        for _ in range(3):
+            yield large
+    return StreamingResponse(chunks(), media_type="text/csv")
+
+
+app = Starlette(routes=[
+    Route("/small", lambda request: PlainTextResponse("ok")),
+    Route("/large", lambda request: PlainTextResponse(large)),
+    Route("/tagged", lambda request: PlainTextResponse(large, headers={"ETag": '"7-abc"'})),
+    Route("/tagged-small", lambda request: PlainTextResponse("ok", headers={"ETag": '"7-abc"'})),
+    Route("/stream", stream),
+    Route("/events", lambda request: PlainTextResponse(large, media_type="text/event-stream")),
+])
+app.add_middleware(CompressionMiddleware, config=config)
+client = TestClient(app)
+
+
+class ChooseEncodingTestCase(unittest.TestCase):
+
+    def test_prefers_brotli(self):
+        """
+        Brotli wins when accepted; quality zero refuses a coding.
+        """
+        self.assertEqual(choose_encoding("gzip, deflate, br"), "br")
+        self.assertEqual(choose_encoding("gzip, br;q=0"), "gzip")
+        self.assertEqual(choose_encoding("*"), "br")
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertIsNone(choose_encoding(""))
+
+
+class CompressionMiddlewareTestCase(unittest.TestCase):
+
+    def test_small_bodies_are_not_compressed(self):
+        """
+        Bodies below the threshold are sent as they are.
+        """
+        response = client.get("/small", headers={"Accept-Encoding": "br"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.text, "ok")
+
+    def test_large_bodies_are_compressed(self):
+        """
+        Large bodies are encoded with the accepted coding and a matching length.
+        """
+        response = client.get("/large", headers={"Accept-Encoding": "br"})
+        self.assertEqual(response.headers["content-encoding"], "br")
+        self.assertIn("Accept-Encoding", response.headers["vary"])
+        self.assertEqual(response.text, large)
+        self.assertLess(int(response.headers["content-length"]), len(large))
+
+    def test_compressed_responses_get_their_own_etag(self):
+        """
+        A compressed body's ETag names the coding; an uncompressed one keeps the tag as it was.
+        """
+        for coding in ("br", "gzip"):
+            response = client.get("/tagged", headers={"Accept-Encoding": coding})
+            self.assertEqual(response.headers["etag"], f'"7-abc-{coding}"')
+            self.assertIn("Accept-Encoding", response.headers["vary"])
+        self.assertEqual(client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["etag"], '"7-abc"')
+        self.assertEqual(client.get("/tagged-small", headers={"Accept-Encoding": "br"}).headers["etag"], '"7-abc"')
+
+    def test_streams_are_compressed_incrementally(self):
+        """
+        Streamed bodies are gzip-compressed chunk by chunk into one valid stream.
+        """
+        with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join(response.iter_raw())
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(gzip.decompress(raw).decode(), large * 3)
+
+    def test_event_streams_are_left_alone(self):
+        """
+        Server-sent events are never held in a compressor's buffer.
+        """
+        response = client.get("/events", headers={"Accept-Encoding": "br"})
+        self.assertNotIn("content-encoding", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import time
+import unittest
+from unittest.mock import patch
+
+import psycopg2.extensions
+
+from src.db import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    """
+    Minimal stand-in for a psycopg2 connection, enough for the pool's bookkeeping.
+    """
+
+    def __init__(self):
+        self.closed = 0
+        self.rollbacks = 0
+        self.in_transaction = False
+
+    def get_transaction_status(self):
+        if self.in_transaction:
+            return psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            conn = FakeConnection()
+            self.opened.append(conn)
+            return conn
+
+        options = {"min_size": 0, "max_size": 2, "acquire_timeout": 0.05}
+        options.update(kwargs)
+        return ConnectionPool(connect, **options)
+
+    def test_reuses_returned_connection(self):
+        """
+        A connection given back to the pool is handed out again instead of opening a new one.
+        """
+        pool = self.make_pool()
+        conn = pool.getconn()
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_acquire_timeout_when_exhausted(self):
+        """
+        Once `max_size` connections are checked out, further checkouts time out and are counted.
+        """
+        pool = self.make_pool()
+        pool.getconn()
+        pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        stats = pool.stats()
+        self.assertEqual(stats["in_use"], 2)
+        self.assertEqual(stats["idle"], 0)
+        self.assertEqual(stats["timeouts"], 1)
+
+    def test_open_transaction_rolled_back_on_return(self):
+        """
+        Uncommitted work is rolled back before a connection becomes idle again.
+        """
+        pool = self.make_pool()
+        conn = pool.getconn()
+        conn.in_transaction = True
+        pool.putconn(conn)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_expired_connection_is_replaced(self):
+        """
+        Connections older than `max_lifetime` are closed on checkout and replaced with a fresh one.
+        """
+        pool = self.make_pool(max_lifetime=0.01)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        time.sleep(0.02)
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_failed_health_check_reconnects(self):
+        """
+        An idle connection that fails the `SELECT 1` ping is discarded in favour of a new one.
+        """
+        pool = self.make_pool(health_check_after=0)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        with patch.object(FakeConnection, "cursor", create=True, side_effect=psycopg2.OperationalError):
+            replacement = pool.getconn()
+        self.assertIsNot(replacement, conn)
+        self.assertEqual(len(self.opened), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
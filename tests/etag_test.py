@@ -0,0 +1,73 @@
+import unittest
+from datetime import datetime, timezone
+
+from src import etag
+
+task = {"id": 42, "updated_at": datetime(2024, 5, 1, 12, 0, 0, 250000, tzinfo=timezone.utc)}
+
+
+class ETagTestCase(unittest.TestCase):
+
+    def test_task_etag_changes_with_updated_at(self):
+        """
+        A task's ETag is derived from its ID and `updated_at`.
+        """
+        later = dict(task, updated_at=datetime(2024, 5, 1, 12, 0, 1, tzinfo=timezone.utc))
+        self.assertTrue(etag.task_etag(task).startswith('"42-'))
+        self.assertNotEqual(etag.task_etag(task), etag.task_etag(later))
+
+    def test_page_version_matches_rows(self):
+        """
+        The aggregate computed from fetched rows gives the same ETag as the database aggregate.
+        """
+        version = {"count": 1, "last_updated": task["updated_at"], "id_sum": 42}
+        self.assertEqual(etag.page_etag(etag.page_version([task])), etag.page_etag(version))
+
+    def test_if_none_match_uses_weak_comparison(self):
+        """
+        If-None-Match matches weak and strong forms of the current tag.
+        """
+        tag = etag.task_etag(task)
+        self.assertTrue(etag.is_not_modified({"if-none-match": f'"x", W/{tag}'}, tag))
+        self.assertFalse(etag.is_not_modified({"if-none-match": '"x"'}, tag))
+
+    def test_if_modified_since_has_second_precision(self):
+        """
+        If-Modified-Since compares at the one-second precision of HTTP dates.
+        """
+        tag = etag.task_etag(task)
+        headers = {"if-modified-since": "Wed, 01 May 2024 12:00:00 GMT"}
+        self.assertTrue(etag.is_not_modified(headers, tag, task["updated_at"]))
+
+    def test_if_match_uses_strong_comparison(self):
+        """
+        If-Match only accepts the exact current tag or `*`.
+        """
+        tag = etag.task_etag(task)
+        self.assertTrue(etag.if_match(tag, tag))
+        self.assertTrue(etag.if_match("*", tag))
+        self.assertFalse(etag.if_match(f"W/{tag}", tag))
+
+    def test_encoded_tags_validate_the_task(self):
+        """
+        The tag of a compressed response matches the task in If-None-Match and If-Match.
+        """
+        tag = etag.task_etag(task)
+        gzip_tag = etag.encoded(tag, "gzip")
+        self.assertNotEqual(gzip_tag, tag)
+        self.assertEqual(etag.encoded(f"W/{tag}", "br"), f"W/{tag[:-1]}-br\"")
+        self.assertTrue(etag.is_not_modified({"if-none-match": gzip_tag}, tag))
+        self.assertTrue(etag.if_match(etag.encoded(tag, "br"), tag))
+        self.assertFalse(etag.if_match(f"W/{gzip_tag}", tag))
+
+    def test_representations_have_distinct_tags(self):
+        """
+        Each representation of a task has its own tag, and If-Match accepts any of them.
+        """
+        json_tag, msgpack_tag = etag.task_etag(task), etag.task_etag(task, "msgpack")
+        self.assertNotEqual(json_tag, msgpack_tag)
+        self.assertTrue(etag.if_match(msgpack_tag, json_tag, msgpack_tag))
+
+
+if __name__ == '__main__':
+    unittest.main()
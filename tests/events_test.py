@@ -0,0 +1,172 @@
+import asyncio
+import json
+import socket
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from src.events import EventBroker, Listener, format_event, stream
+
+
+def event(event_id):
+    return {"event_id": event_id, "op": "update", "id": 1, "status": "done"}
+
+
+async def collect(broker, subscription, backlog, heartbeat=15.0):
+    return [message async for message in stream(broker, subscription, backlog, heartbeat)]
+
+
+class EventBrokerTestCase(unittest.TestCase):
+
+    def test_resume_replays_missed_events(self):
+        """
+        A subscriber resuming from a known event ID gets every later event first.
+        """
+        broker = EventBroker(replay=10)
+        for event_id in (1, 2, 3):
+            broker.publish(event(event_id))
+        subscription, backlog = broker.subscribe("1")
+        self.assertFalse(subscription.reset)
+        self.assertEqual([missed["event_id"] for missed in backlog], [2, 3])
+
+    def test_unknown_event_id_resets(self):
+        """
+        Resuming from an event no longer kept ends in a reset pointing at the newest event.
+        """
+        broker = EventBroker(replay=2)
+        for event_id in (1, 2, 3):
+            broker.publish(event(event_id))
+
+        async def run():
+            subscription, backlog = broker.subscribe("1")
+            return await collect(broker, subscription, backlog)
+
+        self.assertEqual(asyncio.run(run()), ["id: 3\nevent: reset\ndata: {}\n\n"])
+        self.assertEqual(broker.stats()["subscribers"], 0)
+
+    def test_slow_subscriber_is_reset_not_buffered(self):
+        """
+        A subscriber whose queue is full is reset instead of growing without bound.
+        """
+        broker = EventBroker(queue_size=2)
+
+        async def run():
+            subscription, backlog = broker.subscribe()
+            for event_id in range(1, 6):
+                broker.publish(event(event_id))
+            self.assertTrue(subscription.reset)
+            self.assertLessEqual(subscription.queue.qsize(), 2)
+            return await collect(broker, subscription, backlog)
+
+        self.assertTrue(asyncio.run(run())[-1].startswith("id: 5\nevent: reset"))
+        self.assertEqual(broker.stats()["resets"], 1)
+
+    def test_stream_sends_events_and_heartbeats(self):
+        """
+        Queued events are sent as SSE messages and idle periods as keep-alive comments.
+        """
+        broker = EventBroker()
+
+        async def run():
+            subscription, backlog = broker.subscribe()
+            broker.publish(event(7))
+            messages = stream(broker, subscription, backlog, heartbeat=0.01)
+            first, second = await messages.__anext__(), await messages.__anext__()
+            await messages.aclose()
+            return first, second
+
+        self.assertEqual(asyncio.run(run()), (format_event(event(7)), ": keep-alive\n\n"))
+        self.assertEqual(broker.stats()["subscribers"], 0)
+
+
+class FakeListenConnection:
+    """
+    A `LISTEN` connection whose notifications are written to a socket pair.
+    """
+
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair()
+        self.reader.setblocking(False)
+        self.autocommit = False
+        self.notifies = []
+
+    def cursor(self):
+        return MagicMock()
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def poll(self):
+        try:
+            data = self.reader.recv(4096)
+        except BlockingIOError:
+            return
+        for payload in data.decode().split("\n"):
+            if payload:
+                self.notifies.append(SimpleNamespace(payload=payload))
+
+    def notify(self, payload):
+        self.writer.send(json.dumps(payload).encode() + b"\n")
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
+
+
+class ListenerTestCase(unittest.TestCase):
+
+    def test_observers_see_connects_and_changes(self):
+        """
+        Observers are told when the connection is made, then get every change as it is published.
+        """
+        conn = FakeListenConnection()
+        broker = EventBroker()
+        seen = []
+        listener = Listener(broker, connect=lambda: conn)
+        listener.observe(seen.append)
+        listener.observe(seen.append)
+
+        async def run():
+            listener.start()
+            while not seen:
+                await asyncio.sleep(0.001)
+            conn.notify(event(3))
+            while len(seen) < 2:
+                await asyncio.sleep(0.001)
+            await listener.close()
+
+        asyncio.run(asyncio.wait_for(run(), timeout=5))
+        self.assertEqual(seen, [None, event(3)])
+        self.assertEqual(broker.last_event_id(), 3)
+
+    def test_skips_notifications_that_are_not_changes(self):
+        """
+        A payload that is not a task change is logged and skipped; the listener keeps publishing.
+        """
+        conn = FakeListenConnection()
+        broker = EventBroker()
+        seen = []
+        listener = Listener(broker, connect=lambda: conn)
+        listener.observe(seen.append)
+
+        async def run():
+            listener.start()
+            while not seen:
+                await asyncio.sleep(0.001)
+            conn.writer.send(b"not json\n")
+            conn.notify([1, 2])
+            conn.notify(event(4))
+            while len(seen) < 2:
+                await asyncio.sleep(0.001)
+            self.assertTrue(listener.stats()["listening"])
+            await listener.close()
+
+        with self.assertLogs("src.events", "WARNING") as logs:
+            asyncio.run(asyncio.wait_for(run(), timeout=5))
+        self.assertEqual(seen, [None, event(4)])
+        self.assertEqual(broker.last_event_id(), 4)
+        self.assertEqual(len(logs.records), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+
+from src import export
+from src.auth import get_current_user
+from src.export import ExportResponse, _render, render_csv, render_ndjson
+from src.main import app
+from src.models import User
+
+client = TestClient(app)
+
+row = {
+    "id": 7,
+    "name": "backup",
+    "status": "done",
+    "created_at": datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc),
+    "updated_at": datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+}
+
+
+class ExportRenderTestCase(unittest.TestCase):
+
+    def test_ndjson_one_object_per_line(self):
+        """
+        Each row becomes one JSON line with ISO-8601 timestamps, written as the JSON API writes them.
+        """
+        body = render_ndjson([row, row])
+        lines = body.splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('"created_at": "2024-05-01T12:00:00Z"', lines[0])
+
+    def test_csv_header_only_on_first_batch(self):
+        """
+        The CSV header is written once, before the first batch.
+        """
+        first = render_csv([row], first=True)
+        later = render_csv([row])
+        self.assertTrue(first.startswith("id,name,status,created_at,updated_at\r\n"))
+        self.assertEqual(later, "7,backup,done,2024-05-01T12:00:00+00:00,2024-05-01T12:30:00+00:00\r\n")
+
+    def test_empty_csv_export_still_has_header(self):
+        """
+        An export with no rows still produces a CSV header.
+        """
+        self.assertEqual(list(_render(iter([]), "csv")), ["id,name,status,created_at,updated_at\r\n"])
+
+
+class ExportEndpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.dependency_overrides[get_current_user] = lambda: User(username="readonly", role="readonly")
+
+    def tearDown(self):
+        app.dependency_overrides = {}
+
+    @patch("src.export.stream_tasks", new_callable=AsyncMock, return_value=iter(['{"id": 7}\n']))
+    def test_export_streams_ndjson(self, stream_tasks):
+        """
+        GET /tasks/export streams the export body with the NDJSON media type and passes filters through.
+        """
+        response = client.get("/tasks/export", params={"format": "ndjson", "status": "done"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        self.assertEqual(response.text, '{"id": 7}\n')
+        self.assertEqual(stream_tasks.call_args.kwargs["status"], "done")
+
+    def test_export_rejects_unknown_format(self):
+        """
+        Only the supported export formats are accepted.
+        """
+        response = client.get("/tasks/export", params={"format": "xml"})
+        self.assertEqual(response.status_code, 422)
+
+
+class ExportConnectionTestCase(unittest.TestCase):
+
+    def respond(self, body, send):
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        response = ExportResponse(body, media_type="application/x-ndjson")
+        asyncio.run(response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send))
+
+    def test_connection_returned_when_client_leaves_before_first_chunk(self):
+        """
+        A send failing before the first chunk still returns the connection, with its cursor closed.
+        """
+        pool, conn = MagicMock(), MagicMock()
+        batches = MagicMock(return_value=iter([[row]]))
+
+        async def send(message):
+            raise OSError("client went away")
+
+        with patch("src.queries.iter_task_batches", new=batches):
+            body = export._open_sync(pool, conn, "ndjson", {})
+            with self.assertRaises(ClientDisconnect):
+                self.respond(body, send)
+        pool.putconn.assert_called_once_with(conn)
+
+    def test_connection_returned_after_async_export(self):
+        """
+        The async export rolls back and returns its connection once the body is sent.
+        """
+        pool, conn = AsyncMock(), AsyncMock()
+        sent = []
+
+        async def batches(connection, itersize, **filters):
+            yield [row]
+
+        async def send(message):
+            sent.append(message)
+
+        with patch("src.async_queries.iter_task_batches", new=batches):
+            self.respond(export._open_async(pool, conn, "ndjson", {}), send)
+        self.assertIn(b'"id": 7', sent[1]["body"])
+        conn.rollback.assert_awaited_once()
+        pool.putconn.assert_awaited_once_with(conn)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from src import cache, storage
+from src.auth import RoleChecker, get_current_user
+from src.group_commit import GroupCommitter
+from src.main import app
+from src.models import User
+
+
+@asynccontextmanager
+async def fake_cursor():
+    yield MagicMock()
+
+
+async def fake_create_tasks(name, cur, names):
+    return [{"id": i, "name": task_name} for i, task_name in enumerate(names, start=1)]
+
+
+class GroupCommitterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        for target, replacement in (("src.storage.cursor", fake_cursor),
+                                    ("src.storage.call", AsyncMock(side_effect=fake_create_tasks)),
+                                    ("src.storage.commit", AsyncMock())):
+            patcher = patch(target, new=replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_concurrent_creations_share_a_commit(self):
+        """
+        Creations arriving within the window become one insert, and each caller gets its own row.
+        """
+        committer = GroupCommitter(window=0.01, max_batch=100)
+
+        async def run():
+            return await asyncio.gather(*(committer.create_task(f"task {i}") for i in range(5)))
+
+        rows = asyncio.run(run())
+        self.assertEqual([row["name"] for row in rows], [f"task {i}" for i in range(5)])
+        stats = committer.stats()
+        self.assertEqual(stats["batch_size"]["count"], 1)
+        self.assertEqual(stats["batch_size"]["max"], 5)
+        self.assertEqual(stats["commit_latency_ms"]["count"], 1)
+
+    def test_full_batch_is_written_without_waiting(self):
+        """
+        A batch reaching `max_batch` is written at once rather than at the end of the window.
+        """
+        committer = GroupCommitter(window=60, max_batch=2)
+
+        async def run():
+            return await asyncio.wait_for(
+                asyncio.gather(*(committer.create_task(f"task {i}") for i in range(4))), timeout=5)
+
+        self.assertEqual(len(asyncio.run(run())), 4)
+        self.assertEqual(committer.stats()["batch_size"]["count"], 2)
+
+    def test_failed_batch_fails_every_caller(self):
+        """
+        A database error reaches every creation in the batch.
+        """
+        committer = GroupCommitter(window=0.001, max_batch=10)
+
+        async def run():
+            return await asyncio.gather(committer.create_task("a"), committer.create_task("b"),
+                                        return_exceptions=True)
+
+        with patch("src.storage.call", new=AsyncMock(side_effect=RuntimeError("db down"))):
+            results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(committer.stats()["failed_batches"], 1)
+
+    def test_missing_rows_fail_the_callers_left_over(self):
+        """
+        Callers without a row of their own get an error instead of waiting forever.
+        """
+        committer = GroupCommitter(window=0.001, max_batch=10)
+
+        async def run():
+            return await asyncio.wait_for(
+                asyncio.gather(committer.create_task("a"), committer.create_task("b"), return_exceptions=True),
+                timeout=5)
+
+        with patch("src.storage.call", new=AsyncMock(return_value=[{"id": 1, "name": "a"}])):
+            first, second = asyncio.run(run())
+        self.assertEqual(first, {"id": 1, "name": "a"})
+        self.assertIsInstance(second, RuntimeError)
+        self.assertEqual(str(second), "group commit returned 1 rows for 2 tasks")
+        self.assertEqual(committer.stats()["failed_batches"], 1)
+
+    def test_cancelled_commit_cancels_every_caller(self):
+        """
+        A commit interrupted by cancellation leaves no caller waiting.
+        """
+        committer = GroupCommitter(window=0.001, max_batch=10)
+
+        async def run():
+            return await asyncio.wait_for(
+                asyncio.gather(committer.create_task("a"), committer.create_task("b"), return_exceptions=True),
+                timeout=5)
+
+        with patch("src.storage.call", new=AsyncMock(side_effect=asyncio.CancelledError())):
+            results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, asyncio.CancelledError) for result in results))
+
+
+class GroupCommitRouteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.dependency_overrides[get_current_user] = lambda: User(username="admin", role="admin")
+        app.dependency_overrides[RoleChecker("admin")] = lambda: True
+        self.addCleanup(app.dependency_overrides.clear)
+        for target, replacement in (("src.storage.cursor", fake_cursor), ("src.storage.commit", AsyncMock())):
+            patcher = patch(target, new=replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patch_committer = patch("src.group_commit.committer", new=GroupCommitter(window=0.001, max_batch=10))
+        patch_committer.start()
+        self.addCleanup(patch_committer.stop)
+        enabled = patch.dict("src.group_commit.GROUP_COMMIT_CONFIG", {"enabled": True})
+        enabled.start()
+        self.addCleanup(enabled.stop)
+        cache.get_cache().clear()
+
+    def create_tasks(self, rows):
+        name = "src.async_queries.create_tasks" if storage.is_async() else "src.queries.create_tasks"
+        return patch(name, new=AsyncMock(side_effect=rows) if storage.is_async() else MagicMock(side_effect=rows))
+
+    def test_create_task_with_group_commit(self):
+        """
+        `POST /tasks` goes through the committer and answers with the committed row.
+        """
+        now = datetime.now()
+
+        def rows(cur, names):
+            return [{"id": i, "name": name, "status": "queued", "created_at": now, "updated_at": now}
+                    for i, name in enumerate(names, start=1)]
+
+        with self.create_tasks(rows) as create_tasks:
+            response = TestClient(app).post("/tasks", json={"name": "New Task"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "New Task")
+        create_tasks.assert_called_once()
+
+    def test_create_task_fails_when_its_row_is_missing(self):
+        """
+        A batch insert returning no row for the task fails the request instead of hanging it.
+        """
+        with self.create_tasks(lambda cur, names: []):
+            response = TestClient(app, raise_server_exceptions=False).post("/tasks", json={"name": "New Task"})
+        self.assertEqual(response.status_code, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
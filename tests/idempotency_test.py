@@ -0,0 +1,192 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from src import cache, idempotency, storage
+from src.auth import RoleChecker, get_current_user
+from src.idempotency import BUSY, DONE, MISMATCH, OWNED, Claim, MemoryIdempotencyStore, PostgresIdempotencyStore
+from src.main import app
+from src.models import User
+
+task_row = {"id": 1, "name": "Test Task", "status": "queued", "created_at": datetime(2024, 1, 1),
+            "updated_at": datetime(2024, 1, 1)}
+record = {"status": 200, "body": {"id": 1}, "headers": {}}
+
+
+@asynccontextmanager
+async def override_storage_cursor(role="primary"):
+    yield AsyncMock() if storage.is_async() else MagicMock()
+
+
+class MemoryIdempotencyStoreTestCase(unittest.TestCase):
+
+    def test_first_claim_owns_and_later_ones_replay(self):
+        """
+        A key is owned once; while in flight others are told to wait, afterwards they replay.
+        """
+        store = MemoryIdempotencyStore()
+
+        async def run():
+            states = [await store.claim(("u", "k"), "f"), await store.claim(("u", "k"), "f"),
+                      await store.claim(("u", "k"), "other")]
+            await store.complete(("u", "k"), "f", record)
+            return states + [await store.claim(("u", "k"), "f"), await store.claim(("v", "k"), "f")]
+
+        self.assertEqual(asyncio.run(run()), [(OWNED, None), (BUSY, None), (MISMATCH, None), (DONE, record),
+                                              (OWNED, None)])
+
+    def test_released_and_expired_keys_run_again(self):
+        """
+        A released claim or an expired response frees the key for the next request.
+        """
+        store = MemoryIdempotencyStore(ttl=0)
+
+        async def run():
+            await store.claim(("u", "k"), "f")
+            await store.release(("u", "k"), "f")
+            released = await store.claim(("u", "k"), "f")
+            await store.complete(("u", "k"), "f", record)
+            return released, await store.claim(("u", "k"), "f")
+
+        self.assertEqual(asyncio.run(run()), ((OWNED, None), (OWNED, None)))
+        self.assertEqual(store.stats()["expirations"], 1)
+
+    def test_evicts_least_recently_used_finished_keys(self):
+        """
+        The store stays bounded, but keys still in flight are never evicted.
+        """
+        store = MemoryIdempotencyStore(max_size=2)
+
+        async def run():
+            await store.claim(("u", "a"), "f")
+            await store.claim(("u", "b"), "f")
+            await store.complete(("u", "b"), "f", record)
+            await store.claim(("u", "c"), "f")
+            return await store.claim(("u", "a"), "f"), await store.claim(("u", "b"), "f")
+
+        self.assertEqual(asyncio.run(run()), ((BUSY, None), (OWNED, None)))
+        self.assertEqual(store.stats()["evictions"], 1)
+
+
+class ClaimTestCase(unittest.TestCase):
+
+    def test_retry_waits_for_the_original_request(self):
+        """
+        A retry arriving while the first request runs waits and then replays its response.
+        """
+        store = MemoryIdempotencyStore()
+
+        async def run():
+            async with Claim(store, ("u", "k"), "f", 1.0) as first:
+                retry = asyncio.ensure_future(Claim(store, ("u", "k"), "f", 1.0).__aenter__())
+                await asyncio.sleep(0.01)
+                self.assertFalse(retry.done())
+                first.save({"id": 1})
+            return (await retry).response
+
+        response = asyncio.run(run())
+        self.assertEqual(response.body, b'{"id":1}')
+        self.assertEqual(response.headers["idempotent-replayed"], "true")
+
+    def test_retry_gives_up_with_409(self):
+        """
+        A retry that outwaits `wait_timeout` answers 409 with `Retry-After`.
+        """
+        store = MemoryIdempotencyStore()
+
+        async def run():
+            await store.claim(("u", "k"), "f")
+            await Claim(store, ("u", "k"), "f", 0.01).__aenter__()
+
+        with self.assertRaises(HTTPException) as raised:
+            asyncio.run(run())
+        self.assertEqual(raised.exception.status_code, 409)
+        self.assertIn("Retry-After", raised.exception.headers)
+
+
+class PostgresIdempotencyStoreTestCase(unittest.TestCase):
+
+    def test_maps_rows_to_claim_outcomes(self):
+        """
+        A claimed row means owned; otherwise the existing row decides, and no row means busy.
+        """
+        rows = [{"claimed": True}, None,
+                {"claimed": False, "fingerprint": "f", "status_code": None},
+                {"claimed": False, "fingerprint": "g", "status_code": 200},
+                {"claimed": False, "fingerprint": "f", "status_code": 201, "response": {"id": 1}, "headers": None}]
+        store = PostgresIdempotencyStore(prune_interval=3600)
+        call = AsyncMock(side_effect=[0] + rows)
+        with patch("src.storage.cursor", new=override_storage_cursor), patch("src.storage.call", new=call), \
+                patch("src.storage.commit", new=AsyncMock()):
+            states = [asyncio.run(store.claim(("u", "k"), "f")) for _ in rows]
+        self.assertEqual(states, [(OWNED, None), (BUSY, None), (BUSY, None), (MISMATCH, None),
+                                  (DONE, {"status": 201, "body": {"id": 1}, "headers": {}})])
+        self.assertEqual([c.args[0] for c in call.call_args_list[:2]],
+                         ["prune_idempotency_keys", "claim_idempotency_key"])
+
+
+class IdempotentEndpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.dependency_overrides[get_current_user] = lambda: User(username="admin", role="admin")
+        app.dependency_overrides[RoleChecker("admin")] = lambda: True
+        self.addCleanup(app.dependency_overrides.clear)
+        for patcher in (patch("src.storage.cursor", new=override_storage_cursor),
+                        patch("src.idempotency._store", new=MemoryIdempotencyStore())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache.get_cache().clear()
+        self.client = TestClient(app)
+
+    def test_retried_create_replays_the_first_response(self):
+        """
+        The task is created once; the retry gets the same body back, and a different body is refused.
+        """
+        create = MagicMock(return_value=task_row)
+        create_many = MagicMock(side_effect=lambda cur, names: [create(cur, name) for name in names])
+        headers = {"Idempotency-Key": "create-1"}
+        with patch("src.queries.create_task", new=create), \
+                patch("src.async_queries.create_task", new=AsyncMock(side_effect=create)), \
+                patch("src.queries.create_tasks", new=create_many), \
+                patch("src.async_queries.create_tasks", new=AsyncMock(side_effect=create_many)):
+            first = self.client.post("/tasks", json={"name": "New Task"}, headers=headers)
+            retry = self.client.post("/tasks", json={"name": "New Task"}, headers=headers)
+            other = self.client.post("/tasks", json={"name": "Other"}, headers=headers)
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(other.status_code, 422)
+
+    def test_failed_update_is_not_stored(self):
+        """
+        An update that fails releases its key, so the retry runs; the successful one replays its ETag.
+        """
+        update = MagicMock(side_effect=[None, task_row])
+        headers = {"Idempotency-Key": "update-1"}
+        body = {"name": "Updated", "status": "done"}
+        with patch("src.queries.update_task", new=update), \
+                patch("src.async_queries.update_task", new=AsyncMock(side_effect=update)):
+            missing = self.client.put("/tasks/1", json=body, headers=headers)
+            updated = self.client.put("/tasks/1", json=body, headers=headers)
+            replayed = self.client.put("/tasks/1", json=body, headers=headers)
+        self.assertEqual((missing.status_code, updated.status_code, replayed.status_code), (404, 200, 200))
+        self.assertEqual(update.call_count, 2)
+        self.assertEqual(replayed.headers["ETag"], updated.headers["ETag"])
+        self.assertEqual(replayed.json(), updated.json())
+
+    def test_rejects_oversized_keys(self):
+        """
+        Keys longer than `MAX_KEY_LENGTH` are refused before anything runs.
+        """
+        headers = {"Idempotency-Key": "k" * (idempotency.MAX_KEY_LENGTH + 1)}
+        self.assertEqual(self.client.post("/tasks", json={"name": "x"}, headers=headers).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,13 @@
 import unittest
+import msgpack
+from contextlib import asynccontextmanager
 from fastapi.testclient import TestClient
 from datetime import datetime
 from src.main import app
 from src.models import User, Task
 from src.auth import get_current_user, RoleChecker
-from unittest.mock import patch
+from src import cache, etag, storage
+from unittest.mock import AsyncMock, MagicMock, patch
 
 client = TestClient(app)
 
@@ -21,6 +24,14 @@ mock_task = Task(
 
 mock_tasks = [mock_task]
 
+mock_task_row = {
+    "id": 1,
+    "name": "Test Task",
+    "status": "pending",
+    "created_at": datetime.now(),
+    "updated_at": datetime.now()
+}
+
 # Mock roles
 
 
@@ -36,6 +47,16 @@ def always_true_dependency():
     return True
 
 
+def override_cursor():
+    # The same suite runs against either backend: TASK_DB_BACKEND=async pytest
+    return AsyncMock() if storage.is_async() else MagicMock()
+
+
+@asynccontextmanager
+async def override_storage_cursor(role="primary"):
+    yield override_cursor()
+
+
 class TaskAPITestCase(unittest.TestCase):
 
     def setUp(self):
@@ -43,12 +64,19 @@ class TaskAPITestCase(unittest.TestCase):
         app.dependency_overrides[get_current_user] = override_admin_user
         app.dependency_overrides[RoleChecker("admin")] = always_true_dependency
         app.dependency_overrides[RoleChecker("readonly")] = always_true_dependency
+        app.dependency_overrides[storage.get_cursor] = override_cursor
+        app.dependency_overrides[storage.get_read_cursor] = override_cursor
+        cursor_patcher = patch("src.storage.cursor", new=override_storage_cursor)
+        cursor_patcher.start()
+        self.addCleanup(cursor_patcher.stop)
+        cache.get_cache().clear()
 
     def tearDown(self):
         # Clear overrides after each test
         app.dependency_overrides = {}
 
     @patch("src.queries.get_all_tasks", return_value=mock_tasks)
+    @patch("src.async_queries.get_all_tasks", new=AsyncMock(return_value=mock_tasks))
     def test_list_tasks_as_admin(self, _):
         """
         Test case for listing tasks as an admin user.
@@ -65,7 +93,117 @@ class TaskAPITestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()[0]["name"], "Test Task")
 
+    @patch("src.queries.get_tasks_version", return_value={"count": 1, "last_updated": None, "id_sum": 1})
+    @patch("src.async_queries.get_tasks_version", new=AsyncMock(return_value={"count": 1, "last_updated": None, "id_sum": 1}))
+    @patch("src.queries.get_all_tasks", return_value=[{"id": 1, "name": "a"}, {"id": 2, "name": "b"}])
+    @patch("src.async_queries.get_all_tasks", new=AsyncMock(return_value=[{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]))
+    def test_list_tasks_page_with_projection(self, *_):
+        """
+        Test case for listing a page of projected tasks.
+
+        When the query returns one row more than `limit`, the extra row is dropped and the
+        ID of the last task on the page is advertised as the next `after` cursor.
+
+        Assertions:
+            - Only the first `limit` rows are returned, with the projected fields.
+            - The `X-Next-After` header holds the ID of the last returned task.
+        """
+        response = client.get("/tasks", params={"limit": 1, "fields": "name"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{"id": 1, "name": "a"}])
+        self.assertEqual(response.headers["X-Next-After"], "1")
+
+    @patch("src.queries.get_all_tasks", return_value=[mock_task_row])
+    @patch("src.async_queries.get_all_tasks", new=AsyncMock(return_value=[mock_task_row]))
+    def test_list_tasks_fast_serializer_matches_model(self, _):
+        """
+        Test case for the fast list serializer.
+
+        Assertions:
+            - Rows encoded directly give the same JSON as rows validated through `Task`.
+        """
+        expected = client.get("/tasks").json()
+        with patch("src.serialize.SERIALIZER", "fast"):
+            response = client.get("/tasks")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/json")
+        self.assertEqual(response.json(), expected)
+
+    @patch("src.queries.get_all_tasks", return_value=[mock_task_row])
+    @patch("src.async_queries.get_all_tasks", new=AsyncMock(return_value=[mock_task_row]))
+    def test_list_tasks_negotiates_columnar_msgpack(self, _):
+        """
+        Test case for requesting a task page as columnar MessagePack.
+
+        Assertions:
+            - The body holds one array per field and the response varies on `Accept`.
+            - A format the endpoint does not offer gets a 406.
+        """
+        response = client.get("/tasks", headers={"Accept": "application/vnd.task-columns+msgpack"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/vnd.task-columns+msgpack")
+        self.assertIn("Accept", response.headers["vary"])
+        self.assertEqual(msgpack.unpackb(response.content, timestamp=3)["name"], ["Test Task"])
+        self.assertEqual(client.get("/tasks", headers={"Accept": "text/csv"}).status_code, 406)
+
+    def test_list_tasks_rejects_unknown_field(self):
+        """
+        Test case for projecting onto a column that does not exist.
+
+        Assertions:
+            - The response status code is 422.
+        """
+        response = client.get("/tasks", params={"fields": "name,owner"})
+        self.assertEqual(response.status_code, 422)
+
+    def test_task_stats(self):
+        """
+        Test case for the task statistics endpoint.
+
+        Assertions:
+            - Counts by status and per-window activity come straight from the counters.
+        """
+        stats = {"total": 3, "by_status": {"done": 1, "running": 2},
+                 "windows": {"5m": {"created": 2, "updated": 1, "deleted": 0}}}
+        with patch("src.queries.get_task_stats", return_value=stats), \
+                patch("src.async_queries.get_task_stats", new=AsyncMock(return_value=stats)):
+            response = client.get("/tasks/stats")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), stats)
+
+    def test_get_task_result(self):
+        """
+        Test case for retrieving the outcome a worker recorded for a task.
+
+        Assertions:
+            - A recorded outcome is returned; a task without one gets a 404.
+        """
+        row = {"task_id": 1, "result": {"slept": 0.5}, "error": None, "attempts": 1,
+               "worker": "host:1:abc", "finished_at": datetime.now()}
+        with patch("src.queries.get_task_result", side_effect=[row, None]), \
+                patch("src.async_queries.get_task_result", new=AsyncMock(side_effect=[row, None])):
+            found = client.get("/tasks/1/result")
+            missing = client.get("/tasks/2/result")
+        self.assertEqual(found.status_code, 200)
+        self.assertEqual(found.json()["result"], {"slept": 0.5})
+        self.assertEqual(missing.status_code, 404)
+
+    @patch("src.events.listener.start")
+    def test_task_events_reset_on_unknown_last_event_id(self, start):
+        """
+        Test case for resuming the change feed from an event that is no longer kept.
+
+        Assertions:
+            - The listener is started and the stream is a single `reset` event.
+        """
+        response = client.get("/tasks/events", headers={"Last-Event-ID": "12345"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        self.assertIn("event: reset", response.text)
+        start.assert_called_once()
+
     @patch("src.queries.get_task_by_id", return_value=mock_task)
+    @patch("src.async_queries.get_task_by_id", new=AsyncMock(return_value=mock_task))
     def test_get_task_by_id(self, _):
         """
         Test case for retrieving a task by its ID.
@@ -86,8 +224,96 @@ class TaskAPITestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()["id"], 1)
 
-    @patch("src.queries.create_task", return_value=mock_task)
-    def test_create_task_as_admin(self, _):
+    @patch("src.queries.get_task_by_id", return_value=mock_task)
+    @patch("src.async_queries.get_task_by_id", new=AsyncMock(return_value=mock_task))
+    def test_get_task_served_from_cache(self, get_task_by_id):
+        """
+        Test case for repeated reads of the same task.
+
+        Assertions:
+            - The second read is answered from the cache without querying the database.
+        """
+        client.get("/tasks/1")
+        response = client.get("/tasks/1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache.get_cache().stats()["hits"], 1)
+        if not storage.is_async():
+            get_task_by_id.assert_called_once()
+
+    @patch("src.queries.get_task_by_id", return_value=mock_task)
+    @patch("src.async_queries.get_task_by_id", new=AsyncMock(return_value=mock_task))
+    @patch("src.queries.delete_task", return_value=mock_task)
+    @patch("src.async_queries.delete_task", new=AsyncMock(return_value=mock_task))
+    def test_delete_task_invalidates_cache(self, *_):
+        """
+        Test case for reading a task after deleting it.
+
+        Assertions:
+            - A cached task is replaced by a cached "not found" once it is deleted.
+        """
+        client.get("/tasks/1")
+        client.delete("/tasks/1")
+        response = client.get("/tasks/1")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(cache.get_cache().stats()["negative_hits"], 1)
+
+    @patch("src.queries.get_task_by_id", return_value=mock_task)
+    @patch("src.async_queries.get_task_by_id", new=AsyncMock(return_value=mock_task))
+    def test_get_task_not_modified(self, _):
+        """
+        Test case for revalidating a task with its ETag.
+
+        Assertions:
+            - The first response carries an ETag.
+            - Sending it back in If-None-Match yields a 304 without a body.
+        """
+        tag = client.get("/tasks/1").headers["ETag"]
+        response = client.get("/tasks/1", headers={"If-None-Match": tag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    @patch("src.queries.get_all_tasks")
+    @patch("src.async_queries.get_all_tasks", new_callable=AsyncMock)
+    @patch("src.queries.get_tasks_version", return_value={"count": 1, "last_updated": mock_task.updated_at, "id_sum": 1})
+    @patch("src.async_queries.get_tasks_version",
+           new=AsyncMock(return_value={"count": 1, "last_updated": mock_task.updated_at, "id_sum": 1}))
+    def test_list_tasks_not_modified_skips_page_query(self, _, async_get_all_tasks, get_all_tasks):
+        """
+        Test case for revalidating an unchanged page of tasks.
+
+        Assertions:
+            - The page ETag is computed from the version aggregate alone.
+            - A matching If-None-Match yields a 304 and the page query never runs.
+        """
+        version = {"count": 1, "last_updated": mock_task.updated_at, "id_sum": 1}
+        tag = etag.page_etag(version)
+        response = client.get("/tasks", headers={"If-None-Match": tag})
+        self.assertEqual(response.status_code, 304)
+        get_all_tasks.assert_not_called()
+        async_get_all_tasks.assert_not_called()
+
+    @patch("src.queries.get_task_for_update", return_value=mock_task)
+    @patch("src.async_queries.get_task_for_update", new=AsyncMock(return_value=mock_task))
+    @patch("src.queries.update_task", return_value=mock_task)
+    @patch("src.async_queries.update_task", new=AsyncMock(return_value=mock_task))
+    def test_update_task_with_stale_if_match(self, update_task, _):
+        """
+        Test case for an optimistic-concurrency update against a task that has changed.
+
+        Assertions:
+            - The response status code is 412.
+            - The task is not updated.
+        """
+        response = client.put("/tasks/1", json={"name": "Updated Task", "status": "completed"},
+                              headers={"If-Match": '"1-0"'})
+        self.assertEqual(response.status_code, 412)
+        update_task.assert_not_called()
+
+    @patch("src.queries.create_task", return_value=mock_task_row)
+    @patch("src.async_queries.create_task", new=AsyncMock(return_value=mock_task_row))
+    @patch("src.queries.create_tasks", return_value=[mock_task_row])
+    @patch("src.async_queries.create_tasks", new=AsyncMock(return_value=[mock_task_row]))
+    def test_create_task_as_admin(self, *_):
         """
         Test case for creating a task as an admin user.
 
@@ -103,6 +329,7 @@ class TaskAPITestCase(unittest.TestCase):
         self.assertEqual(response.json()["name"], "Test Task")
 
     @patch("src.queries.update_task", return_value=mock_task)
+    @patch("src.async_queries.update_task", new=AsyncMock(return_value=mock_task))
     def test_update_task_as_admin(self, _):
         """
         Test case for updating a task as an admin user.
@@ -121,6 +348,7 @@ class TaskAPITestCase(unittest.TestCase):
         self.assertEqual(response.json()["status"], "pending")
 
     @patch("src.queries.delete_task", return_value=mock_task)
+    @patch("src.async_queries.delete_task", new=AsyncMock(return_value=mock_task))
     def test_delete_task_as_admin(self, _):
         """
         Test case for deleting a task as an admin user.
@@ -142,6 +370,56 @@ class TaskAPITestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()["id"], 1)
 
+    @patch("src.queries.create_tasks", return_value=[mock_task_row])
+    @patch("src.async_queries.create_tasks", new=AsyncMock(return_value=[mock_task_row]))
+    def test_create_tasks_batch(self, create_tasks):
+        """
+        Test case for creating tasks in a batch.
+
+        Assertions:
+            - All names are passed to a single batch query.
+            - Each created task is reported with a "created" result.
+        """
+        response = client.post("/tasks:batch", json={"tasks": [{"name": "Test Task"}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["result"], "created")
+        self.assertEqual(response.json()["results"][0]["task"]["name"], "Test Task")
+        if not storage.is_async():
+            self.assertEqual(create_tasks.call_args.args[1], ["Test Task"])
+
+    @patch("src.queries.update_tasks", return_value=[mock_task_row])
+    @patch("src.async_queries.update_tasks", new=AsyncMock(return_value=[mock_task_row]))
+    def test_update_tasks_batch_reports_missing(self, _):
+        """
+        Test case for a batch update that names a task that does not exist.
+
+        Assertions:
+            - Results follow request order.
+            - The existing task is "updated" and the unknown one "not_found".
+        """
+        response = client.patch("/tasks:batch", json={"tasks": [
+            {"id": 1, "name": "Updated Task", "status": "completed"},
+            {"id": 2, "name": "Missing Task", "status": "completed"},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([(item["id"], item["result"]) for item in results], [(1, "updated"), (2, "not_found")])
+        self.assertIsNone(results[1]["task"])
+
+    @patch("src.queries.delete_tasks", return_value=[mock_task_row])
+    @patch("src.async_queries.delete_tasks", new=AsyncMock(return_value=[mock_task_row]))
+    def test_delete_tasks_batch(self, _):
+        """
+        Test case for deleting tasks in a batch.
+
+        Assertions:
+            - The deleted task is reported with a "deleted" result.
+        """
+        response = client.request("DELETE", "/tasks:batch", json={"ids": [1]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["result"], "deleted")
+        self.assertEqual(response.json()["results"][0]["task"]["id"], 1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from src import metrics
+from src.main import app
+
+
+class HistogramTestCase(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch("src.metrics.REGISTRY", new=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_renders_cumulative_buckets(self):
+        """
+        Buckets are cumulative, bounds are inclusive, and sum and count follow them.
+        """
+        histogram = metrics.Histogram("step_seconds", "A step.", ("kind",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, "a")
+        self.assertEqual(metrics.render().decode().splitlines(), [
+            "# HELP step_seconds A step.",
+            "# TYPE step_seconds histogram",
+            'step_seconds_bucket{kind="a",le="0.1"} 2',
+            'step_seconds_bucket{kind="a",le="1.0"} 3',
+            'step_seconds_bucket{kind="a",le="+Inf"} 4',
+            'step_seconds_sum{kind="a"} 3.65',
+            'step_seconds_count{kind="a"} 4',
+        ])
+
+    def test_counter_escapes_label_values(self):
+        """
+        Label values are escaped as the text format requires.
+        """
+        counter = metrics.Counter("things_total", "Things.", ("name",))
+        counter.inc('say "hi"', amount=2)
+        self.assertIn('things_total{name="say \\"hi\\""} 2', metrics.render().decode())
+
+
+class TimedQueryTestCase(unittest.TestCase):
+
+    def test_records_duration_rows_and_errors(self):
+        """
+        Each query call adds one observation, its rows, and an error count when it raises.
+        """
+        def read(cursor):
+            return [{"id": 1}, {"id": 2}]
+
+        def broken(cursor):
+            raise RuntimeError("boom")
+
+        before = metrics.QUERY_ROWS._values.get(("test_read",), 0)
+        metrics.timed_query("test_read", read, None)
+        with self.assertRaises(RuntimeError):
+            metrics.timed_query("test_broken", broken, None)
+        self.assertEqual(metrics.QUERY_ROWS._values[("test_read",)] - before, 2)
+        self.assertEqual(metrics.QUERY_ERRORS._values[("test_broken",)], 1)
+        self.assertEqual(sum(metrics.QUERY_SECONDS._series[("test_broken",)][0]), 1)
+
+
+class MetricsEndpointTestCase(unittest.TestCase):
+
+    def test_requests_are_labelled_by_route_template(self):
+        """
+        Requests are recorded under the route template, and unknown paths under "unmatched".
+        """
+        client = TestClient(app)
+        client.get("/tasks/12345")
+        client.get("/no/such/path")
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn('route="/tasks/{task_id}",status="401"', response.text)
+        self.assertIn('route="unmatched",status="404"', response.text)
+        self.assertNotIn("12345", response.text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import psycopg
+import psycopg2.errors
+
+from src import async_db, prepared, queries
+from src.prepared import Statement, StatementCache
+
+
+class FakeConnection:
+
+    def __init__(self, invalid=0):
+        self.invalid = invalid
+        self.statements = []
+        self.rollbacks = 0
+
+    def run(self, sql, params):
+        self.statements.append(sql)
+        if sql.startswith("EXECUTE") and self.invalid:
+            self.invalid -= 1
+            raise psycopg2.errors.FeatureNotSupported("cached plan must not change result type")
+        return params
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class StatementTestCase(unittest.TestCase):
+
+    def test_rewrites_placeholders(self):
+        """
+        Positional placeholders are numbered in order; a repeated name reuses its number.
+        """
+        positional = Statement(queries.UPDATE_TASK_SQL)
+        self.assertIn("SET name = $1,", positional.prepare_sql)
+        self.assertIn("WHERE id = $3\n    RETURNING *;", positional.prepare_sql)
+        self.assertEqual(positional.execute_sql, f"EXECUTE {positional.name} (%s, %s, %s);")
+        self.assertEqual(positional.bind(("a", "done", 1)), ["a", "done", 1])
+
+        named = Statement("SELECT %(id)s, %(name)s, %(id)s, '100%%';")
+        self.assertEqual(named.prepare_sql, f"PREPARE {named.name} AS SELECT $1, $2, $1, '100%';")
+        self.assertEqual(named.bind({"name": "a", "id": 1}), [1, "a"])
+
+    def test_names_are_stable(self):
+        """
+        The same text gets the same name on every connection, and different texts different ones.
+        """
+        self.assertEqual(Statement(queries.DELETE_TASK_SQL).name, Statement(queries.DELETE_TASK_SQL).name)
+        self.assertNotEqual(Statement(queries.DELETE_TASK_SQL).name, Statement(queries.CREATE_TASK_SQL).name)
+        self.assertEqual(Statement("SELECT 1;").execute_sql, f"EXECUTE {Statement('SELECT 1;').name};")
+
+
+class StatementCacheTestCase(unittest.TestCase):
+
+    def test_prepares_once_per_connection(self):
+        """
+        The first run prepares the statement; later runs only execute it.
+        """
+        conn, cache = FakeConnection(), StatementCache()
+        for task_id in (1, 2):
+            self.assertEqual(cache.execute(conn.run, queries.GET_TASK_BY_ID_SQL, {"id": task_id}), [task_id])
+        self.assertEqual([sql.split()[0] for sql in conn.statements], ["PREPARE", "EXECUTE", "EXECUTE"])
+        self.assertEqual((len(cache), cache.prepares), (1, 1))
+
+    def test_invalidated_plan_is_prepared_again(self):
+        """
+        A plan broken by a schema change is retried after a rollback when its statement began the
+        transaction; otherwise it fails, and the next use deallocates and prepares afresh.
+        """
+        conn, cache = FakeConnection(invalid=1), StatementCache()
+        cache.execute(conn.run, queries.DELETE_TASK_SQL, (1,), rollback=conn.rollback)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertEqual([sql.split()[0] for sql in conn.statements],
+                         ["PREPARE", "EXECUTE", "DEALLOCATE", "PREPARE", "EXECUTE"])
+
+        conn.statements, conn.invalid = [], 1
+        with self.assertRaises(psycopg2.errors.FeatureNotSupported):
+            cache.execute(conn.run, queries.DELETE_TASK_SQL, (1,))
+        cache.execute(conn.run, queries.DELETE_TASK_SQL, (1,))
+        self.assertEqual([sql.split()[0] for sql in conn.statements], ["EXECUTE", "DEALLOCATE", "PREPARE", "EXECUTE"])
+        self.assertEqual(conn.rollbacks, 1)
+
+    def test_only_registered_statements_are_prepared(self):
+        """
+        Statements outside the registry, and every statement when disabled, run as they are.
+        """
+        self.assertTrue(prepared.should_prepare(queries.GET_USER_BY_USERNAME_SQL))
+        self.assertFalse(prepared.should_prepare(queries.CREATE_TASKS_SQL))
+        with patch.dict(prepared.PREPARED_CONFIG, enabled=False):
+            self.assertFalse(prepared.should_prepare(queries.GET_USER_BY_USERNAME_SQL))
+
+
+class AsyncCursorForTestCase(unittest.TestCase):
+
+    def run_cursor(self, writes):
+        conn = MagicMock(closed=False, commit=AsyncMock(), rollback=AsyncMock())
+        conn.info.transaction_status = psycopg.pq.TransactionStatus.INTRANS
+
+        @asynccontextmanager
+        async def cursor():
+            yield SimpleNamespace(writes=writes)
+
+        conn.cursor = cursor
+        pool = MagicMock(getconn=AsyncMock(return_value=conn), putconn=AsyncMock())
+
+        async def run():
+            async with asynccontextmanager(async_db.cursor_for)() as cur:
+                self.assertEqual(cur.writes, writes)
+
+        with patch("src.async_db.get_pool", new=AsyncMock(return_value=pool)):
+            asyncio.run(run())
+        pool.putconn.assert_awaited_once_with(conn)
+        return conn
+
+    def test_read_only_transaction_is_committed(self):
+        """
+        Committing a transaction that only read keeps psycopg's prepared statements.
+        """
+        conn = self.run_cursor(writes=False)
+        conn.commit.assert_awaited_once()
+        conn.rollback.assert_not_awaited()
+
+    def test_uncommitted_writes_are_rolled_back(self):
+        """
+        Writes the handler did not commit are still undone.
+        """
+        conn = self.run_cursor(writes=True)
+        conn.rollback.assert_awaited_once()
+        conn.commit.assert_not_awaited()
+
+    def test_selects_are_reads(self):
+        """
+        Only SELECTs count as reads; data-modifying CTEs and everything else are writes.
+        """
+        self.assertTrue(prepared.is_read(queries.GET_TASK_FOR_UPDATE_SQL))
+        self.assertTrue(prepared.is_read(queries.GET_TASK_BY_ID_SQL))
+        self.assertFalse(prepared.is_read(queries.ARCHIVE_TASKS_SQL))
+        self.assertFalse(prepared.is_read(queries.UPDATE_TASK_SQL))
+        self.assertFalse(prepared.is_read("selection"))
+
+
+if __name__ == '__main__':
+    unittest.main()
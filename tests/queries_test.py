@@ -0,0 +1,69 @@
+import unittest
+
+from src.queries import STATS_WINDOWS, build_task_list_query, stats_from_rows
+
+
+class BuildTaskListQueryTestCase(unittest.TestCase):
+
+    def test_defaults_select_every_task(self):
+        """
+        Without arguments the listing query selects every column of every task, ordered by ID.
+        """
+        self.assertEqual(build_task_list_query(), ("SELECT * FROM tasks ORDER BY id;", ()))
+
+    def test_keyset_page_with_filters(self):
+        """
+        Filters become parameterised conditions and the page is a keyset range on `id`.
+        """
+        sql, params = build_task_list_query(limit=50, after=10, status="done", updated_after="2024-01-01")
+        self.assertEqual(sql, "SELECT * FROM tasks WHERE id > %s AND status = %s AND updated_at > %s ORDER BY id LIMIT %s;")
+        self.assertEqual(params, (10, "done", "2024-01-01", 50))
+
+    def test_projection_always_includes_id(self):
+        """
+        Projected columns follow table order and always include `id`, which the next page needs.
+        """
+        sql, _ = build_task_list_query(fields=["status", "name"])
+        self.assertTrue(sql.startswith("SELECT id, name, status FROM tasks"))
+
+    def test_archived_listing_reads_the_archive(self):
+        """
+        Archived tasks come from `tasks_archive`, with only the task columns selected.
+        """
+        sql, params = build_task_list_query(limit=10, created_after="2024-01-01", archived=True)
+        self.assertEqual(sql, "SELECT id, name, status, created_at, updated_at FROM tasks_archive "
+                              "WHERE created_at > %s ORDER BY id LIMIT %s;")
+        self.assertEqual(params, ("2024-01-01", 10))
+
+    def test_projection_rejects_unknown_columns(self):
+        """
+        Only known columns may be projected, so user input never reaches the SQL text.
+        """
+        with self.assertRaises(ValueError):
+            build_task_list_query(fields=["name; DROP TABLE tasks"])
+
+    def test_name_contains_escapes_wildcards(self):
+        """
+        Name search is a case-insensitive substring match; LIKE wildcards in the input match literally.
+        """
+        sql, params = build_task_list_query(name_contains="50%_off")
+        self.assertEqual(sql, "SELECT * FROM tasks WHERE name ILIKE %s ORDER BY id;")
+        self.assertEqual(params, ("%50\\%\\_off%",))
+
+
+
+class StatsFromRowsTestCase(unittest.TestCase):
+
+    def test_windows_are_grouped(self):
+        """
+        The flat activity row is regrouped per window, and the total sums the status counts.
+        """
+        activity = {f"{metric}_{label}": 1 for label in STATS_WINDOWS for metric in ("created", "updated", "deleted")}
+        stats = stats_from_rows({"done": 2, "running": 3}, activity)
+        self.assertEqual(stats["total"], 5)
+        self.assertEqual(set(stats["windows"]), set(STATS_WINDOWS))
+        self.assertEqual(stats["windows"]["1h"], {"created": 1, "updated": 1, "deleted": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src import db, routing, storage
+from tests.db_test import FakeConnection
+
+
+class StickyClientsTestCase(unittest.TestCase):
+
+    def test_client_is_sticky_after_write(self):
+        """
+        A client that wrote reads from the primary until the window has passed.
+        """
+        clients = routing.StickyClients(window=0.05)
+        token = routing.current_client.set("Bearer a")
+        try:
+            self.assertFalse(clients.is_sticky())
+            clients.mark_write()
+            self.assertTrue(clients.is_sticky())
+            self.assertFalse(clients.is_sticky("Bearer b"))
+            time.sleep(0.06)
+            self.assertFalse(clients.is_sticky())
+        finally:
+            routing.current_client.reset(token)
+
+    def test_bounded(self):
+        """
+        Only the most recent writers are remembered.
+        """
+        clients = routing.StickyClients(window=60, max_size=2)
+        for key in ("a", "b", "c"):
+            clients.mark_write(key)
+        self.assertFalse(clients.is_sticky("a"))
+        self.assertTrue(clients.is_sticky("c"))
+
+
+class LagGuardTestCase(unittest.TestCase):
+
+    def test_measures_once_per_interval(self):
+        """
+        The lag is measured at most once per interval and compared with the limit.
+        """
+        guard = routing.LagGuard(max_lag=1.0, check_interval=60)
+        measure = AsyncMock(return_value=0.2)
+
+        async def run():
+            return [await guard.replica_usable(measure) for _ in range(3)]
+
+        self.assertEqual(asyncio.run(run()), [True, True, True])
+        measure.assert_awaited_once()
+
+    def test_lagging_or_unreachable_replica_is_skipped(self):
+        """
+        Too much lag, or no measurement at all, sends reads to the primary.
+        """
+        for lag in (5.0, None):
+            guard = routing.LagGuard(max_lag=1.0, check_interval=0)
+            self.assertFalse(asyncio.run(guard.replica_usable(AsyncMock(return_value=lag))))
+        self.assertEqual(guard.stats()["lag_fallbacks"], 1)
+
+
+class ReadRoleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        for target, replacement in (("src.db.REPLICA_CONFIG", dict(db.DB_CONFIG, host="replica")),
+                                    ("src.storage.sticky_clients", routing.StickyClients(window=60)),
+                                    ("src.storage.lag_guard", routing.LagGuard(max_lag=1.0, check_interval=0)),
+                                    ("src.storage._measure_replica_lag", AsyncMock(return_value=0.0))):
+            patcher = patch(target, new=replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_reads_go_to_replica_unless_sticky(self):
+        """
+        Reads use the replica until the client writes, then the primary.
+        """
+        async def run():
+            routing.current_client.set("Bearer a")
+            before = await storage.read_role()
+            storage.sticky_clients.mark_write()
+            return before, await storage.read_role()
+
+        self.assertEqual(asyncio.run(run()), ("replica", "primary"))
+
+    def test_without_replica_reads_use_primary(self):
+        """
+        With no replica configured every read uses the primary.
+        """
+        with patch("src.db.REPLICA_CONFIG", None):
+            self.assertEqual(asyncio.run(storage.read_role()), "primary")
+
+    def test_replica_pool_connects_to_replica(self):
+        """
+        The replica pool opens its connections with the replica's parameters.
+        """
+        hosts = []
+
+        def connect(**params):
+            hosts.append(params["host"])
+            return FakeConnection()
+
+        with patch("src.db.psycopg2.connect", side_effect=connect), patch.dict(db.POOL_CONFIG, min_size=1):
+            try:
+                db.get_pool("replica")
+                db.get_pool("primary")
+            finally:
+                db.close_pool()
+        self.assertEqual(hosts, ["replica", db.DB_CONFIG["host"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
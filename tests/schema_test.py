@@ -0,0 +1,118 @@
+import unittest
+
+from src import queries, schema
+
+
+class FakeCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        if sql.startswith("SELECT version FROM schema_migrations"):
+            self._rows = [{"version": version} for version in sorted(self.conn.versions)]
+        elif sql.startswith("INSERT INTO schema_migrations"):
+            self.conn.pending.add(params[0])
+        elif sql.startswith("EXPLAIN"):
+            self._rows = [{"QUERY PLAN": "Index Scan using tasks_pkey on tasks"}]
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConnection:
+
+    def __init__(self, versions=()):
+        self.versions = set(versions)
+        self.pending = set()
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.versions |= self.pending
+        self.pending.clear()
+        self.commits += 1
+
+    def rollback(self):
+        self.pending.clear()
+        self.rollbacks += 1
+
+
+class MigrateTestCase(unittest.TestCase):
+
+    def test_versions_are_unique_and_ordered(self):
+        """
+        Migrations are applied in list order, so versions must increase strictly.
+        """
+        versions = [version for version, _, _ in schema.MIGRATIONS]
+        self.assertEqual(versions, sorted(set(versions)))
+
+    def test_applies_pending_migrations_once(self):
+        """
+        Each pending migration commits on its own, and a second run applies nothing.
+        """
+        conn = FakeConnection()
+        applied = schema.migrate(conn)
+        self.assertEqual(applied, [version for version, _, _ in schema.MIGRATIONS])
+        self.assertEqual(conn.commits, len(schema.MIGRATIONS))
+        self.assertEqual(schema.migrate(conn), [])
+
+    def test_skips_applied_and_stops_at_target(self):
+        """
+        Already applied versions are skipped and nothing past `target` runs.
+        """
+        conn = FakeConnection(versions={1})
+        self.assertEqual(schema.migrate(conn, target=2), [2])
+        self.assertNotIn(schema.MIGRATIONS[2][2], conn.statements)
+
+    def test_migration_takes_advisory_lock(self):
+        """
+        Every migration transaction starts by taking the advisory lock.
+        """
+        conn = FakeConnection()
+        schema.migrate(conn, target=1)
+        self.assertTrue(conn.statements[0].startswith("SELECT pg_advisory_xact_lock"))
+
+
+class ExplainTestCase(unittest.TestCase):
+
+    def test_every_query_has_a_case(self):
+        """
+        Each statement constant in `queries` is covered by the explain registry or listed as unexplained.
+        """
+        covered = {sql for _, sql, _ in schema.explain_cases()}
+        names = [name for name in dir(queries) if name.endswith("_SQL")]
+        self.assertIn("GET_TASK_BY_ID_SQL", names)
+        for name in names:
+            if name in schema.UNEXPLAINED:
+                self.assertNotIn(getattr(queries, name), covered, name)
+            else:
+                self.assertIn(getattr(queries, name), covered, name)
+        self.assertLessEqual(set(schema.UNEXPLAINED), set(names))
+
+    def test_analyze_is_rolled_back(self):
+        """
+        EXPLAIN ANALYZE really executes writes, so every case is undone.
+        """
+        conn = FakeConnection()
+        plans = schema.explain(conn, analyze=True)
+        self.assertEqual(len(plans), len(schema.explain_cases()))
+        self.assertTrue(any(sql.startswith("EXPLAIN (ANALYZE, BUFFERS) ") for sql in conn.statements))
+        self.assertEqual(conn.commits, 0)
+        self.assertEqual(conn.rollbacks, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import json
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import msgpack
+from fastapi import HTTPException
+
+from src import serialize
+from src.models import Task
+
+rows = [
+    {"id": 1, "name": "a", "status": "running",
+     "created_at": datetime(2024, 1, 2, 3, 4, 5, 678, tzinfo=timezone.utc),
+     "updated_at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=2)))},
+    {"id": 2, "name": "b", "status": "done",
+     "created_at": datetime(2024, 1, 2, 3, 4, 5), "updated_at": datetime(2024, 1, 2, 3, 4, 5)},
+]
+
+
+class DumpsTestCase(unittest.TestCase):
+
+    def test_timestamps_match_pydantic(self):
+        """
+        UTC timestamps end in "Z", other offsets are kept and naive ones stay naive.
+        """
+        encoded = json.loads(serialize.dumps(rows))
+        self.assertEqual(encoded[0]["created_at"], "2024-01-02T03:04:05.000678Z")
+        self.assertEqual(encoded[0]["updated_at"], "2024-01-02T03:04:05+02:00")
+        self.assertEqual(encoded[1]["created_at"], "2024-01-02T03:04:05")
+
+    def test_stdlib_fallback_matches_orjson(self):
+        """
+        Without orjson the standard library produces the same bytes.
+        """
+        expected = serialize.dumps(rows)
+        with patch("src.serialize.orjson", None):
+            self.assertEqual(serialize.dumps(rows), expected)
+
+    def test_models_encode_like_rows(self):
+        """
+        Model instances mixed in with rows are encoded as their fields, with and without orjson.
+        """
+        tasks = [Task(**rows[0]), rows[1]]
+        expected = json.loads(serialize.dumps(rows))
+        self.assertEqual(json.loads(serialize.dumps(tasks)), expected)
+        with patch("src.serialize.orjson", None):
+            self.assertEqual(json.loads(serialize.dumps(tasks)), expected)
+
+
+class NegotiateTestCase(unittest.TestCase):
+
+    def test_defaults_to_json(self):
+        """
+        No `Accept` header, or a wildcard, gets JSON.
+        """
+        self.assertEqual(serialize.negotiate(None), serialize.JSON)
+        self.assertEqual(serialize.negotiate("*/*"), serialize.JSON)
+        self.assertEqual(serialize.negotiate("text/html, */*;q=0.8"), serialize.JSON)
+
+    def test_quality_values_pick_the_format(self):
+        """
+        The highest quality value wins, and the legacy MessagePack type is understood.
+        """
+        self.assertEqual(serialize.negotiate("application/json;q=0.5, application/msgpack"), serialize.MSGPACK)
+        self.assertEqual(serialize.negotiate("application/x-msgpack"), serialize.MSGPACK)
+        self.assertEqual(serialize.negotiate(serialize.COLUMNS_MSGPACK), serialize.COLUMNS_MSGPACK)
+
+    def test_unacceptable_is_406(self):
+        """
+        Asking only for formats an endpoint does not offer is refused.
+        """
+        with self.assertRaises(HTTPException) as raised:
+            serialize.negotiate(serialize.COLUMNS_JSON, serialize.SINGLE_MEDIA_TYPES)
+        self.assertEqual(raised.exception.status_code, 406)
+
+
+class EncodeTestCase(unittest.TestCase):
+
+    def test_columns_follow_table_order(self):
+        """
+        The columnar shape holds one array per field, in table column order.
+        """
+        columns = json.loads(serialize.encode(rows, serialize.COLUMNS_JSON))
+        self.assertEqual(list(columns), ["id", "name", "status", "created_at", "updated_at"])
+        self.assertEqual(columns["id"], [1, 2])
+
+    def test_empty_columnar_page_keeps_projection(self):
+        """
+        An empty page still names its fields, so consumers can build an empty frame.
+        """
+        self.assertEqual(serialize.to_columns([], ["name"]), {"id": [], "name": []})
+
+    def test_msgpack_round_trip(self):
+        """
+        MessagePack carries timestamps as timestamp extension values; naive ones are taken as UTC.
+        """
+        decoded = msgpack.unpackb(serialize.encode(rows, serialize.MSGPACK), timestamp=3)
+        self.assertEqual(decoded[0]["created_at"], rows[0]["created_at"])
+        self.assertEqual(decoded[1]["created_at"], rows[1]["created_at"].replace(tzinfo=timezone.utc))
+        self.assertLess(len(serialize.encode(rows, serialize.COLUMNS_MSGPACK)),
+                        len(serialize.encode(rows, serialize.JSON)))
+
+
+if __name__ == '__main__':
+    unittest.main()
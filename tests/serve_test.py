@@ -0,0 +1,143 @@
+import asyncio
+import os
+import signal
+import threading
+import time
+import unittest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from src import serve, storage
+from src.main import app
+from src.serve import Arbiter
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+class ArbiterTestCase(unittest.TestCase):
+
+    def start(self, arbiter):
+        thread = threading.Thread(target=arbiter.run, kwargs={"poll_interval": 0.01, "install_signals": False})
+        thread.start()
+        self.addCleanup(thread.join, 10)
+        self.addCleanup(arbiter.stop)
+        wait_for(lambda: len(arbiter.pids) == arbiter.workers)
+        return thread
+
+    def test_replaces_dead_workers_and_stops_the_rest(self):
+        """
+        A worker that dies is replaced; stopping terminates and reaps every worker.
+        """
+        arbiter = Arbiter(lambda: time.sleep(30), workers=2, graceful_timeout=5)
+        with patch("src.serve.MIN_WORKER_LIFETIME", 0):
+            thread = self.start(arbiter)
+            first = list(arbiter.pids)
+            os.kill(first[0], signal.SIGKILL)
+            wait_for(lambda: arbiter.restarts == 1 and len(arbiter.pids) == 2)
+            self.assertNotIn(first[0], arbiter.pids)
+            running = list(arbiter.pids)
+            arbiter.stop()
+            thread.join(10)
+        self.assertEqual(arbiter.pids, {})
+        for pid in running:
+            with self.assertRaises(ChildProcessError):
+                os.waitpid(pid, os.WNOHANG)
+
+    def test_kills_workers_that_ignore_sigterm(self):
+        """
+        Workers still running after `graceful_timeout` are killed.
+        """
+        def stubborn():
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            time.sleep(30)
+
+        arbiter = Arbiter(stubborn, workers=1, graceful_timeout=0.2)
+        thread = self.start(arbiter)
+        time.sleep(0.1)
+        started = time.monotonic()
+        arbiter.stop()
+        thread.join(10)
+        self.assertEqual(arbiter.pids, {})
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_bound_socket_is_inherited(self):
+        """
+        The listening socket survives the fork, so every worker accepts on it.
+        """
+        sock = serve.bind("127.0.0.1", 0)
+        self.addCleanup(sock.close)
+        self.assertTrue(sock.get_inheritable())
+        self.assertNotEqual(sock.getsockname()[1], 0)
+
+    def test_several_workers_share_idempotency_keys(self):
+        """
+        With more than one worker the idempotency store defaults to Postgres, and the in-memory one is refused.
+        """
+        environ = {}
+        serve.configure(1, environ)
+        self.assertEqual(environ, {})
+        serve.configure(4, environ)
+        self.assertEqual(environ["TASK_IDEMPOTENCY_BACKEND"], "postgres")
+        serve.configure(4, {"TASK_IDEMPOTENCY_BACKEND": "none"})
+        with self.assertRaises(ValueError):
+            serve.configure(4, {"TASK_IDEMPOTENCY_BACKEND": "memory"})
+
+
+class ReadinessTestCase(unittest.TestCase):
+
+    def test_ready_after_warm_up_while_database_answers(self):
+        """
+        `/ready` answers 503 until startup warmed the worker up, then follows the database.
+        """
+        app.state.ready = False
+        self.addCleanup(setattr, app.state, "ready", False)
+        self.assertEqual(TestClient(app).get("/ready").status_code, 503)
+
+        with patch("src.storage.warm_up", new=AsyncMock(return_value=True)) as warm_up, \
+                patch("src.auth.warm_up") as jwt_warm_up, \
+                patch("src.storage.ping", new=AsyncMock(side_effect=[True, False])):
+            with TestClient(app) as client:
+                ready = client.get("/ready")
+                unavailable = client.get("/ready")
+        warm_up.assert_awaited_once()
+        jwt_warm_up.assert_called_once()
+        self.assertEqual((ready.status_code, ready.json()), (200, {"status": "ready"}))
+        self.assertEqual(unavailable.status_code, 503)
+        self.assertEqual(unavailable.headers["Retry-After"], "1")
+
+
+class PingTestCase(unittest.TestCase):
+
+    def test_timeout_bounds_checkout_and_statement(self):
+        """
+        The ping waits for a connection no longer than its timeout and sets it as the statement timeout.
+        """
+        checkouts = []
+
+        @asynccontextmanager
+        async def cursor(role="primary", timeout=None):
+            checkouts.append((role, timeout))
+            yield MagicMock()
+
+        call = AsyncMock(return_value=0.0)
+        with patch("src.storage.cursor", new=cursor), patch("src.storage.call", new=call):
+            self.assertTrue(asyncio.run(storage.ping("replica", 0.5)))
+        self.assertEqual(checkouts, [("replica", 0.5)])
+        self.assertEqual([(c.args[0], c.args[2:]) for c in call.call_args_list],
+                         [("set_statement_timeout", (0.5,)), ("get_replica_lag", ())])
+
+        with patch("src.storage.cursor", new=cursor), \
+                patch("src.storage.call", new=AsyncMock(side_effect=RuntimeError("canceling statement"))):
+            self.assertFalse(asyncio.run(storage.ping("primary", 0.5)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+from unittest.mock import patch
+
+import psycopg2
+import psycopg2.extensions
+from fastapi.testclient import TestClient
+
+from src import slow_queries
+from src.auth import RoleChecker, get_current_user
+from src.main import app
+from src.models import User
+from src.slow_queries import SlowQueryLog
+
+
+class FakeCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        if sql.startswith("EXPLAIN") and self.conn.explain_error:
+            raise psycopg2.ProgrammingError("cannot explain")
+
+    def fetchall(self):
+        return [("Seq Scan on tasks",), ("  Buffers: shared hit=4",)]
+
+
+class FakeConnection:
+
+    def __init__(self, autocommit=False, explain_error=False):
+        self.autocommit = autocommit
+        self.explain_error = explain_error
+        self.statements = []
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+
+class SlowQueryLogTestCase(unittest.TestCase):
+
+    def test_redacts_parameters_and_normalises_sql(self):
+        """
+        Entries keep the statement on one line and only the types of its parameters.
+        """
+        log = SlowQueryLog(threshold=0.1)
+        log.record("SELECT *\n    FROM tasks\n    WHERE name = %s;", ("secret name",), 0.25, 3)
+        entry = log.recent()[0]
+        self.assertEqual(entry["sql"], "SELECT * FROM tasks WHERE name = %s;")
+        self.assertEqual(entry["params"], ["<str>"])
+        self.assertEqual((entry["duration_ms"], entry["rows"]), (250.0, 3))
+        self.assertEqual(slow_queries.redact({"ids": [1, 2], "owner": None}), {"ids": "<list[2]>", "owner": None})
+
+    def test_keeps_the_most_recent_entries(self):
+        """
+        The log is a ring buffer, listed newest first.
+        """
+        log = SlowQueryLog(keep=2)
+        for i in range(3):
+            log.record(f"SELECT {i};", None, 1.0, 1)
+        self.assertEqual([entry["sql"] for entry in log.recent()], ["SELECT 2;", "SELECT 1;"])
+        self.assertEqual(log.stats()["captured"], 3)
+
+    def test_only_single_dml_statements_are_explainable(self):
+        """
+        Utility statements and multi-statement strings are never explained.
+        """
+        self.assertTrue(slow_queries.explainable("\n  WITH claimable AS (SELECT 1) SELECT * FROM claimable;"))
+        self.assertFalse(slow_queries.explainable("LOCK TABLE tasks IN SHARE MODE;"))
+        self.assertFalse(slow_queries.explainable("DELETE FROM a; INSERT INTO a SELECT 1;"))
+        self.assertFalse(SlowQueryLog(explain_sample=0).should_explain("SELECT 1;"))
+
+
+class ExplainTestCase(unittest.TestCase):
+
+    def test_plan_is_captured_in_a_rolled_back_savepoint(self):
+        """
+        The statement is re-run under EXPLAIN ANALYZE and its effects are undone.
+        """
+        conn = FakeConnection()
+        plan = slow_queries.explain(conn, "DELETE FROM tasks WHERE id = %s;", (1,))
+        self.assertEqual(plan, "Seq Scan on tasks\n  Buffers: shared hit=4")
+        self.assertEqual(conn.statements, [
+            "SAVEPOINT slow_query_explain;",
+            "EXPLAIN (ANALYZE, BUFFERS) DELETE FROM tasks WHERE id = %s;",
+            "ROLLBACK TO SAVEPOINT slow_query_explain;",
+            "RELEASE SAVEPOINT slow_query_explain;",
+        ])
+
+    def test_failed_explain_and_autocommit_leave_transaction_usable(self):
+        """
+        A failing EXPLAIN is rolled back to the savepoint; autocommit connections are skipped.
+        """
+        conn = FakeConnection(explain_error=True)
+        self.assertIsNone(slow_queries.explain(conn, "SELECT 1;", None))
+        self.assertEqual(conn.statements[-2], "ROLLBACK TO SAVEPOINT slow_query_explain;")
+        conn = FakeConnection(autocommit=True)
+        self.assertIsNone(slow_queries.explain(conn, "SELECT 1;", None))
+        self.assertEqual(conn.statements, [])
+
+
+class SlowQueryEndpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.dependency_overrides[get_current_user] = lambda: User(username="admin", role="admin")
+        app.dependency_overrides[RoleChecker("admin")] = lambda: True
+        self.addCleanup(app.dependency_overrides.clear)
+
+    def test_lists_recent_slow_queries(self):
+        """
+        The admin endpoint returns the capture settings and the kept entries.
+        """
+        log = SlowQueryLog(threshold=0.1)
+        log.record("SELECT pg_sleep(%s);", (1,), 1.0, 1, plan="Result")
+        with patch("src.slow_queries.slow_log", new=log):
+            response = TestClient(app).get("/admin/slow-queries")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["threshold_ms"], 100.0)
+        self.assertEqual(body["recent"][0]["plan"], "Result")
+        self.assertEqual(body["recent"][0]["params"], ["<int>"])
+
+
+if __name__ == '__main__':
+    unittest.main()
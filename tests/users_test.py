@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import unittest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from src import storage, users
+from src.main import app
+
+client = TestClient(app)
+
+admin_record = {"username": "admin", "password_hash": users.hash_password("secret"), "role": "admin"}
+
+
+@asynccontextmanager
+async def fake_cursor():
+    yield MagicMock()
+
+
+class PasswordHashTestCase(unittest.TestCase):
+
+    def test_verify_round_trip(self):
+        """
+        A hash verifies against its own password only, and every hash gets a fresh salt.
+        """
+        encoded = users.hash_password("secret")
+        self.assertTrue(encoded.startswith("scrypt$"))
+        self.assertTrue(users.verify_password("secret", encoded))
+        self.assertFalse(users.verify_password("Secret", encoded))
+        self.assertNotEqual(encoded, users.hash_password("secret"))
+
+    def test_hasher_rejects_beyond_cap(self):
+        """
+        Verifications beyond `max_pending` are turned away instead of queueing without bound.
+        """
+        hasher = users.PasswordHasher(workers=1, max_pending=1)
+        release = threading.Event()
+
+        async def scenario():
+            blocked = asyncio.ensure_future(hasher.run(release.wait))
+            await asyncio.sleep(0.01)
+            with self.assertRaises(users.HasherBusy):
+                await hasher.run(users.verify_password, "secret", admin_record["password_hash"])
+            release.set()
+            await blocked
+
+        asyncio.run(scenario())
+        self.assertEqual(hasher.stats()["rejected"], 1)
+
+
+@patch("src.storage.cursor", new=fake_cursor)
+class LoginTestCase(unittest.TestCase):
+
+    def setUp(self):
+        users.user_cache.clear()
+
+    @patch("src.queries.get_user_by_username", return_value=admin_record)
+    @patch("src.async_queries.get_user_by_username", new=AsyncMock(return_value=admin_record))
+    def test_login_and_user_cache(self, get_user_by_username):
+        """
+        Valid credentials get a token, and the user record is only read from the database once.
+        """
+        first = client.post("/token", data={"username": "admin", "password": "secret"})
+        second = client.post("/token", data={"username": "admin", "password": "secret"})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json()["token_type"], "bearer")
+        if not storage.is_async():
+            get_user_by_username.assert_called_once()
+
+    @patch("src.queries.get_user_by_username", return_value=None)
+    @patch("src.async_queries.get_user_by_username", new=AsyncMock(return_value=None))
+    def test_login_rejects_unknown_user(self, _):
+        """
+        Unknown users get the same 401 as a wrong password.
+        """
+        response = client.post("/token", data={"username": "mallory", "password": "secret"})
+        self.assertEqual(response.status_code, 401)
+
+
+class CreateUserCommandTestCase(unittest.TestCase):
+
+    @patch("src.queries.upsert_user")
+    @patch("getpass.getpass", return_value="secret")
+    @patch("sys.argv", ["users", "create-user", "admin", "--role", "admin"])
+    def test_saves_the_user_and_closes_the_connection(self, _, upsert_user):
+        """
+        `create-user` commits the user and closes its connection.
+        """
+        conn = MagicMock()
+        with patch("src.db.get_connection", return_value=conn), patch("builtins.print"):
+            users.main()
+        self.assertEqual(upsert_user.call_args.args[1:2] + upsert_user.call_args.args[3:], ("admin", "admin"))
+        conn.__exit__.assert_called_once()
+        conn.close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import json
+import threading
+import unittest
+from unittest.mock import patch
+
+import psycopg2
+
+from src import worker
+from src.worker import Worker
+
+
+class FakeQueue:
+    """
+    In-memory stand-in for the tasks and task_leases tables, behind the worker queries.
+    """
+
+    def __init__(self, names=()):
+        self.tasks = {task_id: {"name": name, "status": "queued"} for task_id, name in enumerate(names, 1)}
+        self.leases = {}
+        self.results = {}
+        self.executed = []
+        self.lock = threading.Lock()
+        self.fail_claims = 0
+
+    def claim_tasks(self, cursor, owner, limit, lease_seconds):
+        with self.lock:
+            if self.fail_claims:
+                self.fail_claims -= 1
+                raise psycopg2.OperationalError("connection lost")
+            rows = []
+            for task_id, task in sorted(self.tasks.items()):
+                if task["status"] == "queued" and len(rows) < limit:
+                    task["status"] = "running"
+                    attempts = self.leases.get(task_id, {}).get("attempts", 0) + 1
+                    self.leases[task_id] = {"owner": owner, "expired": False, "attempts": attempts}
+                    self.executed.append(task_id)
+                    rows.append({"id": task_id, "name": task["name"], "attempts": attempts})
+            return rows
+
+    def renew_leases(self, cursor, owner, task_ids, lease_seconds):
+        with self.lock:
+            return {task_id for task_id in task_ids if self.leases.get(task_id, {}).get("owner") == owner}
+
+    def complete_tasks(self, cursor, owner, outcomes):
+        with self.lock:
+            recorded = set()
+            for task_id, status, result, error in outcomes:
+                if self.leases.get(task_id, {}).get("owner") == owner:
+                    attempts = self.leases.pop(task_id)["attempts"]
+                    self.tasks[task_id]["status"] = status
+                    self.results[task_id] = {"result": result, "error": error, "attempts": attempts}
+                    recorded.add(task_id)
+            return recorded
+
+    def reap_expired_leases(self, cursor, max_attempts):
+        with self.lock:
+            reaped = {}
+            for task_id, lease in list(self.leases.items()):
+                if lease["owner"] is not None and lease["expired"]:
+                    if lease["attempts"] < max_attempts:
+                        lease["owner"] = None
+                        self.tasks[task_id]["status"] = reaped[task_id] = "queued"
+                        continue
+                    del self.leases[task_id]
+                    self.tasks[task_id]["status"] = reaped[task_id] = "failed"
+                    self.results[task_id] = {"result": None, "attempts": lease["attempts"],
+                                             "error": f"lease expired after {lease['attempts']} attempts"}
+            return reaped
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class WorkerTestCase(unittest.TestCase):
+
+    def use_queue(self, queue):
+        for name in ("claim_tasks", "renew_leases", "complete_tasks", "reap_expired_leases"):
+            patcher = patch(f"src.queries.{name}", new=getattr(queue, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return queue
+
+    def make_worker(self, **kwargs):
+        options = {"concurrency": 4, "batch_size": 3, "lease_seconds": 5.0, "heartbeat_interval": 1.0,
+                   "poll_interval": 0.01, "connect": FakeConnection}
+        options.update(kwargs)
+        return Worker(**options)
+
+    def test_execute_dispatches_on_kind(self):
+        """
+        The part of a task's name before ":" picks the handler, the rest is its argument.
+        """
+        self.assertEqual(worker.execute("echo: hello"), "hello")
+        self.assertEqual(worker.execute("noop"), None)
+        with self.assertRaises(LookupError):
+            worker.execute("unknown: x")
+
+    def test_runs_queued_tasks_and_records_outcomes(self):
+        """
+        Every queued task is run once; results are stored as JSON and handler errors as failures.
+        """
+        queue = self.use_queue(FakeQueue(["echo: a", "sleep: 0.01", "unknown", "echo: b", "noop"]))
+        stats = self.make_worker().run(exit_when_idle=True)
+        self.assertEqual((stats["claimed"], stats["done"], stats["failed"]), (5, 4, 1))
+        self.assertEqual(sorted(queue.executed), [1, 2, 3, 4, 5])
+        self.assertEqual(json.loads(queue.results[1]["result"]), "a")
+        self.assertEqual(queue.tasks[3]["status"], "failed")
+        self.assertIn("LookupError", queue.results[3]["error"])
+
+    def test_workers_share_the_queue(self):
+        """
+        Workers running side by side never run the same task.
+        """
+        queue = self.use_queue(FakeQueue(["sleep: 0.005"] * 40))
+        workers = [self.make_worker() for _ in range(3)]
+        threads = [threading.Thread(target=w.run, kwargs={"exit_when_idle": True}) for w in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(sorted(queue.executed), list(range(1, 41)))
+        self.assertEqual(sum(w.stats()["done"] for w in workers), 40)
+
+    def test_expired_leases_are_requeued_then_failed(self):
+        """
+        A task whose worker vanished runs again, unless it has used up its attempts.
+        """
+        queue = self.use_queue(FakeQueue(["echo: retry", "echo: give up"]))
+        queue.tasks[1]["status"] = queue.tasks[2]["status"] = "running"
+        queue.leases[1] = {"owner": "dead", "expired": True, "attempts": 1}
+        queue.leases[2] = {"owner": "dead", "expired": True, "attempts": 3}
+        stats = self.make_worker(max_attempts=3).run(exit_when_idle=True)
+        self.assertEqual(stats["reaped"], 2)
+        self.assertEqual(queue.tasks[1]["status"], "done")
+        self.assertEqual(queue.results[1]["attempts"], 2)
+        self.assertEqual(queue.tasks[2]["status"], "failed")
+        self.assertEqual(queue.results[2]["error"], "lease expired after 3 attempts")
+        self.assertNotIn(2, queue.leases)
+
+    def test_outcome_of_lost_lease_is_discarded(self):
+        """
+        A worker that lost its lease cannot overwrite the outcome of whoever holds it now.
+        """
+        queue = self.use_queue(FakeQueue(["echo: late"]))
+        original = queue.complete_tasks
+
+        def steal_then_complete(cursor, owner, outcomes):
+            queue.leases[1]["owner"] = "other"
+            return original(cursor, owner, outcomes)
+
+        with patch("src.queries.complete_tasks", new=steal_then_complete):
+            stats = self.make_worker().run(exit_when_idle=True)
+        self.assertEqual((stats["done"], stats["lost"]), (0, 1))
+        self.assertNotIn(1, queue.results)
+
+    def test_database_errors_are_retried(self):
+        """
+        A failed claim is rolled back and retried on the next pass.
+        """
+        queue = self.use_queue(FakeQueue(["noop"]))
+        queue.fail_claims = 1
+        conn = FakeConnection()
+        stats = self.make_worker(connect=lambda: conn).run(exit_when_idle=True)
+        self.assertEqual((stats["db_errors"], stats["done"]), (1, 1))
+        self.assertEqual(conn.rollbacks, 1)
+
+    def test_process_executor(self):
+        """
+        Handlers also run on a process pool.
+        """
+        queue = self.use_queue(FakeQueue(["hash: 10", "hash: 20"]))
+        stats = self.make_worker(executor="process", concurrency=2).run(exit_when_idle=True)
+        self.assertEqual(stats["done"], 2)
+        self.assertEqual(len(json.loads(queue.results[2]["result"])), 64)
+
+    def test_rejects_heartbeat_longer_than_lease(self):
+        """
+        Leases must be renewed before they expire.
+        """
+        with self.assertRaises(ValueError):
+            Worker(lease_seconds=5.0, heartbeat_interval=5.0)
+
+
+if __name__ == '__main__':
+    unittest.main()